@@ -47,8 +47,8 @@ def downloadChildCSVs(entryData: list[EntryData], writer: BigFileWriter, parentR
         if content is not None:
             df = buildDF(content)
             # df["higher_taxonomy"] = ";".join(higherTaxonomy)
-            writer.writeDF(df)
-            print(f"Wrote file #{len(writer.writtenFiles)}", end="\r")
+            writer.appendBatch(df) # Sections are often small, so they're combined into larger subfiles
+            print(f"Wrote section for {entry.key}", end="\r")
             continue
 
         # Content was too large to download
@@ -64,7 +64,7 @@ def getCSVData(taxonKey: str) -> str | None:
     return response.content
 
 def buildDF(content: bytes) -> pd.DataFrame:
-    return pd.read_csv(BytesIO(content), encoding="iso-8859-1")
+    return pd.read_csv(BytesIO(content), encoding="iso-8859-1", dtype=object) # Sections are combined, so types inferred per section could conflict
 
 def findChildren(taxonKey: str) -> list[EntryData]:
     response = requests.get(f"https://biodiversity.org.au/afd/taxa/{taxonKey}/checklist-subtaxa.json")
@@ -192,10 +192,9 @@ def enrich(filePath: Path, outputFilePath: Path) -> None:
 
         writer = BigFileWriter(enrichmentPath, rank, subfileType=Format.CSV)
         writer.populateFromFolder(writer.subfileDir)
-        subfileNames = [file.fileName for file in writer.writtenFiles]
 
         uniqueSeries = subDF["taxon_id"].unique()
-        uniqueSeries = [item for item in uniqueSeries if item not in subfileNames]
+        uniqueSeries = [item for item in uniqueSeries if not writer.hasSubfile(item)]
         
         bar = SteppableProgressBar(len(uniqueSeries), processName=f"{rank} Progress")
         for taxonID in uniqueSeries:
@@ -1,31 +1,22 @@
 import pandas as pd
 import requests
 import json
-import math
 from pathlib import Path
 import lib.dataframeFuncs as dff
+from lib.tools.harvester import Harvester, PagedHarvester
 
 def build(outputFilePath: Path) -> None:
     baseURL = "https://biocache-ws.ala.org.au/ws/occurrences/search?q=*%3A*&disableAllQualityFilters=true&qualityProfile=AVH&fq=type_status%3A*&fq=country%3A%22Australia%22&qc=data_hub_uid%3Adh9"
-    firstCall = baseURL + "&pageSize=0"
-    readSize = 1000
 
-    rawData = requests.get(firstCall)
-    jsData = rawData.json()
-
-    records = jsData["totalRecords"]
-    totalCalls = math.ceil(records / readSize)
-
-    occurrences = []
-    for call in range(totalCalls):
-        callURL = baseURL + f"&pageSize={readSize}" + f"&startIndex={call*readSize}"
-        print(f"At call: {call+1} / {totalCalls}", end="\r")
-        rawData = requests.get(callURL)
-        jsData = rawData.json()
-        occurrences.extend(jsData["occurrences"])
-
-    df = pd.DataFrame.from_records(occurrences)
-    df.to_csv(outputFilePath, index=False)
+    harvester = PagedHarvester(
+        outputFilePath,
+        url=baseURL + "&pageSize={pageSize}&startIndex={offset}",
+        recordPath="occurrences",
+        totalPath="totalRecords",
+        pageSize=1000
+    )
+    if not harvester.harvest():
+        raise Exception(f"Failed to harvest {outputFilePath.name}, rerun to resume")
 
 def collect(outputDir: Path, profile: str, tokenFilePath: Path) -> None:
     with open(tokenFilePath) as fp:
@@ -43,15 +34,20 @@ def collect(outputDir: Path, profile: str, tokenFilePath: Path) -> None:
     
     print(f"Accessing profile: {profile}")
 
-    records = []
-    for idx, entry in enumerate(data, start=1):
-        uuid = entry["uuid"]
-        print(f"At record: {idx}", end="\r")
+    def getProfiles(uuids: list[str]) -> pd.DataFrame | None:
+        records = []
+        for uuid in uuids:
+            record = harvester.getJSON(baseURL + f"/api/opus/{profile}/profile/{uuid}")
+            if record is None:
+                return None
+
+            records.append(record)
+
+        return dff.removeSpaces(pd.DataFrame.from_records(records))
 
-        response = requests.get(baseURL + f"/api/opus/{profile}/profile/{uuid}", headers={"Authorization": f"Bearer {bearerToken}"})
-        records.append(response.json())
-    print()
+    uuids = [entry["uuid"] for entry in data]
+    batchSize = 100
 
-    df = pd.DataFrame.from_records(records)
-    df = dff.removeSpaces(df)
-    df.to_csv(outputDir / f"{profile}.csv", index=False)
+    harvester = Harvester(outputDir / f"{profile}.csv", headers={"Authorization": f"Bearer {bearerToken}"})
+    if not harvester.run({f"batch_{idx}": (lambda idx=idx: getProfiles(uuids[idx:idx+batchSize])) for idx in range(0, len(uuids), batchSize)}):
+        raise Exception(f"Failed to collect profiles for {profile}, rerun to resume")
@@ -1,30 +1,22 @@
-import math
-import requests
-import pandas as pd
+from pathlib import Path
+import lib.dataframeFuncs as dff
+from lib.tools.harvester import PagedHarvester
+
+def flattenSpatial(record: dict) -> dict:
+    return record | record.pop("spatialParameters", {})
 
 def getPortalData(outputFilePath: Path) -> None:
     baseURL = "https://data.csiro.au/dap/ws/v2/collections"
-    entriesPerPage = 100
-
-    # Get page 1 first, then iterate over remaining pages
-    response = requests.get(f"{baseURL}?rpp={entriesPerPage}&p={1}")
-    data = response.json()
-    records = data["dataCollections"]
-
-    totalResults = data["totalResults"]
-    totalCalls = math.ceil(int(totalResults) / entriesPerPage)
-
-    for call in range(1, totalCalls):
-        response = requests.get(f"{baseURL}?rpp={entriesPerPage}&p={call+1}")
-        data = response.json()
-        records.extend(data["dataCollections"])
-
-    for record in records:
-        record |= record.pop("spatialParameters", {})
 
-    df = pd.DataFrame.from_records(records)
-    # idDf = df["id"].apply(lambda x: dict(x)).apply(pd.Series)
-    # df.drop("id", axis=1, inplace=True)
-    # df = pd.concat([idDf, df], axis=1)
-    df.replace(to_replace=[r"\\t|\\n|\\r", "\t|\n|\r"], value=["", ""], regex=True, inplace=True)
-    df.to_csv(outputFilePath, index=False)
+    harvester = PagedHarvester(
+        outputFilePath,
+        url=baseURL + "?rpp={pageSize}&p={page}",
+        recordPath="dataCollections",
+        totalPath="totalResults",
+        pageSize=100,
+        firstPage=1,
+        recordCallback=flattenSpatial,
+        pageCallback=dff.removeSpaces
+    )
+    if not harvester.harvest():
+        raise Exception(f"Failed to harvest {outputFilePath.name}, rerun to resume")
@@ -1,24 +1,28 @@
-import requests
 from urllib.parse import quote
 import pandas as pd
 from pathlib import Path
-from lib.tools.downloader import Downloader
+from lib.tools.harvester import PagedHarvester, Response
 
-def buildCall(size: int, query: str, tidy: bool) -> str:
+def buildCall(size: int | str, query: str, tidy: bool, offset: int | str = 0) -> str:
     baseURL = "https://goat.genomehubs.org/api/v2/"
-    fullURL = f"{baseURL}search?query={quote(query)}&result=taxon&includeEstimates=true&size={size}&tidyData={'true' if tidy else 'false'}"
+    fullURL = f"{baseURL}search?query={quote(query)}&result=taxon&includeEstimates=true&size={size}&offset={offset}&tidyData={'true' if tidy else 'false'}"
     return fullURL
 
 def build(outputFilePath: Path) -> None:
     query = "tax_name(*) AND tax_rank(species)"
 
-    response = requests.get(buildCall(0, query, False))
-    output = response.json()
-    status = output.get("status", {})
-    hits = status.get("hits", 0)
-
-    downloader = Downloader()
-    downloader.download(buildCall(hits, query, True), outputFilePath, headers={"accept": "text/csv"})
+    harvester = PagedHarvester(
+        outputFilePath,
+        url=buildCall("{pageSize}", query, True, "{offset}"),
+        recordPath="",
+        totalPath="status.hits",
+        pageSize=5000,
+        countURL=buildCall(0, query, False),
+        response=Response.CSV,
+        headers={"accept": "text/csv"}
+    )
+    if not harvester.harvest():
+        raise Exception(f"Failed to harvest {outputFilePath.name}, rerun to resume")
 
 def clean(filePath: Path, outputFilePath: Path) -> None:
     df = pd.read_csv(filePath)
@@ -1,7 +1,10 @@
 from lib.tools.zipping import RepeatExtractor
 from lib.tools.bigFileWriter import BigFileWriter
 from pathlib import Path
-from .. import flatFileParser as ffp
+import lib.commonFuncs as cmn
+from sourceProcessing.ncbiUpdates import getStore, loadFlatfileParser
+
+ffp = loadFlatfileParser()
 
 def parseNucleotide(folderPath: Path, outputFilePath: Path, verbose: bool = True) -> None:
     extractor = RepeatExtractor(outputFilePath.parent)
@@ -23,7 +26,11 @@ def parseNucleotide(folderPath: Path, outputFilePath: Path, verbose: bool = True
             print(f"Parsing file {extractedFile}")
 
         df = ffp.parseFlatfile(extractedFile, verbose)
-        writer.writeDF(df)
+        writer.appendBatch(df)
         extractedFile.unlink()
 
     writer.oneFile()
+
+    # Keep records keyed by locus so later updates only need to apply changes
+    store = getStore(outputFilePath)
+    store.build(cmn.chunkGenerator(outputFilePath, 100000))
@@ -2,6 +2,7 @@ from pathlib import Path
 import pandas as pd
 from enum import Enum
 from lib.tools.logger import Logger
+import lib.tools.zipping as zp
 from lib.tools.progressBar import SteppableProgressBar
 
 class DumpFile(Enum):
@@ -132,11 +133,17 @@ def flattenNames(df: pd.DataFrame) -> pd.DataFrame:
 
     return pd.DataFrame.from_dict(data, orient="index")
 
-def parse(dumpFolder: Path, outputFile: Path) -> None:
+def parse(dumpPath: Path, outputFile: Path) -> None:
+
+    def openDump(dumpFile: DumpFile):
+        if dumpPath.is_dir():
+            return open(dumpPath / dumpFile.value)
+
+        return zp.openMember(dumpPath, dumpFile.value, "utf-8") # Read straight from the downloaded archive
 
     def loadDF(dumpFile: DumpFile) -> pd.DataFrame:
-        with open(dumpFolder / dumpFile.value) as fp:
-            records = [line.strip("\t|\n").split("\t|\t") for line in fp.readlines()]
+        with openDump(dumpFile) as fp:
+            records = [line.strip("\t|\n").split("\t|\t") for line in fp]
 
         return pd.DataFrame.from_records(records, columns=headings[dumpFile])
 
@@ -1,7 +1,6 @@
-import requests
-import math
-import pandas as pd
 from pathlib import Path
+import lib.dataframeFuncs as dff
+from lib.tools.harvester import PagedHarvester, Method
 
 def build(outputFilePath: Path) -> None:
     baseURL = "https://portal.tern.org.au/search/filter/"
@@ -36,29 +35,24 @@ def build(outputFilePath: Path) -> None:
             "spatialPolygon": "",
             "temporal": "All",
             "sort": "_score desc",
-            "page": 0,
-            "num": 0,
+            "page": "{page}",
+            "num": "{pageSize}",
             "mapsearch": "0"
         }
     }
 
-    hitCountURL = "https://portal.tern.org.au/search/filter/TotalHitCountCollector/"
-    hitCounts = requests.post(hitCountURL)
-    hits = hitCounts.json()["json"]["total_docs"]
-    hitsPerCall = 1000
-
-    totalCalls = math.ceil(hits / hitsPerCall)
-
-    parameters["params"]["num"] = hitsPerCall
-
-    records = []
-    for call in range(totalCalls):
-        parameters["params"]["page"] = call + 1
-
-        response = requests.post(baseURL, json=parameters)
-        data = response.json()
-        records.extend(data["json"]["hits"])
-    
-    df = pd.DataFrame.from_records(records)
-    df.replace(to_replace=[r"\\t|\\n|\\r", "\t|\n|\r"], value=["", ""], regex=True, inplace=True)
-    df.to_csv(outputFilePath, index=False)
\ No newline at end of file
+    harvester = PagedHarvester(
+        outputFilePath,
+        url=baseURL,
+        recordPath="json.hits",
+        totalPath="json.total_docs",
+        pageSize=1000,
+        firstPage=1,
+        method=Method.POST,
+        body=parameters,
+        countURL="https://portal.tern.org.au/search/filter/TotalHitCountCollector/",
+        countMethod=Method.POST,
+        pageCallback=dff.removeSpaces
+    )
+    if not harvester.harvest():
+        raise Exception(f"Failed to harvest {outputFilePath.name}, rerun to resume")
@@ -1,8 +1,9 @@
 import csv
 import json
 import pandas as pd
-from typing import Generator
+from typing import Callable, Generator
 from lib.tools.logger import Logger
+from lib.tools.typedReader import typedChunkGenerator
 from pathlib import Path
 
 def reverseLookup(lookup: dict) -> dict:
@@ -55,9 +56,25 @@ def flatten(inputDict: dict, parent: str = "") -> dict:
 
     return res
 
-def chunkGenerator(filePath: str, chunkSize: int, sep: str = ",", header: int = 0, encoding: str = "utf-8", usecols: list = None, nrows: int = None) -> Generator[pd.DataFrame, None, None]:
+def chunkGenerator(filePath: str, chunkSize: int | Callable[[], int], sep: str = ",", header: int = 0, encoding: str = "utf-8", usecols: list = None, nrows: int = None, schema: dict[str, str] = None) -> Generator[pd.DataFrame, None, None]:
+    if schema is not None: # Typed columns read with pyarrow
+        return typedChunkGenerator(Path(filePath), chunkSize, schema, sep, header, encoding, usecols, nrows)
+
+    if callable(chunkSize): # Size checked before each chunk so it can be changed while reading
+        return _sizedChunkGenerator(filePath, chunkSize, sep, header, encoding, usecols, nrows)
+
     return (chunk for chunk in pd.read_csv(filePath, on_bad_lines="skip", chunksize=chunkSize, sep=sep, header=header, encoding=encoding, dtype=object, usecols=usecols, nrows=nrows))
 
+def _sizedChunkGenerator(filePath: str, chunkSize: Callable[[], int], sep: str, header: int, encoding: str, usecols: list, nrows: int) -> Generator[pd.DataFrame, None, None]:
+    with pd.read_csv(filePath, on_bad_lines="skip", chunksize=chunkSize(), sep=sep, header=header, encoding=encoding, dtype=object, usecols=usecols, nrows=nrows) as reader:
+        while True:
+            try:
+                chunk = reader.get_chunk(chunkSize())
+            except StopIteration:
+                return
+
+            yield chunk
+
 def getColumns(filePath: str, separator: str = ',', headerRow: int = 0) -> str:
     with open(filePath, encoding='utf-8') as fp:
         reader = csv.reader(fp, delimiter=separator)
@@ -1,6 +1,10 @@
 import argparse
+from typing import TYPE_CHECKING
 from lib.data.sources import SourceManager
-from lib.data.database import BasicDB
+from lib.tools.profiler import Tracer, Profiler
+
+if TYPE_CHECKING: # Only imported once sources are loaded, so help and invalid sources return straight away
+    from lib.data.database import BasicDB
 
 class ArgParser:
     def __init__(self, description=""):
@@ -12,23 +16,35 @@ class ArgParser:
         self.parser.add_argument("-p", "--prepare", action="store_true", help="Force redoing preparation")
         self.parser.add_argument("-o", "--overwrite", action="store_true", help="Force overwriting files")
         self.parser.add_argument("-q", "--quiet", action="store_false", help="Suppress output")
+        self.parser.add_argument("--trace", action="store_true", help="Write timings, memory and row counts of each step to a trace file in the logs folder")
+        self.parser.add_argument("--profile", choices=[profiler.value for profiler in Profiler if profiler != Profiler.NONE], help="Also profile the run, written next to the trace file")
 
     def add_argument(self, *args, **kwargs) -> None:
         self.parser.add_argument(*args, **kwargs)
 
-    def parse_args(self, *args, **kwargs) -> tuple[list[BasicDB], tuple[bool, bool], bool, argparse.Namespace]:
+    def parse_args(self, *args, **kwargs) -> tuple[list['BasicDB'], tuple[bool, bool], bool, argparse.Namespace]:
         parsedArgs = self.parser.parse_args(*args, **kwargs)
 
-        sources = self.manager.requestDBs(self._extract(parsedArgs, "source"))
-        if len(sources) >= self.sourceWarning:
-            passed = self._warnSources(len(sources))
-            if not passed:
-                sources = []
+        source = self._extract(parsedArgs, "source")
+        error = self.manager.validateSource(source)
+        if error:
+            self.parser.error(error)
+
+        sourceCount = self.manager.countDBs(source)
+        if sourceCount >= self.sourceWarning and not self._warnSources(sourceCount):
+            sources = []
+        else:
+            sources = self.manager.requestDBs(source)
 
         prepare = self._extract(parsedArgs, "prepare")
         overwrite = self._extract(parsedArgs, "overwrite")
         verbose = self._extract(parsedArgs, "quiet")
 
+        trace = self._extract(parsedArgs, "trace")
+        profile = self._extract(parsedArgs, "profile")
+        if trace or profile:
+            Tracer.start(Profiler(profile) if profile else Profiler.NONE)
+
         return sources, (prepare, overwrite), verbose, parsedArgs
     
     def namespaceKwargs(self, namespace: argparse.Namespace) -> dict:
@@ -8,11 +8,16 @@ from lib.systemManagers.conversion import ConversionManager
 from lib.systemManagers.metadata import MetadataManager
 from lib.systemManagers.updating import UpdateManager
 
-from lib.processing.stages import Step
+from lib.processing.steps import Step
+from lib.processing.scripts import Script
 
-from lib.tools.crawler import Crawler
 from lib.tools.logger import Logger
-import lib.tools.zipping as zp
+from lib.tools.profiler import Tracer
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from lib.tools.packaging import PackageFormat
 
 class Retrieve(Enum):
     URL     = "url"
@@ -37,6 +42,7 @@ class BasicDB:
         self.processingConfig: dict = config.pop("processing", {})
         self.conversionConfig: dict = config.pop("conversion", {})
         self.updateConfig: dict = config.pop("update", {})
+        self.packagingConfig: dict = config.pop("packaging", {})
 
         if self.downloadConfig is None:
             raise Exception("No download config specified as required") from AttributeError
@@ -53,7 +59,7 @@ class BasicDB:
         # System Managers
         self.downloadManager = DownloadManager(self.databaseDir, self.downloadDir, self.authFile)
         self.processingManager = ProcessingManager(self.databaseDir, self.processingDir)
-        self.conversionManager = ConversionManager(self.databaseDir, self.convertedDir, self.datasetID, location, database, subsection)
+        self.conversionManager = ConversionManager(self.databaseDir, self.convertedDir, self.datasetID, location, database, subsection, self.subsectionDir / "profile.json")
         self.metadataManager = MetadataManager(self.subsectionDir)
         self.updateManager = UpdateManager(self.updateConfig)
 
@@ -63,6 +69,9 @@ class BasicDB:
         # Preparation Stage
         self._prepStage = -1
 
+        # Remote fingerprints found before updating
+        self._remote: dict = None
+
     def __str__(self):
         return f"{self.location}-{self.database}{'-' + self.subsection if self.subsection else ''}"
 
@@ -107,7 +116,8 @@ class BasicDB:
         if len(filesToConvert) != 1:
             raise Exception(f"Unable to prepare conversion, there should be 1 but there is {len(filesToConvert)}")
         
-        self.conversionManager.loadFile(filesToConvert[0], self.conversionConfig, self.databaseDir)
+        tunedChunkSize = self.metadataManager.getStepMetadata(Step.CONVERSION).get("chunking", {}).get("chunkSize", None)
+        self.conversionManager.loadFile(filesToConvert[0], self.conversionConfig, self.databaseDir, tunedChunkSize)
 
     def _prepare(self, step: Step, overwrite: bool, verbose: bool) -> bool:
         callbacks = {
@@ -138,6 +148,10 @@ class BasicDB:
 
     def _execute(self, step: Step, overwrite: bool, verbose: bool, **kwargs: dict) -> bool:
         Logger.info(f"Executing {self} step '{step.name}' with flags: overwrite={overwrite} | verbose={verbose}")
+        with Tracer.span(f"{self} {step.name.lower()}", "step"):
+            return self._executeStep(step, overwrite, verbose, **kwargs)
+
+    def _executeStep(self, step: Step, overwrite: bool, verbose: bool, **kwargs: dict) -> bool:
         if step == Step.DOWNLOAD:
             success, metadata = self.downloadManager.download(overwrite, verbose, **kwargs)
             self.metadataManager.update(step, metadata)
@@ -156,31 +170,108 @@ class BasicDB:
         Logger.error(f"Unknown step to execute: {step}")
         return False
     
-    def create(self, step: Step, overwrite: tuple[bool, bool], verbose: bool, **kwargs: dict) -> None:
+    def create(self, step: Step, overwrite: tuple[bool, bool], verbose: bool, **kwargs: dict) -> bool:
         prepare, reprocess = overwrite
 
         try:
             success = self._prepare(step, prepare, verbose)
             if not success:
-                return
+                return False
         except KeyboardInterrupt:
             Logger.info(f"Process ended early when attempting to prepare step '{step.name}' for {self}")
+            return False
 
         try:
-            self._execute(step, reprocess, verbose, **kwargs)
+            return self._execute(step, reprocess, verbose, **kwargs)
         except KeyboardInterrupt:
             Logger.info(f"Process ended early when attempting to execute step '{step.name}' for {self}")
+            return False
+
+    def package(self, format: 'PackageFormat' = None) -> Path:
+        from lib.tools.packaging import Packager, PackageFormat # Pulls in pyarrow, which isn't needed until packaging
+
+        if format is None:
+            format = PackageFormat(self.packagingConfig.get("format", PackageFormat.ZIP.value))
+
+        packager = Packager(format, self.packagingConfig.get("level", 3), self.packagingConfig.get("workers", None))
+
+        outputPath = packager.package(self.conversionManager.output.filePath, self.dataDir, extraFiles=[self.metadataManager.metadataPath, self.conversionManager.profilePath])
+        Logger.info(f"Successfully packaged converted data source file to {outputPath}")
+
+        if self.conversionManager.changesDir.exists():
+            changesPath = packager.package(self.conversionManager.changesDir, self.dataDir)
+            Logger.info(f"Successfully packaged conversion changes to {changesPath}")
 
-    def package(self) -> Path:
-        renamedFilePath = self.metadataManager.metadataPath.rename(self.conversionManager.output.filePath / self.metadataManager.metadataPath.name)
-        outputPath = zp.compress(self.conversionManager.output.filePath, self.dataDir)
-        renamedFilePath.rename(self.metadataManager.metadataPath)
-        Logger.info(f"Successfully zipped converted data source file to {outputPath}")
         return outputPath
 
+    def _getProbeTargets(self) -> tuple[list[str], list[str]]:
+        # Urls to fingerprint from headers, and pages to fingerprint by digest
+        return [file.get("url", "") for file in self.downloadConfig.get("files", [])], self.updateManager.probePages
+
+    def checkRemoteChanged(self) -> bool:
+        if not self.updateManager.probe:
+            return True
+
+        self._remote = self.downloadManager.probe(*self._getProbeTargets())
+        if self._remote is None:
+            Logger.info(f"Unable to fingerprint remote files for {self}, assuming they have changed")
+            return True
+
+        if self._remote != self.metadataManager.getRemote():
+            Logger.info(f"Remote files for {self} have changed")
+            return True
+
+        Logger.info(f"Remote files for {self} are unchanged since the last update")
+        self.metadataManager.recordRemoteCheck()
+        return False
+
     def checkUpdateReady(self) -> bool:
-        lastUpdate = self.metadataManager.getLastDownloadUpdate()
-        return self.updateManager.isUpdateReady(lastUpdate)
+        lastCheck = self.metadataManager.getLastCheck()
+        return self.updateManager.isUpdateReady(lastCheck) and self.checkRemoteChanged()
+
+    def _partialUpdate(self, verbose: bool) -> bool:
+        try:
+            script = Script(self.databaseDir, self.processingDir, dict(self.updateManager.script), [])
+        except AttributeError as e:
+            Logger.error(f"Invalid update script configuration: {e}")
+            return False
+
+        lastUpdate = self.metadataManager.getLastUpdate()
+
+        with Tracer.span(f"{self} partial update", "step") as span:
+            success = script.run(True, verbose, kwargs={"lastUpdate": lastUpdate})
+
+        self.metadataManager.recordPartialUpdate({
+            "function": script.function,
+            "output": script.output.filePath.name,
+            "success": success,
+            **span.stats(),
+            "timestamp": datetime.now().isoformat()
+        })
+
+        return success
+
+    def update(self, verbose: bool) -> bool:
+        steps = (Step.DOWNLOAD, Step.PROCESSING, Step.CONVERSION)
+
+        if self._remote is None and self.updateManager.probe: # Fingerprint before downloading so changes made during the update are caught next time
+            self._remote = self.downloadManager.probe(*self._getProbeTargets())
+
+        if self.updateManager.isPartial():
+            Logger.info(f"Running partial update for {self}")
+            if self._partialUpdate(verbose):
+                steps = (Step.CONVERSION,)
+            else:
+                Logger.warning(f"Partial update failed for {self}, running full update")
+
+        for step in steps:
+            if not self.create(step, (True, True), verbose):
+                return False
+
+        if self._remote is not None:
+            self.metadataManager.recordRemote(self._remote)
+
+        return True
 
 class CrawlDB(BasicDB):
 
@@ -208,12 +299,18 @@ class CrawlDB(BasicDB):
             fileName = self._getFileNameFromURL(url, folderPrefix)
             self.downloadManager.registerFromURL(url, fileName, properties)
 
+    def _getProbeTargets(self) -> tuple[list[str], list[str]]:
+        # Files found by crawling may be added or removed, so the listing at the root is compared instead
+        return [], [self.downloadConfig.get("url", "")] + self.updateManager.probePages
+
     def _crawl(self, crawlerDirectory: Path) -> None:
         url = self.downloadConfig.pop("url", None)
         regex = self.downloadConfig.pop("regex", ".*")
         link = self.downloadConfig.pop("link", "")
         maxDepth = self.downloadConfig.pop("maxDepth", -1)
 
+        from lib.tools.crawler import Crawler # Pulls in BeautifulSoup, which isn't needed until crawling
+
         crawler = Crawler(crawlerDirectory, regex, link, maxDepth, user=self.downloadManager.username, password=self.downloadManager.password)
 
         if url is None:
@@ -238,3 +335,7 @@ class ScriptDB(BasicDB):
 
     def _prepareDownload(self, overwrite: bool, verbose: bool) -> None:
         self.downloadManager.registerFromScript(self.downloadConfig)
+
+    def _getProbeTargets(self) -> tuple[list[str], list[str]]:
+        # Scripts can only be checked through pages listed in the update config
+        return [], self.updateManager.probePages
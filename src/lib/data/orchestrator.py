@@ -0,0 +1,213 @@
+import os
+import sys
+import json
+import time
+import shutil
+import traceback
+import multiprocessing
+import lib.config as cfg
+from enum import Enum
+from pathlib import Path
+from datetime import datetime
+from typing import TYPE_CHECKING
+from urllib.parse import urlparse
+from lib.processing.steps import Step
+from lib.tools.logger import Logger
+
+if TYPE_CHECKING:
+    from lib.data.database import BasicDB
+
+class Action(Enum):
+    DOWNLOAD   = "download"
+    PROCESSING = "processing"
+    CONVERSION = "conversion"
+    PACKAGE    = "package"
+    UPDATE     = "update"
+
+_steps = {
+    Action.DOWNLOAD: Step.DOWNLOAD,
+    Action.PROCESSING: Step.PROCESSING,
+    Action.CONVERSION: Step.CONVERSION
+}
+
+# Downloads are limited by network slots and per host connections, everything else that does work locally by cpu slots
+_networkActions = (Action.DOWNLOAD, Action.UPDATE)
+_cpuActions = (Action.PROCESSING, Action.CONVERSION, Action.PACKAGE, Action.UPDATE)
+
+def runTask(sourceName: str, action: Action, overwrite: tuple[bool, bool], verbose: bool, kwargs: dict) -> None:
+    # Runs in a separate process, so the source is loaded again from its config
+    from lib.data.sources import SourceManager
+
+    try:
+        source = SourceManager().requestDBs(sourceName)[0]
+
+        if action in _steps:
+            success = source.create(_steps[action], overwrite, verbose, **kwargs)
+        elif action == Action.PACKAGE:
+            success = source.package() is not None
+        elif not source.checkRemoteChanged():
+            success = True
+        else:
+            success = source.update(verbose)
+            if success:
+                source.package()
+
+    except Exception:
+        Logger.error(f"Error running {action.value} for {sourceName}:\n{traceback.format_exc()}")
+        success = False
+
+    sys.exit(0 if success else 1)
+
+class _Task:
+    def __init__(self, source: 'BasicDB', action: Action, hosts: list[str]):
+        self.source = source
+        self.action = action
+        self.hosts = hosts if action in _networkActions else []
+
+        self.process: multiprocessing.Process = None
+        self.startTime = None
+        self.result = {"source": str(source), "action": action.value}
+
+    def usesNetwork(self) -> bool:
+        return self.action in _networkActions
+
+    def usesCPU(self) -> bool:
+        return self.action in _cpuActions
+
+class Orchestrator:
+    def __init__(self, downloadSlots: int = 4, cpuSlots: int = None, hostConnections: int = 2, minFreeDisk: int = 10 * 1024**3, pollInterval: float = 1):
+        self.downloadSlots = downloadSlots
+        self.cpuSlots = cpuSlots or max(1, os.cpu_count() // 2)
+        self.hostConnections = hostConnections
+        self.minFreeDisk = minFreeDisk
+        self.pollInterval = pollInterval
+
+        self._context = multiprocessing.get_context("spawn")
+
+    def _getHosts(self, source: 'BasicDB') -> list[str]:
+        # Hosts are read from the config so that sources don't need to be prepared, scripts are assumed to use one host per location
+        from lib.data.database import Retrieve
+
+        if source.retrieveType == Retrieve.URL:
+            hosts = {urlparse(file.get("url", "")).netloc for file in source.downloadConfig.get("files", [])}
+        elif source.retrieveType == Retrieve.CRAWL:
+            hosts = {urlparse(source.downloadConfig.get("url", "")).netloc}
+        else:
+            hosts = {source.location}
+
+        return sorted(host for host in hosts if host)
+
+    def _freeDisk(self) -> int:
+        return shutil.disk_usage(cfg.Folders.dataSources).free
+
+    def run(self, sources: list['BasicDB'], actions: list[Action], overwrite: tuple[bool, bool] = (False, False), verbose: bool = False, **kwargs: dict) -> dict:
+        # Each source runs its actions in order, while actions of different sources run alongside each other in their own processes
+        pending = {str(source): [_Task(source, action, self._getHosts(source)) for action in actions] for source in sources}
+        running: list[_Task] = []
+        finished: list[_Task] = []
+
+        hostUsage: dict[str, int] = {}
+        usedNetwork = 0
+        usedCPU = 0
+
+        startTime = time.perf_counter()
+        Logger.info(f"Running {', '.join(action.value for action in actions)} for {len(sources)} sources with {self.downloadSlots} download and {self.cpuSlots} cpu slots")
+
+        try:
+            while pending or running:
+                for task in list(running):
+                    if task.process.is_alive():
+                        continue
+
+                    running.remove(task)
+                    finished.append(task)
+                    task.result |= {"success": task.process.exitcode == 0, "exitCode": task.process.exitcode, "duration": time.perf_counter() - task.startTime}
+
+                    usedNetwork -= task.usesNetwork()
+                    usedCPU -= task.usesCPU()
+                    for host in task.hosts:
+                        hostUsage[host] -= 1
+
+                    Logger.info(f"Finished {task.action.value} for {task.source} ({'success' if task.result['success'] else 'failed'}), {len(running)} running")
+
+                    if not task.result["success"]: # Later actions depend on this one
+                        for skipped in pending.pop(str(task.source), []):
+                            skipped.result |= {"success": False, "skipped": True}
+                            finished.append(skipped)
+
+                lowDisk = self._freeDisk() < self.minFreeDisk
+                if lowDisk and not running:
+                    Logger.error(f"Less than {self.minFreeDisk / 1024**3:.1f}GB of disk space free, stopping remaining tasks")
+                    break
+
+                for sourceName, tasks in list(pending.items()):
+                    if lowDisk:
+                        break
+
+                    if any(str(task.source) == sourceName for task in running): # Still running a previous action
+                        continue
+
+                    task = tasks[0]
+                    if task.usesNetwork() and (usedNetwork >= self.downloadSlots or any(hostUsage.get(host, 0) >= self.hostConnections for host in task.hosts)):
+                        continue
+
+                    if task.usesCPU() and usedCPU >= self.cpuSlots:
+                        continue
+
+                    task.process = self._context.Process(target=runTask, args=(sourceName, task.action, overwrite, verbose, kwargs), name=f"{sourceName}-{task.action.value}")
+                    task.process.start()
+                    task.startTime = time.perf_counter()
+                    task.result["started"] = datetime.now().isoformat()
+                    running.append(task)
+
+                    usedNetwork += task.usesNetwork()
+                    usedCPU += task.usesCPU()
+                    for host in task.hosts:
+                        hostUsage[host] = hostUsage.get(host, 0) + 1
+
+                    tasks.pop(0)
+                    if not tasks:
+                        pending.pop(sourceName)
+
+                    Logger.info(f"Started {task.action.value} for {sourceName}, {len(running)} running")
+
+                time.sleep(self.pollInterval)
+
+        except KeyboardInterrupt:
+            Logger.info("Cancelling running tasks")
+            for task in running:
+                task.process.terminate()
+                task.process.join()
+                task.result |= {"success": False, "cancelled": True, "duration": time.perf_counter() - task.startTime}
+                finished.append(task)
+
+            running.clear()
+
+        for tasks in pending.values(): # Tasks that never started, from cancelling or running out of disk
+            for task in tasks:
+                task.result |= {"success": False, "skipped": True}
+                finished.append(task)
+
+        return self._writeReport(finished, time.perf_counter() - startTime)
+
+    def _writeReport(self, tasks: list[_Task], duration: float) -> dict:
+        sources = {}
+        for task in tasks:
+            sources.setdefault(str(task.source), []).append(task.result)
+
+        report = {
+            "finished": datetime.now().isoformat(),
+            "duration": duration,
+            "succeeded": sum(task.result["success"] for task in tasks),
+            "failed": sum(not task.result["success"] and not task.result.get("skipped", False) for task in tasks),
+            "skipped": sum(task.result.get("skipped", False) for task in tasks),
+            "limits": {"downloadSlots": self.downloadSlots, "cpuSlots": self.cpuSlots, "hostConnections": self.hostConnections, "minFreeDisk": self.minFreeDisk},
+            "sources": sources
+        }
+
+        reportPath: Path = cfg.Folders.logs / f"{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}_run.json"
+        with open(reportPath, "w") as fp:
+            json.dump(report, fp, indent=4)
+
+        Logger.info(f"Completed {report['succeeded']} tasks with {report['failed']} failed and {report['skipped']} skipped, report written to {reportPath}")
+        return report
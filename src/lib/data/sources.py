@@ -1,28 +1,150 @@
 import json
 import lib.config as cfg
 from pathlib import Path
-from lib.data.database import BasicDB, CrawlDB, ScriptDB, Retrieve
+from typing import TYPE_CHECKING
 from lib.tools.logger import Logger
 
+if TYPE_CHECKING: # Databases pull in pandas and pyarrow, so are only imported once a source is loaded
+    from lib.data.database import BasicDB
+
+class SourceRegistry:
+    # Summary of every source config, so sources can be listed and checked without reading each config
+    version = 1
+
+    def __init__(self, registryPath: Path = None):
+        self.registryPath = registryPath if registryPath is not None else cfg.Files.sourceRegistry
+        self.data = self._load()
+        self._changed = False
+
+    def _load(self) -> dict:
+        if not self.registryPath.exists():
+            return {}
+
+        try:
+            with open(self.registryPath) as fp:
+                data = json.load(fp)
+        except json.JSONDecodeError:
+            return {}
+
+        return data if data.get("version") == self.version else {}
+
+    def _save(self) -> None:
+        tempPath = self.registryPath.with_suffix(".tmp")
+        with open(tempPath, "w") as fp:
+            json.dump(self.data, fp, indent=4)
+
+        tempPath.replace(self.registryPath)
+
+    def getLocations(self) -> dict[str, dict[str, dict]]:
+        # Folders are only listed again when their modified time changes, configs are checked individually as editing doesn't change their folder
+        sourcesDir = cfg.Folders.dataSources
+        mtime = sourcesDir.stat().st_mtime
+        if self.data.get("mtime") != mtime:
+            names = sorted(path.name for path in sourcesDir.iterdir() if path.is_dir() and path.name != "__pycache__")
+            previous = self.data.get("locations", {})
+            self.data = {"version": self.version, "mtime": mtime, "locations": {name: previous.get(name, {}) for name in names}}
+            self._changed = True
+
+        locations = {name: self._getDatabases(sourcesDir / name, entry) for name, entry in self.data["locations"].items()}
+
+        if self._changed:
+            self._save()
+            self._changed = False
+
+        return locations
+
+    def _getDatabases(self, locationPath: Path, entry: dict) -> dict[str, dict]:
+        mtime = locationPath.stat().st_mtime
+        if entry.get("mtime") != mtime:
+            names = sorted(path.name for path in locationPath.iterdir() if path.is_dir() and path.name != "__pycache__")
+            previous = entry.get("databases", {})
+            entry |= {"mtime": mtime, "databases": {name: previous.get(name, {}) for name in names}}
+            self._changed = True
+
+        for name, databaseEntry in entry["databases"].items():
+            self._checkDatabase(locationPath / name / Database.configFile, databaseEntry)
+
+        return entry["databases"]
+
+    def _checkDatabase(self, configPath: Path, entry: dict) -> None:
+        mtime = configPath.stat().st_mtime if configPath.exists() else None
+        if "mtime" in entry and entry["mtime"] == mtime:
+            return
+
+        entry.clear()
+        entry["mtime"] = mtime
+        self._changed = True
+
+        if mtime is None:
+            return
+
+        try:
+            with open(configPath) as fp:
+                config = json.load(fp)
+        except json.JSONDecodeError:
+            return
+
+        entry["retrieveType"] = config.get("retrieveType", None)
+        entry["subsections"] = list(config.get("subsections", {}))
+
 class SourceManager:
     def __init__(self):
         self.locations: dict[str, Location] = {}
-        
-        for locationPath in cfg.Folders.dataSources.iterdir():
-            locationObj = Location(locationPath)
-            self.locations[locationObj.locationName] = locationObj
+        self.registry = SourceRegistry()
+
+        for locationName, databases in self.registry.getLocations().items():
+            self.locations[locationName] = Location(cfg.Folders.dataSources / locationName, databases)
     
     def getLocations(self) -> dict[str, 'Location']:
         return self.locations
 
-    def requestDBs(self, source: str) -> list[BasicDB]:
+    def _splitSource(self, source: str) -> tuple[str, str, str] | None:
         sourceInformation = source.split("-")
 
         if len(sourceInformation) >= 4:
+            return None
+
+        return tuple((sourceInformation + ["", ""])[:3]) # Force sourceInformation to be 3 long
+
+    def validateSource(self, source: str) -> str:
+        # Returns an error for sources that can't be loaded, without loading them
+        sourceParts = self._splitSource(source)
+        if sourceParts is None:
+            return f"Unknown source: {source}"
+
+        locationStr, databaseStr, subsectionStr = sourceParts
+
+        location = self.locations.get(locationStr, None)
+        if location is None:
+            return f"Invalid location: {locationStr}"
+
+        if databaseStr and databaseStr not in location.getDatabases():
+            return f"Invalid database: {databaseStr}"
+
+        if subsectionStr and (not databaseStr or subsectionStr not in location.getDatabases()[databaseStr].getSubsections()):
+            return f"Invalid subsection: {subsectionStr}"
+
+        return ""
+
+    def countDBs(self, source: str) -> int:
+        # Number of sources that would be loaded from the registry, for sources that are valid
+        locationStr, databaseStr, subsectionStr = self._splitSource(source)
+        databases = self.locations[locationStr].getDatabases()
+        if subsectionStr:
+            return 1
+
+        if databaseStr:
+            return max(len(databases[databaseStr].getSubsections()), 1)
+
+        return sum(max(len(database.getSubsections()), 1) for database in databases.values())
+
+    def requestDBs(self, source: str) -> list['BasicDB']:
+        sourceParts = self._splitSource(source)
+        if sourceParts is None:
             Logger.error(f"Unknown source: {source}")
             return []
         
-        locationStr, databaseStr, subsectionStr = (sourceInformation + ["", ""])[:3] # Force sourceInformation to be 3 long
+        locationStr, databaseStr, subsectionStr = sourceParts
 
         location = self.locations.get(locationStr, None)
         if location is None:
@@ -32,22 +154,19 @@ class SourceManager:
         return location.loadDBs(databaseStr, subsectionStr)
 
 class Location:
-    def __init__(self, locationPath: Path):
+    def __init__(self, locationPath: Path, databases: dict[str, dict]):
         self.locationPath = locationPath
         self.locationName = locationPath.stem
 
-        # Setup databases
+        # Setup databases from their registry entries
         self.databases: dict[str, Database] = {}
-        for databaseFolder in locationPath.iterdir():
-            if databaseFolder.is_file() or databaseFolder.name == "__pycache__": # Skip files and cached python folder
-                continue
-
-            self.databases[databaseFolder.stem] = Database(self.locationName, databaseFolder)
+        for databaseName, entry in databases.items():
+            self.databases[databaseName] = Database(self.locationName, locationPath / databaseName, entry)
 
     def getDatabases(self) -> dict[str, 'Database']:
         return self.databases
 
-    def loadDBs(self, database: str, subsection: str) -> list[BasicDB]:
+    def loadDBs(self, database: str, subsection: str) -> list['BasicDB']:
         constructDBs = []
         if database:
             if database not in self.databases:
@@ -66,16 +185,27 @@ class Location:
         
 class Database:
     configFile = "config.json"
-    dbMapping = {
-        Retrieve.URL: BasicDB,
-        Retrieve.CRAWL: CrawlDB,
-        Retrieve.SCRIPT: ScriptDB
-    }
 
-    def __init__(self, locationName: str, databasePath: Path):
+    def __init__(self, locationName: str, databasePath: Path, entry: dict = {}):
         self.locationName = locationName
         self.databasePath = databasePath
         self.databaseName = databasePath.stem
+        self.entry = entry
+
+    def getRetrieveType(self) -> str | None:
+        return self.entry.get("retrieveType", None)
+
+    def getSubsections(self) -> list[str]:
+        return self.entry.get("subsections", [])
+
+    def _getDBTypes(self) -> dict:
+        from lib.data.database import BasicDB, CrawlDB, ScriptDB, Retrieve
+
+        return {
+            Retrieve.URL: BasicDB,
+            Retrieve.CRAWL: CrawlDB,
+            Retrieve.SCRIPT: ScriptDB
+        }
 
     def _loadConfig(self) -> dict | None:
         configPath = self.databasePath / self.configFile
@@ -106,7 +236,7 @@ class Database:
 
         return {key: translate(value) for key, value in config.items()}
         
-    def constructDBs(self, subsection: str) -> list[BasicDB]:
+    def constructDBs(self, subsection: str) -> list['BasicDB']:
         databaseConfig = self._loadConfig()
         if databaseConfig is None:
             return []
@@ -116,10 +246,10 @@ class Database:
             Logger.error(f"No retrieve type specified for database '{self.locationName}-{self.databaseName}'")
             return []
         
-        retrieveType = Retrieve(retrieveType)
-        dbType = self.dbMapping.get(retrieveType, None)
+        dbMapping = self._getDBTypes()
+        dbType = next((dbType for key, dbType in dbMapping.items() if key.value == retrieveType), None)
         if dbType is None:
-            Logger.error(f"Database {self.databaseName} has invalid retrieve type: {retrieveType.value}. Should be one of: {', '.join(key.value for key in self.dbMapping)}")
+            Logger.error(f"Database {self.databaseName} has invalid retrieve type: {retrieveType}. Should be one of: {', '.join(key.value for key in dbMapping)}")
             return []
         
         # Determine which subsections to load
@@ -1,8 +1,13 @@
 from __future__ import annotations
 import numpy as np
 import pandas as pd
-import urllib.error
+import pyarrow as pa
+import io
 import json
+import time
+import pickle
+import hashlib
+import requests
 import lib.config as cfg
 from pathlib import Path
 from enum import Enum
@@ -26,11 +31,59 @@ class MappedColumn:
     event: Event
     colName: str
 
+class MapCache:
+    # Compiled sheet maps with their reverse lookup, keyed by sheet id and revalidated against the sheet revision
+    version = 1
+
+    def __init__(self, cacheDir: Path = None, maxAge: int = 3600):
+        self.cacheDir = cacheDir if cacheDir is not None else cfg.Folders.mapping / "cache"
+        self.maxAge = maxAge
+
+    def _getPath(self, sheetID: int) -> Path:
+        return self.cacheDir / f"{sheetID}.pkl"
+
+    def load(self, sheetID: int) -> dict | None:
+        cachePath = self._getPath(sheetID)
+        if not cachePath.exists():
+            return None
+
+        try:
+            with open(cachePath, "rb") as fp:
+                entry = pickle.load(fp)
+        except (pickle.UnpicklingError, EOFError, AttributeError):
+            Logger.warning(f"Unable to read map cache {cachePath}, removing")
+            cachePath.unlink()
+            return None
+
+        if entry.get("version") != self.version:
+            return None
+
+        return entry
+
+    def save(self, sheetID: int, entry: dict) -> None:
+        self.cacheDir.mkdir(parents=True, exist_ok=True)
+        entry["version"] = self.version
+
+        # Written to a temporary file first so an interrupted write doesn't leave a broken cache
+        tempPath = self._getPath(sheetID).with_suffix(".tmp")
+        with open(tempPath, "wb") as fp:
+            pickle.dump(entry, fp, protocol=pickle.HIGHEST_PROTOCOL)
+
+        tempPath.replace(self._getPath(sheetID))
+
+    def isFresh(self, entry: dict) -> bool:
+        return time.time() - entry["checked"] < self.maxAge
+
 class Map:
-    def __init__(self, mappings: dict = {}) -> Map:
+    _documentID = "1dglYhHylG5_YvpslwuRWOigbF5qhU-uim11t_EE_cYE"
+    _cache = MapCache()
+
+    def __init__(self, mappings: dict = {}, lookup: dict = None) -> Map:
         self._mappings = mappings
 
-        if mappings:
+        if lookup is not None:
+            self._lookup = lookup
+        elif mappings:
             self._lookup = self._reverseLookup(mappings)
         else:
             self._lookup = {}
@@ -55,26 +108,51 @@ class Map:
         return cls(mappings)
 
     @classmethod
-    def fromSheets(cls, sheetID: int) -> Map:
-        documentID = "1dglYhHylG5_YvpslwuRWOigbF5qhU-uim11t_EE_cYE"
-        retrieveURL = f"https://docs.google.com/spreadsheets/d/{documentID}/export?format=csv&gid={sheetID}"
+    def fromSheets(cls, sheetID: int, forceRetrieve: bool = False) -> Map:
+        entry = cls._cache.load(sheetID)
+        if entry is not None and cls._cache.isFresh(entry) and not forceRetrieve:
+            return cls(entry["mappings"], entry["lookup"])
+
+        retrieveURL = f"https://docs.google.com/spreadsheets/d/{cls._documentID}/export?format=csv&gid={sheetID}"
+
+        # Conditional request so an unchanged sheet isn't downloaded again
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("lastModified"):
+                headers["If-Modified-Since"] = entry["lastModified"]
 
         try:
-            df = pd.read_csv(retrieveURL, keep_default_na=False)
-        except urllib.error.HTTPError:
-            Logger.warning(f"Unable to read sheet with id: {sheetID}")
-            return cls()
+            response = requests.get(retrieveURL, headers=headers, timeout=30)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            if entry is None:
+                Logger.warning(f"Unable to read sheet with id: {sheetID}")
+                return cls()
+
+            Logger.warning(f"Unable to revalidate sheet with id: {sheetID}, using cached map ({e})")
+            return cls(entry["mappings"], entry["lookup"])
+
+        revision = hashlib.sha256(response.content).hexdigest()
+        if entry is None or (response.status_code != 304 and revision != entry["revision"]):
+            mappings = cls._parseSheet(pd.read_csv(io.BytesIO(response.content), keep_default_na=False))
+            entry = {"mappings": mappings, "lookup": cls._reverseLookup(mappings), "revision": revision}
+            Logger.info(f"Compiled map for sheet with id: {sheetID}")
 
+        entry |= {"etag": response.headers.get("ETag", entry.get("etag")), "lastModified": response.headers.get("Last-Modified", entry.get("lastModified")), "checked": time.time()}
+        cls._cache.save(sheetID, entry)
+
+        return cls(entry["mappings"], entry["lookup"])
+
+    @staticmethod
+    def _parseSheet(df: pd.DataFrame) -> dict[Event, dict[str, list[str]]]:
         fields = "Field Name"
         eventColumns = [col for col in df.columns if col[0] == "T" and col[1].isdigit()]
         mappings = {event: {} for event in Event}
 
         for column, event in zip(eventColumns, mappings.keys()):
-            subDF = df[[fields, column]] # Select only the dwc name and event columns
-            for _, row in subDF.iterrows():
-                dwcName = row[fields]
-                oldName = row[column]
-
+            for dwcName, oldName in zip(df[fields], df[column]): # Only the dwc name and event columns
                 # Clean the old name cell
                 if not oldName:
                     continue
@@ -97,11 +175,19 @@ class Map:
                 oldName = [subname.split("::")[-1].strip(" :") for subname in oldName.split(",")] # Overwrite old name with list of subnames
                 mappings[Event(event)][dwcName] = oldName
 
-        return cls(mappings)
+        return mappings
     
     def hasMappings(self) -> bool:
         return len(self._mappings) > 0
 
+    def hasSameMappings(self, other: Map) -> bool:
+        return self._mappings == other._mappings
+
+    @classmethod
+    def isSheetCopy(cls, sheetID: int, dwcMap: Map) -> bool:
+        entry = cls._cache.load(sheetID)
+        return entry is not None and entry["mappings"] == dwcMap._mappings
+
     def saveToFile(self, filePath: Path) -> None:
         output = {}
         for event, dwcMap in self._mappings.items():
@@ -193,40 +279,34 @@ class Remapper:
         self.prefixUnmapped = prefixUnmapped
 
         self.table = None
+        self._eventPlans: dict[tuple[str], dict[Event, dict[str, str]]] = {}
 
-    def _loadMaps(self, forceRetrieve: bool = False) -> list[Map]:
-        maps = []
+    def _loadMap(self, localPath: Path, sheetID: int | None, forceRetrieve: bool, name: str) -> Map | None:
+        # A local map that is only a copy of the sheet is revalidated through the map cache, so sheet changes are picked up
+        # Local maps that differ from the compiled sheet were edited by hand and are always used as is
+        localMap = Map.fromFile(localPath)
+        useLocal = sheetID is None or (localMap.hasMappings() and not forceRetrieve and not Map.isSheetCopy(sheetID, localMap))
+        sheetMap = Map() if useLocal else Map.fromSheets(sheetID, forceRetrieve)
 
-        dwcMap = Map.fromFile(self.localMapPath)
-        if not dwcMap.hasMappings() or forceRetrieve:
-            dwcMap = Map.fromSheets(self.mapID)
+        if not sheetMap.hasMappings(): # Local only, or the sheet is unavailable and not cached
+            if not localMap.hasMappings():
+                return None
 
-            if dwcMap.hasMappings():
-                Logger.info("Added sheets map")
-                maps.append(dwcMap)
-                dwcMap.saveToFile(self.localMapPath)
-        else:
-            Logger.info("Added local map")
-            maps.append(dwcMap)
-        
-        if self.customMapPath is not None:
-            customMap = Map.fromFile(self.customMapPath)
+            Logger.info(f"Added local {name}")
+            return localMap
 
-            if not customMap.hasMappings():
-                if self.customMapID is not None:
-                    customMap = Map.fromSheets(self.customMapID)
+        Logger.info(f"Added sheets {name}")
+        if not sheetMap.hasSameMappings(localMap):
+            sheetMap.saveToFile(localPath)
 
-                    if customMap.hasMappings():
-                        Logger.info("Added sheets custom map")
-                        maps.append(customMap)
+        return sheetMap
 
-                        if self.customMapPath is not None:
-                            customMap.saveToFile(self.customMapPath)
-            else:
-                Logger.info("Added local custom map")
-                maps.append(customMap)
+    def _loadMaps(self, forceRetrieve: bool = False) -> list[Map]:
+        maps = [self._loadMap(self.localMapPath, self.mapID, forceRetrieve, "map")]
+        if self.customMapPath is not None:
+            maps.append(self._loadMap(self.customMapPath, self.customMapID, forceRetrieve, "custom map"))
 
-        return maps
+        return [dwcMap for dwcMap in maps if dwcMap is not None]
 
     def buildTable(self, columns: list[str], skipRemap: list[str] = [], forceRetrieve: bool = False) -> bool:
         def buildUnmapped(column: str) -> MappedColumn:
@@ -262,22 +342,39 @@ class Remapper:
                 table.addTranslation(column, buildUnmapped(column))
 
         self.table = table
+        self._eventPlans.clear()
         return True
 
-    def applyTranslation(self, df: pd.DataFrame) -> pd.DataFrame:
-        eventColumns = {}
-        if self.table is None:
-            raise Exception("No table defined, please call buildTable before this method.")
+    def _getEventPlan(self, columns: list[str]) -> dict[Event, dict[str, str]]:
+        # Source columns to output columns under each event, chunks of a file share the same plan
+        key = tuple(columns)
+        if key in self._eventPlans:
+            return self._eventPlans[key]
 
-        for column in df.columns:
+        eventColumns = {}
+        for column in columns:
             for mappedColumn in self.table.getTranslation(column):
                 if mappedColumn.event not in eventColumns:
                     eventColumns[mappedColumn.event] = {}
 
                 eventColumns[mappedColumn.event][column] = mappedColumn.colName
 
-        for eventName, colMap in eventColumns.items():
+        self._eventPlans[key] = eventColumns
+        return eventColumns
+
+    def applyTranslation(self, df: pd.DataFrame) -> pd.DataFrame:
+        if self.table is None:
+            raise Exception("No table defined, please call buildTable before this method.")
+
+        eventColumns = {}
+        for eventName, colMap in self._getEventPlan(list(df.columns)).items():
             subDF: pd.DataFrame = df[colMap.keys()].copy() # Select only relevant columns
             eventColumns[eventName] = subDF.rename(colMap, axis=1)
 
         return pd.concat(eventColumns.values(), keys=eventColumns.keys(), axis=1)
+
+    def applyTableTranslation(self, table: pa.Table) -> dict[Event, pa.Table]:
+        if self.table is None:
+            raise Exception("No table defined, please call buildTable before this method.")
+
+        return {event: table.select(list(colMap.keys())).rename_columns(list(colMap.values())) for event, colMap in self._getEventPlan(table.column_names).items()}
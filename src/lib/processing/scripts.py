@@ -1,8 +1,10 @@
 from pathlib import Path
 from lib.processing.stages import File, Folder
 from lib.tools.logger import Logger
+from lib.tools.profiler import Span, Tracer, pathRows, pathSize
 import importlib.util
 from enum import Enum
+from types import ModuleType
 import traceback
 import lib.config as cfg
 
@@ -15,6 +17,24 @@ class Key(Enum):
     OUTPUT_DIR  = "OUTDIR"
     OUTPUT_PATH = "OUTPATH"
 
+_moduleCache: dict[Path, tuple[float, ModuleType]] = {}
+
+def loadModule(modulePath: Path) -> ModuleType:
+    # Modules are executed once per process, and again only if the file is modified
+    modulePath = modulePath.resolve()
+    mtime = modulePath.stat().st_mtime
+
+    cached = _moduleCache.get(modulePath, None)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    spec = importlib.util.spec_from_file_location(modulePath.stem, modulePath)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    _moduleCache[modulePath] = (mtime, module)
+    return module
+
 class Script:
     _libDir = cfg.Folders.src / "lib"
 
@@ -28,6 +48,8 @@ class Script:
         self.function: str = scriptInfo.pop("function", None)
         self.args: list[str] = scriptInfo.pop("args", [])
         self.kwargs: dict[str, str] = scriptInfo.pop("kwargs", {})
+        self.setup: dict = scriptInfo.pop("setup", {}) # Function in the same module run once, returning extra kwargs for the main function
+        self.lastSpan: Span = None # Measurements of the last run
 
         if self.path is None:
             raise Exception("No script path specified") from AttributeError
@@ -59,6 +81,16 @@ class Script:
         self.args = [self._parseArg(arg) for arg in self.args]
         self.kwargs = {key: self._parseArg(arg) for key, arg in self.kwargs.items()}
 
+        if isinstance(self.setup, str):
+            self.setup = {"function": self.setup}
+
+        self.setup["args"] = [self._parseArg(arg) for arg in self.setup.get("args", [])]
+        self.setup["kwargs"] = {key: self._parseArg(arg) for key, arg in self.setup.get("kwargs", {}).items()}
+
+        # Setup result, kept until the module is reloaded
+        self._setupModule: ModuleType = None
+        self._setupKwargs: dict = {}
+
     def run(self, overwrite: bool = False, verbose: bool = False, args: list = [], kwargs: dict = {}) -> bool:
         if isinstance(self.output, File) and self.output.exists():
             if not overwrite:
@@ -89,7 +121,13 @@ class Script:
             Logger.info(msg)
 
         try:
-            processFunction(*args, **kwargs)
+            with Tracer.span(self.function, "script", path=self.path) as span:
+                self.lastSpan = span
+                span.bytesIn = sum(pathSize(file.filePath) for file in self.inputs)
+                span.rowsIn = sum(pathRows(file.filePath) for file in self.inputs)
+                processFunction(*args, **(self._getSetupKwargs(loadModule(self.path)) | kwargs))
+                span.bytesOut = pathSize(self.output.filePath)
+                span.rowsOut = pathRows(self.output.filePath)
         except KeyboardInterrupt:
             Logger.info("Cancelled external script")
             self.output.restoreBackUp()
@@ -112,11 +150,24 @@ class Script:
         self.output.deleteBackup()
         return True
     
+    def call(self, *args: list, **kwargs: dict) -> any:
+        # Calls the function in process and returns its result, for scripts run many times such as augments on each chunk
+        module = loadModule(self.path)
+        return getattr(module, self.function)(*self.args, *args, **(self._getSetupKwargs(module) | self.kwargs | kwargs))
+
+    def _getSetupKwargs(self, module: ModuleType) -> dict:
+        if "function" not in self.setup:
+            return {}
+
+        if module is not self._setupModule: # Run again if the module was modified and reloaded
+            Logger.info(f"Running setup '{self.setup['function']}' for '{self.function}'")
+            self._setupKwargs = getattr(module, self.setup["function"])(*self.setup["args"], **self.setup["kwargs"]) or {}
+            self._setupModule = module
+
+        return self._setupKwargs
+
     def _importFunction(self, modulePath: Path, functionName: str) -> callable:
-        spec = importlib.util.spec_from_file_location(modulePath.name, modulePath)
-        module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(module)
-        return getattr(module, functionName)
+        return getattr(loadModule(modulePath), functionName)
 
     def _parseArg(self, arg: any, excludeKeys: list[Key] = []) -> Path | str:
         if not isinstance(arg, str):
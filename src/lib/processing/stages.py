@@ -1,14 +1,11 @@
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import lib.commonFuncs as cmn
 from pathlib import Path
-from enum import Enum
-from collections.abc import Iterator
+from collections.abc import Callable, Iterator
 from lib.tools.logger import Logger
-
-class Step(Enum):
-    DOWNLOAD   = 0
-    PROCESSING = 1
-    CONVERSION = 2
+from lib.tools.typedReader import getSchema, typedChunkGenerator, tableChunkGenerator, regroupBatches
 
 class File:
     def __init__(self, filePath: Path, fileProperties: dict = {}):
@@ -56,11 +53,18 @@ class File:
     def delete(self) -> None:
         self.filePath.unlink(True)
     
-    def loadDataFrame(self, offset: int = 0, rows: int = None, **kwargs: dict) -> pd.DataFrame:
+    def getSchema(self, cachePath: Path) -> dict[str, str]:
+        return getSchema(self.filePath, cachePath, self.separator, self.firstRow, self.encoding)
+
+    def loadDataFrame(self, offset: int = 0, rows: int = None, schema: dict[str, str] = None, **kwargs: dict) -> pd.DataFrame:
+        if schema is not None:
+            chunks = list(typedChunkGenerator(self.filePath, 1024 * 64, schema, self.separator, self.firstRow + offset, self.encoding, nrows=rows))
+            return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=list(schema))
+
         return pd.read_csv(self.filePath, sep=self.separator, header=self.firstRow + offset, encoding=self.encoding, nrows=rows, **kwargs)
     
-    def loadDataFrameIterator(self, chunkSize: int = 1024, offset: int = 0, rows: int = -1) -> Iterator[pd.DataFrame]:
-        return cmn.chunkGenerator(self.filePath, chunkSize, self.separator, self.firstRow + offset, self.encoding, nrows=rows)
+    def loadDataFrameIterator(self, chunkSize: int | Callable[[], int] = 1024, offset: int = 0, rows: int = -1, schema: dict[str, str] = None) -> Iterator[pd.DataFrame]:
+        return cmn.chunkGenerator(self.filePath, chunkSize, self.separator, self.firstRow + offset, self.encoding, nrows=rows, schema=schema)
 
     def getColumns(self) -> list[str]:
         return cmn.getColumns(self.filePath, self.separator, self.firstRow)
@@ -88,21 +92,108 @@ class Folder(File):
     def getColumns(self) -> TypeError:
         return TypeError
 
+class StackedChunk:
+    # Aligned rows from each event file, kept as separate arrow tables until a dataframe is needed
+    def __init__(self, tables: dict[str, pa.Table]):
+        self.tables = tables
+
+    def __len__(self) -> int:
+        return max((table.num_rows for table in self.tables.values()), default=0)
+
+    def __getitem__(self, event: str) -> pa.Table:
+        return self.tables[event]
+
+    def getEvents(self) -> list[str]:
+        return list(self.tables)
+
+    def select(self, events: list[str] = None, columns: list[str] = None) -> 'StackedChunk':
+        tables = {event: table for event, table in self.tables.items() if events is None or event in events}
+        if columns is not None:
+            tables = {event: table.select([column for column in table.column_names if column in columns]) for event, table in tables.items()}
+
+        return StackedChunk(tables)
+
+    def toPandas(self) -> pd.DataFrame:
+        if not self.tables:
+            return pd.DataFrame()
+
+        return pd.concat([table.to_pandas() for table in self.tables.values()], axis=1, keys=self.tables.keys())
+
 class StackedFile(Folder):
-    def _getFiles(self) -> list[Path]:
-        return [file for file in self.filePath.iterdir() if file.suffix == ".csv"]
+    _fileFormats = (".csv", ".parquet")
+
+    def _getFiles(self, events: list[str] = None) -> list[Path]:
+        # An event written in more than one format only uses the newest file
+        files: dict[str, Path] = {}
+        for file in self.filePath.iterdir():
+            if file.suffix not in self._fileFormats or (events is not None and file.stem not in events):
+                continue
+
+            if file.stem in files:
+                Logger.warning(f"Found multiple files for event '{file.stem}' in {self.filePath}, using the newest")
+                if files[file.stem].stat().st_mtime >= file.stat().st_mtime:
+                    continue
+
+            files[file.stem] = file
+
+        return list(files.values())
+
+    def _getFileColumns(self, file: Path, offset: int = 0) -> list[str]:
+        if file.suffix == ".parquet":
+            return pq.read_schema(file).names
+
+        return cmn.getColumns(file, self.separator, offset)
+
+    def _getProjection(self, events: list[str], columns: list[str], offset: int) -> dict[Path, list[str] | None]:
+        # Event files without any of the requested columns are not opened
+        projection = {}
+        for file in self._getFiles(events):
+            if columns is None:
+                projection[file] = None
+                continue
+
+            fileColumns = [column for column in self._getFileColumns(file, offset) if column in columns]
+            if fileColumns:
+                projection[file] = fileColumns
+
+        return projection
+
+    def _tableReader(self, file: Path, chunkSize: int, offset: int, rows: int, columns: list[str] | None) -> Iterator[pa.Table]:
+        if file.suffix == ".parquet":
+            batches = pq.ParquetFile(file).iter_batches(batch_size=chunkSize, columns=columns)
+            return regroupBatches(batches, chunkSize, rows) # Batches are split at row group boundaries
+
+        schema = {column: "string" for column in self._getFileColumns(file, offset)}
+        return tableChunkGenerator(file, chunkSize, schema, self.separator, offset, self.encoding, columns, rows, skipInvalid=False) # A skipped row would misalign every following row with the other events
+
+    def loadChunks(self, chunkSize: int = 1024, offset: int = 0, rows: int = None, events: list[str] = None, columns: list[str] = None) -> Iterator[StackedChunk]:
+        readers = {file.stem: self._tableReader(file, chunkSize, offset, rows, fileColumns) for file, fileColumns in self._getProjection(events, columns, offset).items()}
+        if not readers:
+            return
 
-    def loadDataFrame(self, offset: int = 0, rows: int = None, **kwargs: dict) -> pd.DataFrame:
-        dfs = {file.stem: pd.read_csv(file, sep=self.separator, header=offset, nrows=rows, encoding=self.encoding, **kwargs) for file in self._getFiles()}
-        return pd.concat(dfs.values(), axis=1, keys=dfs.keys())
-    
-    def loadDataFrameIterator(self, chunkSize: int = 1024, offset: int = 0, rows: int = None) -> Iterator[pd.DataFrame]:
-        sections = {file.stem: pd.read_csv(file, sep=self.separator, chunksize=chunkSize, header=offset, nrows=rows, encoding=self.encoding) for file in self._getFiles()}
         while True:
-            try:
-                yield pd.concat([next(chunk) for chunk in sections.values()], axis=1, keys=sections.keys())
-            except StopIteration:
+            tables = {event: next(reader, None) for event, reader in readers.items()}
+            if all(table is None for table in tables.values()):
                 return
 
+            rowCounts = {event: (table.num_rows if table is not None else 0) for event, table in tables.items()}
+            if len(set(rowCounts.values())) > 1:
+                raise Exception(f"Event files in {self.filePath} have different numbers of rows, unable to align chunk: {rowCounts}") from AttributeError
+
+            yield StackedChunk(tables)
+
+    def head(self, rows: int = 10, events: list[str] = None, columns: list[str] = None) -> StackedChunk:
+        return next(self.loadChunks(rows, rows=rows, events=events, columns=columns), StackedChunk({}))
+
+    def loadDataFrame(self, offset: int = 0, rows: int = None, columns: list[str] = None, events: list[str] = None) -> pd.DataFrame:
+        chunks = list(self.loadChunks(1024 * 64, offset, rows, events, columns))
+        if not chunks:
+            return pd.DataFrame()
+
+        return StackedChunk({event: pa.concat_tables(chunk[event] for chunk in chunks) for event in chunks[0].getEvents()}).toPandas()
+    
+    def loadDataFrameIterator(self, chunkSize: int = 1024, offset: int = 0, rows: int = None, events: list[str] = None, columns: list[str] = None) -> Iterator[pd.DataFrame]:
+        return (chunk.toPandas() for chunk in self.loadChunks(chunkSize, offset, rows, events, columns))
+
     def getColumns(self) -> dict[str, list[str]]:
-        return {file.stem: cmn.getColumns(file) for file in self._getFiles()}
+        return {file.stem: self._getFileColumns(file) for file in self._getFiles()}
@@ -0,0 +1,6 @@
+from enum import Enum
+
+class Step(Enum):
+    DOWNLOAD   = 0
+    PROCESSING = 1
+    CONVERSION = 2
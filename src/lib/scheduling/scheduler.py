@@ -1,51 +1,162 @@
 import json
-import time
-from lib.scheduling.updaters import createUpdater, Updater
-from lib.processing.stageFile import StageFileStep
-from lib.sourceManager import SourceManager
+import heapq
+import threading
+import multiprocessing
+import concurrent.futures
+import lib.config as cfg
+from pathlib import Path
+from typing import Callable, TYPE_CHECKING
+from datetime import datetime, timedelta
+from lib.data.orchestrator import Action, runTask
+from lib.systemManagers.metadata import MetadataManager
+from lib.tools.logger import Logger
+
+if TYPE_CHECKING:
+    from lib.data.database import BasicDB
+
+class Clock:
+    def now(self) -> datetime:
+        return datetime.now()
+
+    def sleep(self, seconds: float, wake: threading.Event) -> None:
+        wake.wait(seconds) # Woken early when an update finishes
+
+class FakeClock(Clock):
+    # Time only moves when slept, so schedules can be stepped through without waiting
+    def __init__(self, start: datetime):
+        self.current = start
+
+    def now(self) -> datetime:
+        return self.current
+
+    def sleep(self, seconds: float, wake: threading.Event) -> None:
+        self.current += timedelta(seconds=seconds)
+
+def runUpdate(sourceName: str) -> bool:
+    # Each update runs in its own process so a crash or leak in one source doesn't affect the scheduler
+    process = multiprocessing.get_context("spawn").Process(target=runTask, args=(sourceName, Action.UPDATE, (True, True), True, {}), name=f"{sourceName}-update")
+    process.start()
+    process.join()
+    return process.exitcode == 0
 
 class Scheduler:
-    def __init__(self):
-        with open("sourceUpdates.json") as fp:
-            sourceUpdates: dict[str, dict] = json.load(fp)
-
-        self.sources: dict[str, Updater] = {}
-        self.queue: list[Updater] = []
-        self.manager = SourceManager()
-
-        for location, database in sourceUpdates.items():
-            for name, properties in database.items():
-                self.sources[f"{location}-{name}"] = createUpdater(location, name, properties)
-
-    def _getSourceTimes(self) -> dict[str, int]:
-        updateTimes = {source: updater.getTimeTilUpdate() for source, updater in self.sources.items()}
-        return {k: v for k, v in sorted(updateTimes.items(), key=lambda x: x[1])}
-
-    def run(self):
-        updateTimes = self._getSourceTimes()
-
-        while True:    
-            for source, timeTilUpdate in updateTimes.items():
-                if timeTilUpdate == 0:
-                    print(f"Updating {source}...")
-                    self.manager.getDB(source).update()
-                    continue
-
-                sleepTime = timeTilUpdate
-                break
-            else:
-                sleepTime = 0
-
-            print(f"All sources updated, sleeping for {sleepTime}s until next source update")
-
-            try:
-                time.sleep(sleepTime)
-            except KeyboardInterrupt:
-                print("Exiting...")
-                break
-
-            updateTimes = self._getSourceTimes()
-            
-if __name__ == "__main__":
-    scheduler = Scheduler()
-    scheduler.run()
+    def __init__(self, sources: list['BasicDB'], workers: int = 2, statePath: Path = None, clock: Clock = None, runner: Callable[[str], bool] = runUpdate, retryDelay: int = 3600, maxRetryDelay: int = 86400, maxSleep: int = 3600):
+        self.sources = {str(source): source for source in sources}
+        self.workers = workers
+        self.statePath = statePath if statePath is not None else cfg.Files.schedulerState
+        self.clock = clock if clock is not None else Clock()
+        self.runner = runner
+
+        self.retryDelay = retryDelay
+        self.maxRetryDelay = maxRetryDelay
+        self.maxSleep = maxSleep # Sources are checked again at least this often
+
+        self.state: dict[str, dict] = self._loadState()
+        self.queue: list[tuple[datetime, str]] = [] # Heap of next run time and source
+        self.running: dict[str, concurrent.futures.Future] = {}
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self._wake = threading.Event()
+        self._stopped = False
+
+        for sourceName in self.sources:
+            nextRun = self.state.get(sourceName, {}).get("nextRun")
+            self._schedule(sourceName, datetime.fromisoformat(nextRun) if nextRun else self._getNextUpdate(sourceName))
+
+    def _loadState(self) -> dict:
+        if not self.statePath.exists():
+            return {}
+
+        try:
+            with open(self.statePath) as fp:
+                return json.load(fp)
+        except json.JSONDecodeError:
+            Logger.warning(f"Unable to read scheduler state {self.statePath}, starting fresh")
+            return {}
+
+    def _saveState(self) -> None:
+        tempPath = self.statePath.with_suffix(".tmp")
+        with open(tempPath, "w") as fp:
+            json.dump(self.state, fp, indent=4)
+
+        tempPath.replace(self.statePath)
+
+    def _getNextUpdate(self, sourceName: str) -> datetime:
+        # Metadata is read again as it is written by the update process, including checks that found nothing had changed
+        source = self.sources[sourceName]
+        lastCheck = MetadataManager(source.subsectionDir).getLastCheck()
+        return source.updateManager.getNextUpdate(lastCheck, self.clock.now())
+
+    def _schedule(self, sourceName: str, nextRun: datetime) -> None:
+        heapq.heappush(self.queue, (nextRun, sourceName))
+        self.state.setdefault(sourceName, {})["nextRun"] = nextRun.isoformat()
+
+    def _finish(self, sourceName: str, future: concurrent.futures.Future) -> None:
+        now = self.clock.now()
+        try:
+            success = future.result()
+        except Exception as e:
+            Logger.error(f"Error updating {sourceName}: {e}")
+            success = False
+
+        sourceState = self.state.setdefault(sourceName, {})
+        sourceState |= {"lastRun": now.isoformat(), "lastSuccess": success}
+
+        if success:
+            sourceState["failures"] = 0
+            nextRun = self._getNextUpdate(sourceName)
+            if nextRun <= now: # Metadata didn't move forward, so wait as if it had failed
+                nextRun = now + timedelta(seconds=self.retryDelay)
+        else:
+            sourceState["failures"] = sourceState.get("failures", 0) + 1
+            nextRun = now + timedelta(seconds=min(self.retryDelay * 2 ** (sourceState["failures"] - 1), self.maxRetryDelay))
+
+        Logger.info(f"Finished update of {sourceName} ({'success' if success else 'failed'}), next run at {nextRun}")
+        self._schedule(sourceName, nextRun)
+
+    def step(self) -> float:
+        # Collects finished updates and starts due ones, returning seconds until the next source is due
+        for sourceName, future in list(self.running.items()):
+            if future.done():
+                del self.running[sourceName]
+                self._finish(sourceName, future)
+
+        now = self.clock.now()
+        while self.queue and self.queue[0][0] <= now and len(self.running) < self.workers:
+            _, sourceName = heapq.heappop(self.queue)
+            Logger.info(f"Starting update of {sourceName}")
+            self.running[sourceName] = self._executor.submit(self.runner, sourceName)
+            self.running[sourceName].add_done_callback(lambda _: self._wake.set())
+
+        self._saveState()
+
+        if len(self.running) >= self.workers or not self.queue:
+            return self.maxSleep
+
+        return min(max((self.queue[0][0] - now).total_seconds(), 0), self.maxSleep)
+
+    def run(self, until: datetime = None) -> None:
+        Logger.info(f"Scheduling updates for {len(self.sources)} sources with {self.workers} workers")
+        try:
+            while not self._stopped and (until is None or self.clock.now() < until):
+                sleepTime = self.step()
+                if sleepTime > 0:
+                    self._wake.clear()
+                    self.clock.sleep(sleepTime, self._wake)
+
+        except KeyboardInterrupt:
+            Logger.info("Stopping scheduler, waiting for running updates to finish")
+
+        self._executor.shutdown(wait=True)
+        for sourceName, future in list(self.running.items()):
+            del self.running[sourceName]
+            self._finish(sourceName, future)
+
+        self._saveState()
+
+    def stop(self) -> None:
+        self._stopped = True
+        self._wake.set()
+
+    def getSchedule(self) -> list[tuple[datetime, str]]:
+        return sorted(self.queue)
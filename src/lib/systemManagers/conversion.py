@@ -1,28 +1,45 @@
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 from pathlib import Path
 import lib.commonFuncs as cmn
-from lib.tools.bigFileWriter import BigFileWriter
+from lib.tools.bigFileWriter import BigFileWriter, Format
+from lib.tools.keyedStore import KeyedStore
+from lib.tools.fieldProfiler import DataProfile
+from lib.tools.typedReader import ColumnType, tableChunkGenerator, toPandas
 from lib.processing.mapping import Remapper, Event
 from lib.processing.stages import File, StackedFile
 from lib.processing.scripts import Script
 from lib.tools.logger import Logger
+from lib.tools.profiler import Tracer, pathSize
+from lib.tools.pipelining import Prefetcher, AsyncWriter
+from lib.tools.chunkSizer import ChunkSizer
 import gc
-import time
+import functools
 from datetime import datetime
+from enum import Enum
+from typing import Callable, Iterator
+
+class Engine(Enum):
+    PANDAS = "pandas"
+    ARROW  = "arrow"
 
 class ConversionManager:
-    def __init__(self, baseDir: Path, converionDir: Path, datasetID: str, location: str, database: str, subsection: str):
+    def __init__(self, baseDir: Path, converionDir: Path, datasetID: str, location: str, database: str, subsection: str, profilePath: Path = None):
         self.baseDir = baseDir
         self.conversionDir = converionDir
+        self.profilePath = profilePath if profilePath is not None else converionDir / "profile.json"
         self.location = location
         self.datasetID = datasetID
 
         self.output = StackedFile(self.conversionDir / (f"{location}-{database}" + (f"-{subsection}" if subsection else "")))
+        self.storeDir = self.conversionDir / f"{self.output.filePath.name}_store"
+        self.changesDir = self.conversionDir / f"{self.output.filePath.name}_changes"
 
         self.fileLoaded = False
 
-    def loadFile(self, file: File, properties: dict, mapDir: Path) -> None:
+    def loadFile(self, file: File, properties: dict, mapDir: Path, tunedChunkSize: int = None) -> None:
         self.file = file
 
         self.mapID = properties.pop("mapID", -1)
@@ -30,12 +47,37 @@ class ConversionManager:
         self.customMapPath = properties.pop("customMapPath", None)
 
         self.chunkSize = properties.pop("chunkSize", 1024)
+
+        # Chunk size adjusted while reading towards a memory target per parsed chunk, starting from the size a previous conversion settled on
+        self.adaptiveChunks = properties.pop("adaptiveChunks", False)
+        self.chunkMemory = properties.pop("chunkMemory", 64) # MB
+        self.tunedChunkSize = tunedChunkSize
+        self._chunkSizer: ChunkSizer = None
+
+        # Reading and writing chunks on their own threads, overlapping with converting, holding at most the queue depths in memory
+        self.pipelined = properties.pop("pipelined", False)
+        self.prefetchDepth = properties.pop("prefetchDepth", 2)
+        self.writeQueueDepth = properties.pop("writeQueueDepth", 2)
+        self._reader: Prefetcher = None
+        self.typedRead = properties.pop("typedRead", False)
+        self.columnTypes = {column: ColumnType(columnType).value for column, columnType in properties.pop("columnTypes", {}).items()} # Only declared columns are read as numbers or bools
+        self.engine = Engine(properties.pop("engine", Engine.PANDAS.value))
         self.setNA = properties.pop("setNA", [])
         self.fillNA = ColumnFiller(properties.pop("fillNA", {}))
         self.skipRemap = properties.pop("skipRemap", [])
         self.preserveDwC = properties.pop("preserveDwC", False)
         self.prefixUnmapped = properties.pop("prefixUnmapped", True)
         self.augments = [Script(self.baseDir, self.conversionDir, augProperties, []) for augProperties in properties.pop("augment", [])]
+        self.storeProperties = properties.pop("store", {})
+
+        # Column statistics collected from each converted chunk
+        self.profile = properties.pop("profile", False)
+        self.profileTopK = properties.pop("profileTopK", 10)
+
+        # Output format for each event file, parquet output is compressed with low cardinality columns dictionary encoded
+        self.outputFormat = Format(f".{properties.pop('outputFormat', 'csv').lower()}")
+        self.compression = properties.pop("compression", "zstd")
+        self.dictionaryColumns = properties.pop("dictionaryColumns", ["dataset_id", "taxon_rank", "nomenclatural_code"])
 
         self.remapper = Remapper(mapDir, self.mapID, self.customMapID, self.customMapPath, self.location, self.preserveDwC, self.prefixUnmapped)
         self.fileLoaded = True
@@ -52,6 +94,10 @@ class ConversionManager:
         if self.output.filePath.exists() and not overwrite:
             Logger.info(f"{self.output.filePath} already exists, exiting...")
             return True, {}
+
+        if self.storeProperties and "key" not in self.storeProperties: # Records are matched between conversions by this key, so it can't be guessed
+            Logger.error("No unique 'key' column provided for storing conversion, exiting...")
+            return False, {}
         
         # Get columns and create mappings
         Logger.info("Getting column mappings")
@@ -74,54 +120,242 @@ class ConversionManager:
         writers: dict[str, BigFileWriter] = {}
         for event in self.remapper.table.getEventCategories():
             cleanedName = event.value.lower().replace(" ", "_")
-            writers[event] = BigFileWriter(self.output.filePath / f"{cleanedName}.csv", f"{cleanedName}_chunks")
+            writers[event] = BigFileWriter(self.output.filePath / f"{cleanedName}{self.outputFormat.value}", f"{cleanedName}_chunks", compression=self.compression, dictionaryColumns=self.dictionaryColumns)
+
+        stores: dict[Event, tuple[KeyedStore, KeyedStore]] = {}
+        if self.storeProperties:
+            storeKey = self.storeProperties["key"]
+            keyEvent = Event(self.storeProperties.get("event", Event.COLLECTION.value))
+            partitions = self.storeProperties.get("partitions", 64)
+
+            for event in writers:
+                cleanedName = event.value.lower().replace(" ", "_")
+                previous = KeyedStore(self.storeDir / cleanedName, storeKey, partitions)
+                store = KeyedStore(self.storeDir / f"{cleanedName}_new", storeKey, previous.partitions)
+                store.startBuild()
+                stores[event] = (store, previous)
+
+        profile = DataProfile(self.profileTopK) if self.profile else None
+        self.profilePath.unlink(True) # Don't leave statistics of a previous conversion next to the new output
 
         Logger.info("Processing chunks for conversion")
 
         totalRows = 0
-        startTime = time.perf_counter()
+        with Tracer.span(self.output.filePath.name, "conversion", engine=self.engine.value) as conversionSpan:
+            conversionSpan.bytesIn = pathSize(self.file.filePath)
 
-        chunks = cmn.chunkGenerator(self.file.filePath, self.chunkSize, self.file.separator, self.file.firstRow, self.file.encoding)
-        for idx, df in enumerate(chunks, start=1):
-            if verbose:
-                print(f"At chunk: {idx}", end='\r')
+            schema = self.file.getSchema(self.baseDir / "schema.json") | self.columnTypes if self.typedRead else None # Cached next to the source config
+            if self.adaptiveChunks:
+                self._chunkSizer = ChunkSizer(self.tunedChunkSize or self.chunkSize, self.chunkMemory * 1024**2)
+                Logger.info(f"Adapting chunk size from {self._chunkSizer.size} rows towards {self.chunkMemory}MB per chunk")
 
-            df = self.remapper.applyTranslation(df) # Returns a multi-index dataframe
-            for na in self.setNA:
-                df = df.replace(na, np.NaN)
+            chunks = self._arrowChunks(columns, schema) if self.engine == Engine.ARROW else self._pandasChunks(schema)
 
-            df = self.fillNA.apply(df)
-            df = self.applyAugments(df)
-            df[(Event.COLLECTION, "dataset_id")] = self.datasetID
-            df[(Event.COLLECTION, "entity_id")] = df[(Event.COLLECTION, "dataset_id")] + df[(Event.COLLECTION, "scientific_name")]
+            missingKey = False
+            asyncWriters: dict[Event, AsyncWriter] = {}
+            if self.pipelined:
+                for event, writer in writers.items():
+                    store = stores[event][0] if event in stores else None
+                    asyncWriters[event] = AsyncWriter(functools.partial(_writeEvent, writer, store), self.writeQueueDepth, event.value)
 
-            for eventColumn in df.columns.levels[0]:
-                writers[eventColumn].writeDF(df[eventColumn])
+            try:
+                for chunkSpan, df in Tracer.spans(chunks, "chunk", "conversion"):
+                    if verbose:
+                        print(f"At chunk: {chunkSpan.attributes['index']}", end='\r')
 
-            totalRows += len(df)
-            del df
-            gc.collect()
+                    if stores and (keyEvent, storeKey) not in df.columns:
+                        Logger.error(f"Unable to store conversion, no column '{storeKey}' under event '{keyEvent.value}'")
+                        missingKey = True
+                        break
 
-        for writer in writers.values():
-            writer.oneFile()
+                    for eventColumn in df.columns.levels[0]:
+                        eventDF = df[eventColumn]
+                        storeDF = eventDF.assign(**{storeKey: df[(keyEvent, storeKey)]}) if eventColumn in stores else None
+
+                        if eventColumn in asyncWriters:
+                            asyncWriters[eventColumn].submit((eventDF, storeDF))
+                        else:
+                            _writeEvent(writers[eventColumn], stores[eventColumn][0] if eventColumn in stores else None, (eventDF, storeDF))
+
+                        if profile is not None:
+                            profile.update(eventDF, eventColumn.value)
+
+                    totalRows += len(df)
+                    chunkSpan.rowsOut = len(df)
+                    del df, eventDF, storeDF
+                    gc.collect()
+
+                if not missingKey:
+                    for asyncWriter in asyncWriters.values(): # Wait for queued chunks to be written
+                        asyncWriter.close()
+
+            finally:
+                for asyncWriter in asyncWriters.values():
+                    asyncWriter.cancel()
+
+            if missingKey:
+                self._discard(writers, stores)
+                return False, {}
+
+            try: # Stores are checked before writing output so duplicate keys don't leave a partial conversion
+                changes = self._updateStores(stores)
+            except Exception as e:
+                Logger.error(str(e))
+                self._discard(writers, stores)
+                return False, {}
+
+            for writer in writers.values():
+                writer.oneFile()
+                for otherFormat in Format: # Output from a conversion in another format would be read alongside this one
+                    if otherFormat != self.outputFormat:
+                        writer.outputFile.with_suffix(otherFormat.value).unlink(True)
+            conversionSpan.rowsOut = totalRows
+            conversionSpan.bytesOut = pathSize(self.output.filePath)
 
         metadata = {
             "output": self.output.filePath.name,
             "success": True,
-            "duration": time.perf_counter() - startTime,
+            **conversionSpan.stats(),
             "timestamp": datetime.now().isoformat(),
             "columns": len(columns),
             "unmappedColumns": len(self.remapper.table.getUnmapped()),
-            "rows": totalRows
+            "rows": totalRows,
+            "format": self.outputFormat.value.lstrip("."),
+            "engine": self.engine.value
         }
+
+        if changes:
+            metadata["changes"] = changes
+
+        if self._chunkSizer is not None:
+            metadata["chunking"] = self._chunkSizer.summary()
+            Logger.info(f"Settled on chunk size of {self._chunkSizer.size} rows at {metadata['chunking']['bytesPerRow']} bytes per row")
+
+        if self.pipelined:
+            metadata["queues"] = {"read": self._reader.stats()} | {event.value: asyncWriter.stats() for event, asyncWriter in asyncWriters.items()}
+            depths = ", ".join(f"{name} {stats['meanDepth']}/{stats['size']}" for name, stats in metadata["queues"].items())
+            Logger.info(f"Mean queue depths: {depths}")
+
+        if profile is not None:
+            profile.save(self.profilePath)
+            metadata["profile"] = self.profilePath.name
+            Logger.info(f"Saved column profile to {self.profilePath}")
         
         return True, metadata
 
+    def _getChunkSize(self) -> int | Callable[[], int]:
+        return self._chunkSizer.getSize if self._chunkSizer is not None else self.chunkSize
+
+    def _readChunks(self, chunks: Iterator) -> Iterator:
+        if not self.pipelined:
+            return chunks
+
+        self._reader = Prefetcher(chunks, self.prefetchDepth)
+        return iter(self._reader)
+
+    def _pandasChunks(self, schema: dict[str, str] | None) -> Iterator[pd.DataFrame]:
+        for df in self._readChunks(self.file.loadDataFrameIterator(self._getChunkSize(), rows=None, schema=schema)):
+            if self._chunkSizer is not None:
+                self._chunkSizer.observeChunk(df)
+
+            df = self.remapper.applyTranslation(df) # Returns a multi-index dataframe
+            for na in self.setNA:
+                df = df.replace(na, np.NaN)
+
+            df = self.fillNA.apply(df)
+            df = self.applyAugments(df)
+            yield self._addIdentifiers(df)
+
+    def _arrowChunks(self, columns: list[str], schema: dict[str, str] | None) -> Iterator[pd.DataFrame]:
+        # Remapping, setting and filling of values and identifiers are done on arrow tables with multithreaded kernels
+        # Augments still receive the same multi-index pandas dataframe as the pandas engine
+        if schema is None:
+            schema = {column: "string" for column in columns}
+
+        for table in self._readChunks(tableChunkGenerator(self.file.filePath, self._getChunkSize(), schema, self.file.separator, self.file.firstRow, self.file.encoding)):
+            if self._chunkSizer is not None:
+                self._chunkSizer.observeChunk(table)
+
+            tables = self.remapper.applyTableTranslation(table)
+            for event, eventTable in tables.items():
+                for na in self.setNA:
+                    eventTable = pa.table([_setNull(eventTable[column], na) for column in eventTable.column_names], names=eventTable.column_names)
+
+                tables[event] = eventTable
+
+            tables = self.fillNA.applyTables(tables)
+            if not self.augments:
+                tables = self._addTableIdentifiers(tables)
+
+            df = pd.concat([toPandas(eventTable) for eventTable in tables.values()], keys=tables.keys(), axis=1)
+            if self.augments:
+                df = self._addIdentifiers(self.applyAugments(df))
+
+            yield df
+
+    def _addIdentifiers(self, df: pd.DataFrame) -> pd.DataFrame:
+        df[(Event.COLLECTION, "dataset_id")] = self.datasetID
+        df[(Event.COLLECTION, "entity_id")] = df[(Event.COLLECTION, "dataset_id")] + df[(Event.COLLECTION, "scientific_name")].astype(object) # Typed reads may give arrow or categorical columns
+        return df
+
+    def _addTableIdentifiers(self, tables: dict[Event, pa.Table]) -> dict[Event, pa.Table]:
+        rows = next(iter(tables.values())).num_rows
+        datasetID = pa.array([self.datasetID] * rows, pa.string())
+        table = tables.get(Event.COLLECTION, pa.table({"dataset_id": datasetID}))
+        scientificName = table["scientific_name"] if "scientific_name" in table.column_names else pa.nulls(table.num_rows, pa.string())
+
+        table = _setColumn(table, "dataset_id", datasetID)
+        tables[Event.COLLECTION] = _setColumn(table, "entity_id", pc.binary_join_element_wise(datasetID, pc.cast(scientificName, pa.string()), ""))
+        return tables
+
+    def _updateStores(self, stores: dict[Event, tuple[KeyedStore, KeyedStore]]) -> dict[str, dict]:
+        if not stores:
+            return {}
+
+        for store, _ in stores.values(): # Every store is built before any replaces the previous one
+            store.finishBuild(True)
+
+        self.changesDir.mkdir(parents=True, exist_ok=True)
+
+        summary = {}
+        for event, (store, previous) in stores.items():
+            changes = store.compare(previous)
+            summary[event.value] = changes.summary()
+
+            if previous.exists(): # A first conversion has no previous records to change
+                store.exportChanges(changes, self.changesDir / f"{previous.storeDir.name}.csv")
+
+            cmn.clearFolder(previous.storeDir, True)
+            store.storeDir.rename(previous.storeDir)
+
+            Logger.info(f"Updated '{event.value}' store with changes: {summary[event.value]}")
+
+        return summary
+
+    def _discard(self, writers: dict[Event, BigFileWriter], stores: dict[Event, tuple[KeyedStore, KeyedStore]]) -> None:
+        # Removes subfiles and new stores of a failed conversion, leaving previous stores untouched
+        for writer in writers.values():
+            cmn.clearFolder(writer.subfileDir, True)
+
+        for store, _ in stores.values():
+            cmn.clearFolder(store.storeDir, True)
+
+        for folder in (self.output.filePath, self.storeDir): # Only created for this conversion if left empty
+            if folder.exists() and not any(folder.iterdir()):
+                folder.rmdir()
+
     def applyAugments(self, df: pd.DataFrame) -> pd.DataFrame:
         for augment in self.augments:
-            df = augment.run(args=[df])
+            df = augment.call(df)
         return df
     
+def _writeEvent(writer: BigFileWriter, store: KeyedStore | None, item: tuple[pd.DataFrame, pd.DataFrame | None]) -> None:
+    eventDF, storeDF = item
+    writer.writeDF(eventDF)
+
+    if store is not None:
+        store.stage(storeDF)
+
 class ColumnFiller:
     def __init__(self, fillProperties: dict[str, dict]):
         self.fillProperties = fillProperties
@@ -138,6 +372,17 @@ class ColumnFiller:
     def _validEvent(self, event: str) -> bool:
         return event in Event._value2member_map_
     
+    def applyTables(self, tables: dict[Event, pa.Table]) -> dict[Event, pa.Table]:
+        for event, columns in self.fillProperties.items():
+            for columnName, mapTo in columns.items():
+                source = tables[Event(event)][columnName]
+                for mapToEvent, mapToColumnList in mapTo.items():
+                    for mapToColumn in mapToColumnList:
+                        table = tables[Event(mapToEvent)]
+                        tables[Event(mapToEvent)] = _setColumn(table, mapToColumn, pc.coalesce(table[mapToColumn], pc.cast(source, table.schema.field(mapToColumn).type)))
+
+        return tables
+
     def apply(self, df: pd.DataFrame) -> pd.DataFrame:
         for event, columns in self.fillProperties.items():
             for columnName, mapTo in columns.items():
@@ -146,3 +391,17 @@ class ColumnFiller:
                         df[(mapToEvent, mapToColumn)].fillna(df[(event, columnName)], inplace=True)
 
         return df
+
+def _setColumn(table: pa.Table, column: str, values: pa.Array | pa.ChunkedArray) -> pa.Table:
+    if column in table.column_names:
+        return table.set_column(table.column_names.index(column), column, values)
+
+    return table.append_column(column, values)
+
+def _setNull(values: pa.ChunkedArray, na: any) -> pa.Array:
+    if not pa.types.is_string(values.type):
+        return values
+
+    values = values.combine_chunks()
+    matches = pc.fill_null(pc.equal(values, str(na)), False)
+    return pc.replace_with_mask(values, matches, pa.nulls(len(values), values.type)) # if_else returns invalid offsets for sliced string arrays
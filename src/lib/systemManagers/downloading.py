@@ -4,6 +4,7 @@ from lib.processing.stages import File
 from lib.processing.scripts import Script
 from lib.tools.logger import Logger
 import lib.tools.downloading as dl
+from lib.tools.profiler import Tracer, pathRows, pathSize
 import time
 from datetime import datetime
 
@@ -56,6 +57,8 @@ class DownloadManager:
             self.username = ""
             self.password = ""
 
+        self.auth = dl.buildAuth(self.username, self.password) if self.username else None
+
         self.downloads: list[_Download] = []
 
     def getFiles(self) -> list[File]:
@@ -64,6 +67,14 @@ class DownloadManager:
     def getLatestFile(self) -> File:
         return self.files[-1].file
 
+    def probe(self, urls: list[str], pages: list[str]) -> dict | None:
+        # Fingerprints of all remote files, None if any of them can't be fingerprinted
+        fingerprints = {url: dl.probe(url, auth=self.auth) for url in urls} | {page: dl.pageDigest(page, auth=self.auth) for page in pages}
+        if not fingerprints or None in fingerprints.values():
+            return None
+
+        return fingerprints
+
     def download(self, overwrite: bool = False, verbose: bool = False) -> tuple[bool, dict]:
         if not self.downloadDir.exists():
             self.downloadDir.mkdir(parents=True)
@@ -73,13 +84,15 @@ class DownloadManager:
         startTime = time.perf_counter()
 
         for download in self.downloads:
-            downloadStart = time.perf_counter()
-            success = download.retrieve(overwrite, verbose)
+            with Tracer.span(download.file.filePath.name, "download") as span:
+                success = download.retrieve(overwrite, verbose)
+                span.bytesOut = pathSize(download.file.filePath)
+                span.rowsOut = pathRows(download.file.filePath) # Only for uncompressed tables
 
             metadata["files"].append({
                 "output": download.file.filePath.name,
                 "success": success,
-                "duration": time.perf_counter() - downloadStart,
+                **span.stats(),
                 "timestamp": datetime.now().isoformat()
             })
 
@@ -1,6 +1,6 @@
 import json
 from pathlib import Path
-from lib.processing.stages import Step
+from lib.processing.steps import Step
 from lib.tools.logger import Logger
 from datetime import datetime
 
@@ -11,6 +11,9 @@ class MetadataManager:
         Step.CONVERSION: "converting"
     }
 
+    _updateKey = "updating"
+    _remoteKey = "remote"
+
     def __init__(self, databaseDir: Path):
         self.metadataPath = databaseDir / "metadata.json"
         self._load()
@@ -42,9 +45,52 @@ class MetadataManager:
 
         Logger.info(f"Updated {key} metadata and saved to file")
 
+    def getStepMetadata(self, step: Step) -> dict:
+        return self.data.get(self._stepKeys[step], {})
+
     def getLastDownloadUpdate(self) -> datetime | None:
         subsectionData = self.data.get(self._stepKeys[Step.DOWNLOAD], None)
         if subsectionData is None:
             return None
         
         return min(datetime.fromisoformat(item["timestamp"]) for item in subsectionData["files"])
+
+    def recordPartialUpdate(self, metadata: dict) -> None:
+        self.data[self._updateKey] = metadata
+        self._save()
+
+        Logger.info("Updated partial update metadata and saved to file")
+
+    def getLastUpdate(self) -> datetime | None:
+        lastDownload = self.getLastDownloadUpdate()
+        partialData = self.data.get(self._updateKey, None)
+        if partialData is None or not partialData["success"]:
+            return lastDownload
+
+        lastPartial = datetime.fromisoformat(partialData["timestamp"])
+        if lastDownload is None:
+            return lastPartial
+
+        return max(lastDownload, lastPartial)
+
+    def getRemote(self) -> dict | None:
+        return self.data.get(self._remoteKey, {}).get("files", None)
+
+    def recordRemote(self, fingerprints: dict) -> None:
+        self.data[self._remoteKey] = {"files": fingerprints, "checked": datetime.now().isoformat()}
+        self._save()
+
+        Logger.info("Updated remote fingerprints and saved to file")
+
+    def recordRemoteCheck(self) -> None:
+        self.data.setdefault(self._remoteKey, {})["checked"] = datetime.now().isoformat()
+        self._save()
+
+    def getLastCheck(self) -> datetime | None:
+        # Last update, or a later check that found nothing had changed
+        lastUpdate = self.getLastUpdate()
+        checked = self.data.get(self._remoteKey, {}).get("checked", None)
+        if checked is None or lastUpdate is None:
+            return lastUpdate
+
+        return max(lastUpdate, datetime.fromisoformat(checked))
@@ -1,9 +1,16 @@
 from pathlib import Path
-from lib.processing.stages import File
+from lib.processing.stages import File, Folder
 from lib.processing.scripts import Script
 from lib.tools.logger import Logger
+from lib.tools.profiler import Tracer, pathSize
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import itertools
+import traceback
 import time
 from datetime import datetime
+from typing import Iterator
 
 class _Node:
     def __init__(self, script: Script, parents: list['_Node']):
@@ -31,20 +38,135 @@ class _Node:
         if not parentSuccess:
             return False, metadata
         
-        stattTime = time.perf_counter()
-        success = self.script.run(overwrite, verbose)
+        with Tracer.span(self.getFunction(), "processing") as span:
+            success = self.script.run(overwrite, verbose)
+            if self.script.lastSpan is not None:
+                span.rowsIn, span.rowsOut = self.script.lastSpan.rowsIn, self.script.lastSpan.rowsOut
 
         metadata.append({
             "function": self.getFunction(),
             "output": self.getOutput().filePath.name,
             "success": success,
-            "duration": time.perf_counter() - stattTime,
+            **span.stats(),
             "timestamp": datetime.now().isoformat()
         })
 
         self.executed = success
         return success, metadata
 
+class _StreamNode(_Node):
+    # Script takes an iterator of dataframes as the kwarg `stream` and returns an iterator of dataframes or arrow tables
+    # Adjacent streaming steps are connected in memory, so the output is only written when needed by another step or marked as a checkpoint
+    def __init__(self, script: Script, parents: list[_Node], chunkSize: int, checkpoint: bool):
+        super().__init__(script, parents)
+        self.chunkSize = chunkSize
+        self.checkpoint = checkpoint
+
+    def openStream(self, overwrite: bool, verbose: bool, streamed: list[str], metadata: list[dict]) -> Iterator[pd.DataFrame | pa.Table]:
+        # Steps written to file before this one are run first, adding to metadata
+        inputs = []
+        for parent in self.parents:
+            if isinstance(parent, _StreamNode) and not parent.checkpoint:
+                inputs.append(parent.openStream(overwrite, verbose, streamed, metadata))
+                continue
+
+            success, parentMetadata = parent.execute(overwrite, verbose)
+            metadata.extend(parentMetadata)
+            if not success:
+                raise Exception(f"Unable to stream from failed step '{parent.getFunction()}'")
+
+            inputs.append(parent.getOutput().loadDataFrameIterator(self.chunkSize, rows=None))
+
+        streamed.append(self.getFunction())
+        return self.script.call(stream=itertools.chain.from_iterable(inputs))
+
+    def execute(self, overwrite: bool, verbose: bool) -> tuple[bool, list[dict]]:
+        if self.executed:
+            return True, []
+
+        output = self.getOutput()
+        if output.exists() and not overwrite:
+            Logger.info(f"Output {output} exist and not overwriting, skipping '{self.getFunction()}'")
+            self.executed = True
+            return True, []
+
+        streamed = []
+        metadata = []
+        with Tracer.span(self.getFunction(), "processing") as span:
+            try:
+                span.rowsOut = _writeStream(self.openStream(overwrite, verbose, streamed, metadata), output)
+                success = True
+            except:
+                Logger.error(f"Error running streaming step '{self.getFunction()}':\n{traceback.format_exc()}")
+                success = False
+
+            span.bytesOut = pathSize(output.filePath)
+
+        metadata.append({
+            "function": self.getFunction(),
+            "streamed": streamed,
+            "output": output.filePath.name,
+            "success": success,
+            **span.stats(),
+            "timestamp": datetime.now().isoformat()
+        })
+
+        self.executed = success
+        return success, metadata
+
+def _alignColumns(columns: list[str], chunkColumns: list[str]) -> None:
+    # Later chunks are written under the header of the first chunk, so they can't add columns
+    newColumns = [column for column in chunkColumns if column not in columns]
+    if newColumns:
+        raise Exception(f"Stream chunk has columns not in the first chunk: {newColumns}") from AttributeError
+
+def _writeStream(stream: Iterator[pd.DataFrame | pa.Table | pa.RecordBatch], output: File) -> int:
+    # Written next to the output and moved over it once complete, so a failed stream leaves no partial file
+    # Column order is set by the first chunk, with columns missing from later chunks left empty
+    tempPath = output.filePath.with_name(f"{output.filePath.name}.tmp")
+    parquet = output.filePath.suffix == ".parquet"
+    writer: pq.ParquetWriter = None
+    columns: list[str] = None
+    rows = 0
+
+    try:
+        for chunk in stream:
+            if parquet:
+                table = pa.Table.from_pandas(chunk, preserve_index=False) if isinstance(chunk, pd.DataFrame) else pa.Table.from_batches([chunk]) if isinstance(chunk, pa.RecordBatch) else chunk
+                if writer is None:
+                    writer = pq.ParquetWriter(tempPath, table.schema)
+                    columns = table.column_names
+
+                _alignColumns(columns, table.column_names)
+                table = pa.table([table[column] if column in table.column_names else pa.nulls(table.num_rows, writer.schema.field(column).type) for column in columns], names=columns)
+                writer.write_table(table.cast(writer.schema))
+            else:
+                df = chunk if isinstance(chunk, pd.DataFrame) else chunk.to_pandas()
+                if columns is None:
+                    columns = list(df.columns)
+
+                _alignColumns(columns, df.columns)
+                df = df.reindex(columns=columns)
+                df.to_csv(tempPath, sep=output.separator, encoding=output.encoding, index=False, header=rows == 0, mode="w" if rows == 0 else "a")
+
+            rows += len(chunk)
+
+        if writer is not None:
+            writer.close()
+
+    except:
+        if writer is not None:
+            writer.close()
+
+        tempPath.unlink(True)
+        raise
+
+    if not tempPath.exists(): # Empty stream
+        tempPath.touch()
+
+    tempPath.replace(output.filePath)
+    return rows
+
 class _Root(_Node):
     def __init__(self, file: File):
         self.file = file
@@ -63,13 +185,25 @@ class ProcessingManager:
 
     def _createNode(self, step: dict, parents: list[_Node]) -> _Node | None:
         inputs = [node.getOutput() for node in parents]
+        step = dict(step)
+        stream = step.pop("stream", False)
+        checkpoint = step.pop("checkpoint", False)
+        chunkSize = step.pop("chunkSize", 100000)
+
         try:
-            script = Script(self.baseDir, self.processingDir, dict(step), inputs)
+            script = Script(self.baseDir, self.processingDir, step, inputs)
         except AttributeError as e:
             Logger.error(f"Invalid processing script configuration: {e}")
             return None
-        
-        return _Node(script, parents)
+
+        if not stream:
+            return _Node(script, parents)
+
+        if isinstance(script.output, Folder):
+            Logger.error(f"Streaming step '{script.function}' must output to a file")
+            return None
+
+        return _StreamNode(script, parents, chunkSize, checkpoint)
     
     def _addProcessing(self, node: _Node, processingSteps: list[dict]) -> _Node:
         for step in processingSteps:
@@ -1,18 +1,31 @@
-from datetime import datetime, timedelta, date
+import calendar
+from datetime import datetime, timedelta, date, time
+from enum import Enum
+
+class UpdateMethod(Enum):
+    FULL    = "full"
+    PARTIAL = "partial"
 
 class _Update:
     def __init__(self, properties: dict):
-        raise NotImplementedError
+        self.hour = properties.get("time", 0) # Hour of the day to update at
+
+    def _atHour(self, day: date) -> datetime:
+        return datetime.combine(day, time(hour=self.hour % 24))
 
-    def updateReady(self, lastUpdate: datetime) -> bool:
+    def nextUpdate(self, lastUpdate: datetime) -> datetime:
         raise NotImplementedError
 
+    def updateReady(self, lastUpdate: datetime, now: datetime) -> bool:
+        return now >= self.nextUpdate(lastUpdate)
+
 class _DailyUpdate(_Update):
     def __init__(self, properties: dict):
+        super().__init__(properties)
         self.repeat = properties.get("repeat", 3)
 
-    def updateReady(self, lastUpdate: datetime) -> bool:
-        return (lastUpdate.date() + timedelta(days=self.repeat)) < datetime.now()
+    def nextUpdate(self, lastUpdate: datetime) -> datetime:
+        return self._atHour(lastUpdate.date() + timedelta(days=self.repeat))
     
 class _WeeklyUpdate(_Update):
     days = [
@@ -26,26 +39,32 @@ class _WeeklyUpdate(_Update):
     ]
 
     def __init__(self, properties: dict):
+        super().__init__(properties)
         self.repeat = properties.get("repeat", 2)
         self.day = properties.get("day", "sunday")
         self.dayInt = self.days.index(self.day)
 
-    def updateReady(self, lastUpdate: datetime) -> bool:
-        today = datetime.today()
-        delta = today - lastUpdate
-
-        return (delta.days > ((7 * (self.repeat - 1)) + 1)) and (today.weekday() == self.dayInt)
+    def nextUpdate(self, lastUpdate: datetime) -> datetime:
+        # First matching weekday once enough weeks have passed
+        earliest = lastUpdate.date() + timedelta(days=(7 * (self.repeat - 1)) + 2)
+        return self._atHour(earliest + timedelta(days=(self.dayInt - earliest.weekday()) % 7))
     
 class _MonthlyUpdate(_Update):
     def __init__(self, properties: dict):
+        super().__init__(properties)
         self.repeat = properties.get("repeat", 1)
         self.date = properties.get("date", 1)
 
-    def updateReady(self, lastUpdate: datetime) -> date:
-        today = datetime.today()
-        delta = today - lastUpdate
+    def nextUpdate(self, lastUpdate: datetime) -> datetime:
+        # First matching day of the month once enough months have passed, clamped to the length of short months
+        earliest = lastUpdate.date() + timedelta(days=(27 * self.repeat) + 1)
+        year, month = earliest.year, earliest.month
+        while True:
+            day = date(year, month, min(self.date, calendar.monthrange(year, month)[1]))
+            if day >= earliest:
+                return self._atHour(day)
 
-        return (delta.days > (27 * self.repeat)) and (today.day == self.date)
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
 
 class UpdateManager:
     updaters = {
@@ -62,9 +81,28 @@ class UpdateManager:
             raise Exception(f"Unknown update type: {updaterType}")
 
         self.update: _Update = self.updaters[updaterType](updateConfig)
+
+        self.method = UpdateMethod(updateConfig.get("method", UpdateMethod.FULL.value))
+        self.script: dict = updateConfig.get("script", None)
+
+        # Remote files are checked for changes before updating, with extra pages compared by digest
+        self.probe: bool = updateConfig.get("probe", True)
+        self.probePages: list[str] = updateConfig.get("probePages", [])
+
+        if self.method == UpdateMethod.PARTIAL and self.script is None:
+            raise Exception("No script provided for partial update") from AttributeError
         
-    def isUpdateReady(self, lastUpdate: datetime | None) -> bool:
+    def isUpdateReady(self, lastUpdate: datetime | None, now: datetime = None) -> bool:
         if lastUpdate is None:
             return True
         
-        return self.update.updateReady(lastUpdate)
+        return self.update.updateReady(lastUpdate, now or datetime.now())
+
+    def getNextUpdate(self, lastUpdate: datetime | None, now: datetime = None) -> datetime:
+        if lastUpdate is None: # Never updated, so due straight away
+            return now or datetime.now()
+
+        return self.update.nextUpdate(lastUpdate)
+
+    def isPartial(self) -> bool:
+        return self.method == UpdateMethod.PARTIAL
@@ -1,14 +1,17 @@
 import csv
+import json
 from pathlib import Path
-import lib.commonFuncs as cmn
 import pandas as pd
 import sys
+import threading
 from enum import Enum
 import pyarrow as pa
 import pyarrow.parquet as pq
 from lib.tools.logger import Logger
 from typing import Iterator
 from lib.tools.progressBar import SteppableProgressBar
+from lib.tools.chunkSizer import chunkBytes
+from lib.tools.pipelining import AsyncWriter
 
 class Format(Enum):
     CSV = ".csv"
@@ -19,15 +22,16 @@ class Subfile:
 
     fileFormat = Format.CSV
 
-    def __new__(cls, *args):
+    def __new__(cls, *args, **kwargs):
         subclassMap = {subclass.fileFormat: subclass for subclass in cls.__subclasses__()}
-        subclass = subclassMap.get(args[-1], cls)
+        subclass = subclassMap.get(Format(args[-1]), cls)
         return super().__new__(subclass)
 
-    def __init__(self, location: Path, fileName: str, format: Format) -> 'Subfile':
+    def __init__(self, location: Path, fileName: str, format: Format, size: int = None, rows: int = None) -> 'Subfile':
         self.fileName = fileName
         self.filePath = location / f"{fileName}{Format(format).value}"
-        self.size = self.filePath.stat().st_size if self.filePath.exists() else 0
+        self.size = size if size is not None else (self.filePath.stat().st_size if self.filePath.exists() else 0) # Known sizes from the manifest skip the stat
+        self.rows = rows
 
     def __repr__(self) -> str:
         return f"{self.filePath}"
@@ -44,7 +48,7 @@ class Subfile:
     
     def read(self, **kwargs) -> pd.DataFrame | None:
         try:
-            return pd.read_csv(self.filePath, **kwargs)
+            return pd.read_csv(self.filePath, dtype=object, **kwargs)
         except pd.errors.EmptyDataError:
             return None
     
@@ -111,16 +115,37 @@ class PARQUETSubfile(Subfile):
         return pf.names
 
 class BigFileWriter:
-    def __init__(self, outputFile: Path, subDirName: str = "chunks", subsectionPrefix: str = "chunk", subfileType: Format = Format.PARQUET) -> 'BigFileWriter':
+    def __init__(self, outputFile: Path, subDirName: str = "chunks", subsectionPrefix: str = "chunk", subfileType: Format = Format.PARQUET, compression: str = "snappy", dictionaryColumns: list[str] = [], flushRows: int = 0, flushBytes: int = 64 * 1024**2, backgroundFlush: bool = False) -> 'BigFileWriter':
         self.outputFile = outputFile
         self.outputFileType = Format(outputFile.suffix)
         self.subfileDir = outputFile.parent / subDirName
         self.sectionPrefix = subsectionPrefix
         self.subfileType = subfileType
 
+        # Parquet output options
+        self.compression = compression
+        self.dictionaryColumns = dictionaryColumns
+
         self.writtenFiles: list[Subfile] = []
         self.globalColumns: list[str] = []
 
+        # Sets mirror the lists above for lookups, with each written subfile also recorded in a manifest so resuming doesn't need to open them
+        self.manifestPath = self.subfileDir / "manifest.jsonl"
+        self._subfileNames: set[str] = set()
+        self._columnSet: set[str] = set()
+
+        # Appended records are buffered and written as a subfile once either threshold is reached, 0 disables a threshold
+        self.flushRows = flushRows
+        self.flushBytes = flushBytes
+        self.backgroundFlush = backgroundFlush
+
+        self._records: list[dict] = []
+        self._frames: list[pd.DataFrame] = []
+        self._bufferedRows = 0
+        self._bufferedBytes = 0
+        self._flusher: AsyncWriter = None
+        self._lock = threading.RLock() # Background flushes write subfiles alongside direct calls to writeDF
+
         maxInt = sys.maxsize
         while True:
             try:
@@ -132,69 +157,209 @@ class BigFileWriter:
     def populateFromFolder(self, folderPath: Path = None, logIndividually: bool = False) -> None:
         if folderPath is None:
             folderPath = self.subfileDir
-        elif not folderPath.exists():
+
+        if not folderPath.exists():
             return
-        
-        fileCount = 0
-        for filePath in folderPath.iterdir():
-            if not filePath.suffix in Format._value2member_map_.keys():
+
+        filePaths = {filePath.name: filePath for filePath in folderPath.iterdir() if filePath.suffix in Format._value2member_map_}
+        manifestCount = 0
+
+        # Rewritten subfiles are recorded again, so only the latest entry for each name applies
+        entries = {entry["name"]: entry for entry in self._readManifest(folderPath / self.manifestPath.name)}
+
+        # Subfiles in the manifest are added without opening them
+        for entry in entries.values():
+            fileName = f"{entry['name']}{entry['format']}"
+            filePath = filePaths.get(fileName)
+            if filePath is None or entry["name"] in self._subfileNames: # Removed since being written
+                filePaths.pop(fileName, None)
+                continue
+
+            if filePath.stat().st_size != entry["size"]: # Changed since its entry was recorded, so it's reopened below
                 continue
 
-            subFile = Subfile.fromFilePath(filePath)
-            columns = subFile.getColumns()
+            filePaths.pop(fileName)
+
+            subfile = Subfile(folderPath, entry["name"], entry["format"], size=entry["size"], rows=entry["rows"])
+            self._addSubfile(subfile, entry["columns"])
+            manifestCount += 1
+
+            if logIndividually:
+                Logger.info(f"Added file: {subfile.filePath}")
+
+        # Anything else was written before the manifest existed, before its entry was recorded or changed since
+        fileCount = 0
+        for filePath in filePaths.values():
+            subfile = Subfile.fromFilePath(filePath)
+            columns = subfile.getColumns()
             if not columns:
                 filePath.unlink()
                 continue
 
-            self.writtenFiles.append(subFile)
-            self.globalColumns = cmn.extendUnique(self.globalColumns, columns)
+            self._addSubfile(subfile, columns)
+            if folderPath == self.subfileDir:
+                self._recordSubfile(subfile, columns)
 
             if logIndividually:
-                Logger.info(f"Added file: {subFile.filePath}")
+                Logger.info(f"Added file: {subfile.filePath}")
 
             fileCount += 1
 
-        Logger.info(f"Added {fileCount} files to written files list")
+        Logger.info(f"Added {manifestCount + fileCount} files to written files list ({fileCount} not in manifest)")
+
+    def _readManifest(self, manifestPath: Path) -> list[dict]:
+        if not manifestPath.exists():
+            return []
+
+        entries = []
+        with open(manifestPath) as fp:
+            for line in fp:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError: # Last line may be partial if a run was stopped while writing it
+                    continue
+
+        return entries
+
+    def _recordSubfile(self, subfile: Subfile, columns: list[str]) -> None:
+        # Appending a line keeps the cost of each write the same no matter how many subfiles there are
+        entry = {"name": subfile.fileName, "format": subfile.fileFormat.value, "rows": subfile.rows, "size": subfile.size, "columns": list(columns)}
+        with open(self.manifestPath, "a+") as fp:
+            end = fp.tell()
+            if end: # Start a new line after a partial one
+                fp.seek(end - 1)
+                if fp.read(1) != "\n":
+                    fp.write("\n")
+
+            fp.write(json.dumps(entry) + "\n")
+
+    def _addSubfile(self, subfile: Subfile, columns: list[str]) -> None:
+        self.writtenFiles.append(subfile)
+        self._subfileNames.add(subfile.fileName)
+
+        for column in columns:
+            if column not in self._columnSet:
+                self._columnSet.add(column)
+                self.globalColumns.append(column)
+
+    def _removeManifest(self) -> None:
+        if self.manifestPath.exists():
+            self.manifestPath.unlink()
 
     def getSubfileCount(self) -> int:
-        return len(self.writtenFiles)
+        with self._lock:
+            return len(self.writtenFiles)
     
     def getSubfileNames(self) -> list[str]:
-        return [subfile.fileName for subfile in self.writtenFiles]
+        with self._lock:
+            return [subfile.fileName for subfile in self.writtenFiles]
 
-    def writeDF(self, df: pd.DataFrame, customName: str = "", format: Format = None) -> None:
-        if not self.subfileDir.exists():
-            self.subfileDir.mkdir(parents=True)
+    def hasSubfile(self, fileName: str) -> bool:
+        with self._lock:
+            return fileName in self._subfileNames
 
+    def writeDF(self, df: pd.DataFrame, customName: str = "", format: Format = None) -> None:
         if format is None:
             format = self.subfileType
 
-        if customName:
-            fileName = customName
-            suffix = 0
+        # Naming, writing and recording a subfile happen together so concurrent writes can't take the same name
+        with self._lock:
+            if not self.subfileDir.exists():
+                self.subfileDir.mkdir(parents=True)
+
+            if customName:
+                fileName = customName
+                suffix = 0
+
+                while fileName in self._subfileNames:
+                    fileName = f"{customName}_{suffix}"
+                    suffix += 1
+
+            else:
+                fileName = f"{self.sectionPrefix}_{len(self.writtenFiles)}"
+
+            subfile = Subfile(self.subfileDir, fileName, format)
+            subfile.write(df)
+            subfile.size = subfile.filePath.stat().st_size
+            subfile.rows = len(df)
+
+            self._addSubfile(subfile, df.columns)
+            self._recordSubfile(subfile, df.columns)
+
+    def append(self, record: dict) -> None:
+        self._records.append(record)
+        self._bufferedRows += 1
+        self._bufferedBytes += sys.getsizeof(record) + sum(sys.getsizeof(value) for value in record.values())
+        self._checkFlush()
+
+    def appendBatch(self, records: list[dict] | pd.DataFrame) -> None:
+        if not isinstance(records, pd.DataFrame):
+            records = pd.DataFrame.from_records(records)
+
+        if records.empty:
+            return
+
+        self._packRecords() # Keeps records in the order they were appended
+        self._frames.append(records)
+        self._bufferedRows += len(records)
+        self._bufferedBytes += chunkBytes(records)
+        self._checkFlush()
 
-            while fileName in self.getSubfileNames():
-                fileName = f"{customName}_{suffix}"
-                suffix += 1
+    def _packRecords(self) -> None:
+        if self._records:
+            self._frames.append(pd.DataFrame.from_records(self._records))
+            self._records = []
 
+    def _checkFlush(self) -> None:
+        if (self.flushRows and self._bufferedRows >= self.flushRows) or (self.flushBytes and self._bufferedBytes >= self.flushBytes):
+            self.flush()
+
+    def flush(self) -> None:
+        self._packRecords()
+        if not self._frames:
+            return
+
+        if len(self._frames) == 1:
+            df = self._frames[0]
         else:
-            fileName = f"{self.sectionPrefix}_{len(self.writtenFiles)}"
+            df = pd.concat(self._frames, ignore_index=True)
+            if self.subfileType == Format.PARQUET: # Frames with different types for a column combine to mixed object columns, which parquet can't store
+                mixed = [column for column in df.columns if df[column].dtype == object]
+                df[mixed] = df[mixed].where(df[mixed].isna(), df[mixed].astype(str))
 
-        subfile = Subfile(self.subfileDir, fileName, format)
-        subfile.write(df)
+        self._frames = []
+        self._bufferedRows = 0
+        self._bufferedBytes = 0
 
-        self.writtenFiles.append(subfile)
-        self.globalColumns = cmn.extendUnique(self.globalColumns, df.columns)
+        if not self.backgroundFlush:
+            self.writeDF(df)
+            return
+
+        # Subfiles are written in order on a single thread, so names stay sequential
+        if self._flusher is None:
+            self._flusher = AsyncWriter(self.writeDF, 1, f"{self.sectionPrefix}-flush")
+
+        self._flusher.submit(df)
+
+    def close(self) -> None:
+        # Writes anything still buffered and waits for background writes to finish
+        self.flush()
+        if self._flusher is not None:
+            flusher, self._flusher = self._flusher, None
+            flusher.close()
 
     def oneFile(self, removeOld: bool = True) -> None:
+        self.close()
+
         if self.outputFile.exists():
             Logger.info(f"Removing old file {self.outputFile}")
             self.outputFile.unlink()
 
-        if len(self.writtenFiles) == 1:
+        if len(self.writtenFiles) == 1 and self.outputFileType != Format.PARQUET: # Parquet output is rewritten to apply schema and compression
             Logger.info(f"Only single subfile, moving {self.writtenFiles[0]} to {self.outputFile}")
 
             self.writtenFiles[0].rename(self.outputFile, self.outputFileType)
+            self._removeManifest()
             self.subfileDir.rmdir()
             return
 
@@ -206,8 +371,10 @@ class BigFileWriter:
 
         Logger.info(f"\nCreated a single file at {self.outputFile}")
         if removeOld:
+            self._removeManifest()
             self.subfileDir.rmdir()
             self.writtenFiles.clear()
+            self._subfileNames.clear()
 
     def _oneCSV(self, removeOld: bool = True):
         delim = "\t" if self.outputFileType == Format.TSV else ","
@@ -223,19 +390,28 @@ class BigFileWriter:
             chunkIterator = file.readChunks(chunkSize)
             if chunkIterator is not None:
                 for chunk in chunkIterator:
+                    chunk = chunk.reindex(columns=self.globalColumns) # Align subfiles that only contain some columns
                     chunk.to_csv(self.outputFile, mode="a", sep=delim, index=False, header=False)
 
             if removeOld:
                 file.remove()
         
     def _oneParquet(self, removeOld: bool = True):
-        schema = pa.schema([(column, pa.string()) for column in self.globalColumns])
-        with pq.ParquetWriter(self.outputFile, schema=schema) as writer:
+        # Every column keeps parquet's default dictionary encoding, low cardinality columns are also stored as arrow dictionaries which pandas reads back as categories
+        dictionaryColumns = [column for column in self.dictionaryColumns if column in self.globalColumns]
+        schema = pa.schema([(column, pa.dictionary(pa.int32(), pa.string()) if column in dictionaryColumns else pa.string()) for column in self.globalColumns])
+
+        with pq.ParquetWriter(self.outputFile, schema=schema, compression=self.compression, use_dictionary=True) as writer:
             progress = SteppableProgressBar(len(self.writtenFiles), processName="Writing")
             for file in self.writtenFiles:
                 progress.update()
-                
-                writer.write_table(pq.read_table(str(file)))
+
+                chunkIterator = file.readChunks(1024 * 64)
+                if chunkIterator is not None:
+                    for chunk in chunkIterator:
+                        chunk = chunk.reindex(columns=self.globalColumns).astype(object)
+                        chunk = chunk.where(chunk.isna(), chunk.astype(str))
+                        writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
 
                 if removeOld:
                     file.remove()
@@ -0,0 +1,53 @@
+import pandas as pd
+import pyarrow as pa
+
+class ChunkSizer:
+    # Adjusts the rows read per chunk so each parsed chunk takes about targetBytes of memory
+    def __init__(self, size: int, targetBytes: int, minSize: int = 256, maxSize: int = 1000000, maxGrowth: float = 4, smoothing: float = 0.5):
+        self.size = size
+        self.initialSize = size
+        self.targetBytes = targetBytes
+        self.minSize = minSize
+        self.maxSize = maxSize
+        self.maxGrowth = maxGrowth # Limit on how much the size changes between chunks, as early chunks may not be representative
+        self.smoothing = smoothing
+
+        self.bytesPerRow: float = None
+        self.chunks = 0
+
+    def getSize(self) -> int:
+        return self.size
+
+    def observe(self, rows: int, nbytes: int) -> None:
+        if not rows:
+            return
+
+        bytesPerRow = nbytes / rows
+        self.bytesPerRow = bytesPerRow if self.bytesPerRow is None else self.smoothing * bytesPerRow + (1 - self.smoothing) * self.bytesPerRow
+        self.chunks += 1
+
+        size = min(max(self.targetBytes / self.bytesPerRow, self.size / self.maxGrowth), self.size * self.maxGrowth)
+        self.size = int(min(max(size, self.minSize), self.maxSize))
+
+    def observeChunk(self, chunk: pd.DataFrame | pa.Table) -> None:
+        self.observe(len(chunk), chunkBytes(chunk))
+
+    def summary(self) -> dict:
+        return {
+            "chunkSize": self.size,
+            "initialSize": self.initialSize,
+            "bytesPerRow": round(self.bytesPerRow, 1) if self.bytesPerRow is not None else None,
+            "targetBytes": self.targetBytes,
+            "chunks": self.chunks
+        }
+
+def chunkBytes(chunk: pd.DataFrame | pa.Table, sampleRows: int = 1000) -> int:
+    # Deep memory usage of a dataframe is estimated from a sample, as measuring every python string is slow
+    if isinstance(chunk, pa.Table):
+        return chunk.nbytes
+
+    sample = chunk.head(sampleRows)
+    if sample.empty:
+        return 0
+
+    return int(sample.memory_usage(deep=True, index=False).sum() * len(chunk) / len(sample))
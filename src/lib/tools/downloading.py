@@ -1,3 +1,4 @@
+import hashlib
 import requests
 from pathlib import Path
 from requests.auth import HTTPBasicAuth
@@ -60,3 +61,26 @@ def download(url: str, filePath: Path, chunkSize: int = 1024*1024, verbose: bool
         print()
 
     return True
+
+def probe(url: str, headers: dict = {}, auth: HTTPBasicAuth = None) -> dict | None:
+    # Fingerprint of a remote file from its headers, without downloading it
+    try:
+        response = requests.head(url, auth=auth, headers=headers, allow_redirects=True, timeout=30)
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        Logger.warning(f"Unable to probe {url}: {e}")
+        return None
+
+    fingerprint = {key: response.headers[header] for key, header in (("etag", "ETag"), ("lastModified", "Last-Modified"), ("size", "Content-Length")) if header in response.headers}
+    return fingerprint or None
+
+def pageDigest(url: str, headers: dict = {}, auth: HTTPBasicAuth = None) -> dict | None:
+    # For pages that don't provide useful headers, such as listings or landing pages of script sources
+    try:
+        response = requests.get(url, auth=auth, headers=headers, timeout=30)
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        Logger.warning(f"Unable to probe {url}: {e}")
+        return None
+
+    return {"digest": hashlib.sha256(response.content).hexdigest()}
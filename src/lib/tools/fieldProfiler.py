@@ -0,0 +1,298 @@
+import io
+import json
+import random
+import numpy as np
+import pandas as pd
+import concurrent.futures
+import lib.commonFuncs as cmn
+from pathlib import Path
+
+class HyperLogLog:
+    # Approximate distinct count in a fixed 2^precision bytes, registers of separate sketches merge by maximum
+    def __init__(self, precision: int = 12):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, values: pd.Series) -> None:
+        if values.empty:
+            return
+
+        hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+        indexes = (hashes >> np.uint64(64 - self.precision)).astype(np.int64)
+        remainder = hashes & np.uint64((1 << (64 - self.precision)) - 1)
+        ranks = (64 - self.precision) - _bitLength(remainder) + 1 # Position of the first set bit
+        np.maximum.at(self.registers, indexes, ranks.astype(np.uint8))
+
+    def merge(self, other: 'HyperLogLog') -> None:
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        registerCount = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / registerCount)
+        estimate = alpha * registerCount ** 2 / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * registerCount and zeros: # Linear counting is more accurate for small counts
+            estimate = registerCount * np.log(registerCount / zeros)
+
+        return round(estimate)
+
+def _bitLength(values: np.ndarray) -> np.ndarray:
+    lengths = np.zeros(len(values), dtype=np.int64)
+    nonZero = values > 0
+    lengths[nonZero] = np.floor(np.log2(values[nonZero].astype(np.float64))).astype(np.int64) + 1
+    return lengths
+
+class Reservoir:
+    # Uniform sample of values from a stream of unknown length, only the accepted values are touched in python
+    def __init__(self, size: int, seed: int = 0):
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.values: list = []
+        self.seen = 0
+
+    def update(self, values: pd.Series) -> None:
+        values = values.drop_duplicates().tolist()
+        positions = np.arange(self.seen + 1, self.seen + len(values) + 1)
+        accepted = np.flatnonzero(self.rng.random(len(values)) * positions < self.size)
+        self.seen += len(values)
+
+        for idx in accepted:
+            value = values[idx]
+            if value in self.values:
+                continue
+
+            if len(self.values) < self.size:
+                self.values.append(value)
+            else:
+                self.values[self.rng.integers(self.size)] = value
+
+    def merge(self, other: 'Reservoir') -> None:
+        # Draw from each reservoir in proportion to how many values it has seen
+        ours, theirs = list(self.values), list(other.values)
+        self.rng.shuffle(ours)
+        self.rng.shuffle(theirs)
+
+        values = []
+        oursSeen, theirsSeen = self.seen, other.seen
+        while len(values) < self.size and (ours or theirs):
+            if theirs and (not ours or self.rng.random() * (oursSeen + theirsSeen) >= oursSeen):
+                value = theirs.pop()
+                theirsSeen -= 1
+            else:
+                value = ours.pop()
+                oursSeen -= 1
+
+            if value not in values:
+                values.append(value)
+
+        self.values = values
+        self.seen += other.seen
+
+class RecordSample:
+    # Keeps the most complete records, ties broken randomly so the sample isn't biased to the start of the file
+    def __init__(self, size: int, seed: int = 0):
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.records: pd.DataFrame = None
+
+    def update(self, df: pd.DataFrame) -> None:
+        ranked = df.assign(_nulls=df.isna().sum(axis=1), _key=self.rng.random(len(df)))
+        self._keep(ranked.nsmallest(self.size, ["_nulls", "_key"]))
+
+    def merge(self, other: 'RecordSample') -> None:
+        if other.records is not None:
+            self._keep(other.records)
+
+    def _keep(self, ranked: pd.DataFrame) -> None:
+        if self.records is not None:
+            ranked = pd.concat([self.records, ranked], ignore_index=True)
+
+        self.records = ranked.nsmallest(self.size, ["_nulls", "_key"])
+
+    def getRecords(self) -> pd.DataFrame:
+        if self.records is None:
+            return pd.DataFrame()
+
+        return self.records.drop(columns=["_nulls", "_key"]).reset_index(drop=True)
+
+class FieldProfiler:
+    def __init__(self, columns: list[str], entryLimit: int = 50, seed: int = 0, precision: int = 12):
+        self.columns = columns
+        self.rows = 0
+        self.nulls = {column: 0 for column in columns}
+        self.distinct = {column: HyperLogLog(precision) for column in columns}
+        self.samples = {column: Reservoir(entryLimit, seed + idx) for idx, column in enumerate(columns)}
+        self.records = RecordSample(entryLimit, seed)
+
+    def update(self, df: pd.DataFrame) -> None:
+        self.rows += len(df)
+        for column in self.columns:
+            if column not in df.columns:
+                self.nulls[column] += len(df)
+                continue
+
+            values = df[column].dropna()
+            self.nulls[column] += len(df) - len(values)
+            self.distinct[column].update(values)
+            self.samples[column].update(values)
+
+        self.records.update(df)
+
+    def merge(self, other: 'FieldProfiler') -> None:
+        self.rows += other.rows
+        for column in self.columns:
+            self.nulls[column] += other.nulls[column]
+            self.distinct[column].merge(other.distinct[column])
+            self.samples[column].merge(other.samples[column])
+
+        self.records.merge(other.records)
+
+    def summary(self) -> dict[str, dict]:
+        return {
+            column: {
+                "count": self.rows - self.nulls[column],
+                "nullRate": round(self.nulls[column] / self.rows, 4) if self.rows else 0,
+                "distinct": self.distinct[column].estimate(),
+                "values": self.samples[column].values
+            } for column in self.columns
+        }
+
+    def getRecords(self) -> pd.DataFrame:
+        return self.records.getRecords()
+
+class TopValues:
+    # Approximate most frequent values, counts are pruned to a multiple of k so memory stays bounded
+    def __init__(self, k: int = 10, capacityFactor: int = 10):
+        self.k = k
+        self.capacity = k * capacityFactor
+        self.counts = pd.Series(dtype=np.int64)
+
+    def update(self, values: pd.Series) -> None:
+        counts = self.counts.add(values.value_counts(), fill_value=0)
+        self.counts = counts.nlargest(self.capacity) if len(counts) > self.capacity else counts
+
+    def top(self) -> list[tuple[str, int]]:
+        return [(str(value), int(count)) for value, count in self.counts.nlargest(self.k).items()]
+
+class ColumnStatistics:
+    def __init__(self, topK: int = 10, precision: int = 12):
+        self.count = 0
+        self.minLength = None
+        self.maxLength = None
+        self.distinct = HyperLogLog(precision)
+        self.topValues = TopValues(topK)
+
+    def update(self, values: pd.Series) -> None:
+        values = values.dropna().astype(object) # Categorical and arrow backed columns are counted and hashed as plain values
+        if values.empty:
+            return
+
+        lengths = values.astype(str).str.len()
+        self.minLength = min(lengths.min(), self.minLength) if self.minLength is not None else lengths.min()
+        self.maxLength = max(lengths.max(), self.maxLength) if self.maxLength is not None else lengths.max()
+
+        self.count += len(values)
+        self.distinct.update(values)
+        self.topValues.update(values)
+
+    def summary(self, rows: int) -> dict:
+        return {
+            "count": self.count,
+            "fillRate": round(self.count / rows, 4) if rows else 0,
+            "distinct": self.distinct.estimate() if self.count else 0,
+            "minLength": int(self.minLength) if self.minLength is not None else None,
+            "maxLength": int(self.maxLength) if self.maxLength is not None else None,
+            "topValues": self.topValues.top()
+        }
+
+class DataProfile:
+    # Statistics of each column in groups of columns, such as the events of a conversion
+    def __init__(self, topK: int = 10, precision: int = 12):
+        self.topK = topK
+        self.precision = precision
+        self.rows: dict[str, int] = {}
+        self.columns: dict[str, dict[str, ColumnStatistics]] = {}
+
+    def update(self, df: pd.DataFrame, group: str = "") -> None:
+        self.rows[group] = self.rows.get(group, 0) + len(df)
+        columns = self.columns.setdefault(group, {})
+        for column in df.columns:
+            if column not in columns:
+                columns[column] = ColumnStatistics(self.topK, self.precision)
+
+            columns[column].update(df[column])
+
+    def summary(self) -> dict[str, dict]:
+        return {group: {"rows": self.rows[group], "columns": {column: stats.summary(self.rows[group]) for column, stats in columns.items()}} for group, columns in self.columns.items()}
+
+    def save(self, filePath: Path) -> None:
+        with open(filePath, "w") as fp:
+            json.dump(self.summary(), fp, indent=4)
+
+class _RangeReader(io.RawIOBase):
+    # Reads a byte range of a file, so each shard is streamed rather than loaded
+    def __init__(self, filePath: Path, start: int, end: int):
+        self._fp = open(filePath, "rb")
+        self._fp.seek(start)
+        self._remaining = end - start
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: bytearray) -> int:
+        size = self._fp.readinto(memoryview(buffer)[:self._remaining])
+        self._remaining -= size
+        return size
+
+    def close(self) -> None:
+        self._fp.close()
+        super().close()
+
+def _shardRanges(filePath: Path, headerRow: int, shards: int) -> list[tuple[int, int]]:
+    # Shards start on a line after an even split of the data, values containing newlines may be split between shards
+    fileSize = filePath.stat().st_size
+    with open(filePath, "rb") as fp:
+        for _ in range(headerRow + 1):
+            fp.readline()
+
+        boundaries = [fp.tell()]
+        for idx in range(1, shards):
+            fp.seek(max(boundaries[0] + (fileSize - boundaries[0]) * idx // shards, boundaries[-1]))
+            fp.readline()
+            boundaries.append(fp.tell())
+
+    boundaries.append(fileSize)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+def _profileShard(filePath: Path, start: int, end: int, columns: list[str], sep: str, encoding: str, chunkSize: int, entryLimit: int, seed: int) -> FieldProfiler:
+    profiler = FieldProfiler(columns, entryLimit, seed)
+    with io.TextIOWrapper(io.BufferedReader(_RangeReader(filePath, start, end)), encoding=encoding) as fp:
+        for chunk in pd.read_csv(fp, sep=sep, header=None, names=columns, dtype=object, chunksize=chunkSize, on_bad_lines="skip"):
+            profiler.update(chunk)
+
+    return profiler
+
+def profileFile(filePath: Path, sep: str = ",", headerRow: int = 0, encoding: str = "utf-8", entryLimit: int = 50, chunkSize: int = 10000, seed: int = None, shards: int = 1, rows: int = None) -> FieldProfiler:
+    if seed is None:
+        seed = random.randrange(2**32 - 1)
+
+    columns = cmn.getColumns(filePath, sep, headerRow)
+
+    if shards <= 1 or rows is not None: # Limiting rows reads from the start of the file
+        profiler = FieldProfiler(columns, entryLimit, seed)
+        for idx, chunk in enumerate(cmn.chunkGenerator(filePath, chunkSize, sep, headerRow, encoding, nrows=rows), start=1):
+            print(f"Scanning chunk: {idx}", end="\r")
+            profiler.update(chunk)
+
+        return profiler
+
+    ranges = _shardRanges(filePath, headerRow, shards)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=len(ranges)) as executor:
+        futures = [executor.submit(_profileShard, filePath, start, end, columns, sep, encoding, chunkSize, entryLimit, seed + idx) for idx, (start, end) in enumerate(ranges)]
+
+        profiler = FieldProfiler(columns, entryLimit, seed)
+        for future in futures:
+            profiler.merge(future.result())
+
+    return profiler
@@ -0,0 +1,212 @@
+import io
+import math
+import requests
+import pandas as pd
+import concurrent.futures
+from enum import Enum
+from pathlib import Path
+from typing import Callable
+from requests.adapters import HTTPAdapter
+from lib.tools.bigFileWriter import BigFileWriter, Format
+from lib.tools.logger import Logger
+
+class Method(Enum):
+    GET  = "GET"
+    POST = "POST"
+
+class Response(Enum):
+    JSON = "json"
+    CSV  = "csv"
+
+def extractPath(data: dict | list, path: str) -> any:
+    if not path:
+        return data
+
+    for key in path.split("."):
+        if isinstance(data, list):
+            data = data[int(key)]
+        else:
+            data = data[key]
+
+    return data
+
+def fillTemplate(template: any, values: dict) -> any:
+    if isinstance(template, str):
+        if template.startswith("{") and template.endswith("}") and template[1:-1] in values: # Keep type for whole value placeholders
+            return values[template[1:-1]]
+
+        return template.format_map(values)
+
+    if isinstance(template, list):
+        return [fillTemplate(item, values) for item in template]
+
+    if isinstance(template, dict):
+        return {key: fillTemplate(value, values) for key, value in template.items()}
+
+    return template
+
+class Harvester:
+    def __init__(self, outputFile: Path, headers: dict = {}, maxWorkers: int = 8, retries: int = 5, timeout: int = 300):
+        self.outputFile = outputFile
+        self.headers = headers
+        self.maxWorkers = maxWorkers
+        self.retries = retries
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=maxWorkers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.writer = BigFileWriter(outputFile, f"{outputFile.stem}_pages", "page", Format.CSV)
+
+    def request(self, url: str, method: Method = Method.GET, body: dict = None, headers: dict = {}) -> requests.Response | None:
+        for attempt in range(1, self.retries + 1):
+            try:
+                response = self.session.request(method.value, url, json=body, headers=headers, timeout=self.timeout)
+                response.raise_for_status()
+                return response
+            except requests.exceptions.RequestException as e:
+                Logger.warning(f"Attempt {attempt} / {self.retries} failed for {url}: {e}")
+
+        return None
+
+    def getJSON(self, url: str, method: Method = Method.GET, body: dict = None) -> dict | list | None:
+        response = self.request(url, method, body, {"accept": "application/json"})
+        if response is None:
+            return None
+
+        return response.json()
+
+    def run(self, jobs: dict[str, Callable[[], pd.DataFrame | None]]) -> bool:
+        # Each job writes to a subfile named after its key, so jobs finished on a previous run are skipped
+        self.writer.populateFromFolder(self.writer.subfileDir)
+        completed = set(self.writer.getSubfileNames())
+        remaining = {name: job for name, job in jobs.items() if name not in completed}
+
+        if len(remaining) < len(jobs):
+            Logger.info(f"Resuming from {len(jobs) - len(remaining)} / {len(jobs)} completed pages")
+
+        failed = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.maxWorkers) as executor:
+            futures = {executor.submit(job): name for name, job in remaining.items()}
+
+            try:
+                for idx, future in enumerate(concurrent.futures.as_completed(futures), start=1):
+                    print(f"At page: {idx} / {len(futures)}", end="\r")
+                    name = futures[future]
+
+                    try:
+                        df = future.result()
+                    except Exception as e:
+                        Logger.warning(f"Error getting {name}: {e}")
+                        df = None
+
+                    if df is None:
+                        failed += 1
+                        continue
+
+                    self.writer.writeDF(df, name)
+
+            except KeyboardInterrupt:
+                executor.shutdown(cancel_futures=True)
+                raise
+
+        print()
+        if failed:
+            Logger.error(f"Failed to retrieve {failed} pages, rerun to resume")
+            return False
+
+        if not self.writer.writtenFiles: # Nothing to combine, and an empty file has no header for later steps to read
+            Logger.warning(f"No pages retrieved for {self.outputFile}")
+            return False
+
+        # Pages finish in any order, so subfiles are combined in job order to keep output stable between runs
+        order = {name: idx for idx, name in enumerate(jobs)}
+        self.writer.writtenFiles.sort(key=lambda subfile: order.get(subfile.fileName, len(order)))
+        self.writer.oneFile()
+        return True
+
+# Url and body templates can use {page}, {offset} and {pageSize}
+# Record and total paths are dot separated keys into each json response
+class PagedHarvester(Harvester):
+    def __init__(
+            self,
+            outputFile: Path,
+            url: str,
+            recordPath: str,
+            totalPath: str,
+            pageSize: int,
+            firstPage: int = 0,
+            method: Method = Method.GET,
+            body: dict = None,
+            countURL: str = "",
+            countMethod: Method = Method.GET,
+            response: Response = Response.JSON,
+            recordCallback: Callable[[dict], dict] = None,
+            pageCallback: Callable[[pd.DataFrame], pd.DataFrame] = None,
+            **kwargs: dict
+        ):
+
+        self.url = url
+        self.recordPath = recordPath
+        self.totalPath = totalPath
+        self.pageSize = pageSize
+        self.firstPage = firstPage
+        self.method = method
+        self.body = body
+        self.countURL = countURL
+        self.countMethod = countMethod
+        self.response = response
+        self.recordCallback = recordCallback
+        self.pageCallback = pageCallback
+
+        super().__init__(outputFile, **kwargs)
+
+    def _templateValues(self, page: int) -> dict:
+        return {"page": page, "offset": (page - self.firstPage) * self.pageSize, "pageSize": self.pageSize}
+
+    def getTotal(self) -> int:
+        if self.countURL:
+            data = self.getJSON(self.countURL, self.countMethod)
+        else:
+            values = self._templateValues(self.firstPage)
+            data = self.getJSON(fillTemplate(self.url, values), self.method, fillTemplate(self.body, values))
+
+        if data is None:
+            return -1
+
+        return int(extractPath(data, self.totalPath))
+
+    def getPage(self, page: int) -> pd.DataFrame | None:
+        values = self._templateValues(page)
+        response = self.request(fillTemplate(self.url, values), self.method, fillTemplate(self.body, values))
+        if response is None:
+            return None
+
+        if self.response == Response.CSV:
+            df = pd.read_csv(io.StringIO(response.text), dtype=object)
+        else:
+            records = extractPath(response.json(), self.recordPath)
+            if self.recordCallback is not None:
+                records = [self.recordCallback(record) for record in records]
+
+            df = pd.DataFrame.from_records(records)
+
+        if self.pageCallback is not None:
+            df = self.pageCallback(df)
+
+        return df
+
+    def harvest(self) -> bool:
+        total = self.getTotal()
+        if total < 0:
+            Logger.error("Unable to get total record count")
+            return False
+
+        totalPages = math.ceil(total / self.pageSize)
+        Logger.info(f"Harvesting {total} records over {totalPages} pages")
+
+        jobs = {f"page_{page}": (lambda page=page: self.getPage(page)) for page in range(self.firstPage, self.firstPage + totalPages)}
+        return self.run(jobs)
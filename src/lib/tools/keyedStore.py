@@ -0,0 +1,267 @@
+import json
+import zlib
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import lib.commonFuncs as cmn
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Iterator
+from lib.tools.logger import Logger
+
+@dataclass
+class ChangeSet:
+    added: list[str] = field(default_factory=list)
+    modified: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.added) + len(self.modified) + len(self.removed)
+
+    def extend(self, other: 'ChangeSet') -> None:
+        self.added.extend(other.added)
+        self.modified.extend(other.modified)
+        self.removed.extend(other.removed)
+
+    def summary(self) -> dict[str, int]:
+        return {"added": len(self.added), "modified": len(self.modified), "removed": len(self.removed)}
+
+class KeyedStore:
+    metadataFile = "store.json"
+
+    def __init__(self, storeDir: Path, key: str, partitions: int = 64):
+        self.storeDir = storeDir
+        self._stagedChunks = 0
+        self.metadataPath = storeDir / self.metadataFile
+
+        self.key = key
+        self.partitions = partitions
+        self.columns: list[str] = []
+
+        if self.metadataPath.exists():
+            metadata = cmn.loadFromJson(self.metadataPath)
+            if metadata["key"] != key:
+                raise Exception(f"Store at {storeDir} is keyed by '{metadata['key']}', not '{key}'") from AttributeError
+
+            self.partitions = metadata["partitions"]
+            self.columns = metadata["columns"]
+
+    def exists(self) -> bool:
+        return self.metadataPath.exists()
+
+    def _saveMetadata(self) -> None:
+        with open(self.metadataPath, "w") as fp:
+            json.dump({"key": self.key, "partitions": self.partitions, "columns": self.columns}, fp, indent=4)
+
+    def _partitionPath(self, partition: int) -> Path:
+        return self.storeDir / f"part_{partition}.parquet"
+
+    def _getPartitions(self, keys: pd.Series) -> pd.Series:
+        return keys.map(lambda key: zlib.crc32(str(key).encode()) % self.partitions)
+
+    def _addColumns(self, columns: list[str]) -> None:
+        self.columns = cmn.extendUnique(self.columns, [column for column in columns if column != self.key])
+
+    def _readPartition(self, partition: int, columns: list[str] = None) -> pd.DataFrame:
+        path = self._partitionPath(partition)
+        if not path.exists():
+            return pd.DataFrame(columns=[self.key] + self.columns, dtype=object).set_index(self.key)
+
+        if columns is not None:
+            columns = [self.key] + [column for column in columns if column != self.key]
+
+        df = pq.read_table(path, columns=columns).to_pandas()
+        return df.set_index(self.key).reindex(columns=columns[1:] if columns is not None else self.columns)
+
+    def _writePartition(self, partition: int, df: pd.DataFrame) -> None:
+        path = self._partitionPath(partition)
+        if df.empty:
+            path.unlink(True)
+            return
+
+        df = df.reindex(columns=self.columns).reset_index()
+        schema = pa.schema([(column, pa.string()) for column in df.columns])
+        pq.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False), path, compression="zstd")
+
+    def _prepare(self, df: pd.DataFrame, dropDuplicates: bool = True) -> pd.DataFrame:
+        if self.key not in df.columns:
+            raise Exception(f"Unable to store records without key column '{self.key}'") from AttributeError
+
+        df = df.dropna(subset=[self.key])
+        if dropDuplicates:
+            df = df.drop_duplicates(self.key, keep="last")
+
+        df = df.where(df.isna(), df.astype(str)) # Store every value as a string, keeping nulls
+        self._addColumns(list(df.columns))
+        return df
+
+    def _stagingDir(self) -> Path:
+        return self.storeDir / "staging"
+
+    def startBuild(self) -> None:
+        self.clear()
+        self._stagingDir().mkdir(parents=True)
+        self._stagedChunks = 0
+
+    def stage(self, df: pd.DataFrame) -> None:
+        # Chunks are split by partition when staged so that each partition is only combined once
+        df = self._prepare(df, False)
+        for partition, subDF in df.groupby(self._getPartitions(df[self.key])):
+            subDF.to_parquet(self._stagingDir() / f"{partition}_{self._stagedChunks}.parquet", index=False)
+
+        self._stagedChunks += 1
+
+    def finishBuild(self, unique: bool = False) -> int:
+        # Records sharing a key keep only the last one, which fails the build instead when keys are expected to be unique
+        stagingDir = self._stagingDir()
+
+        totalRows = 0
+        duplicates = 0
+        for partition in range(self.partitions):
+            fragments = [pd.read_parquet(path) for path in stagingDir.glob(f"{partition}_*.parquet")]
+            if not fragments:
+                continue
+
+            df = pd.concat(fragments)
+            uniqueDF = df.drop_duplicates(self.key, keep="last").set_index(self.key)
+            self._writePartition(partition, uniqueDF)
+
+            totalRows += len(uniqueDF)
+            duplicates += len(df) - len(uniqueDF)
+
+        cmn.clearFolder(stagingDir, True)
+        self._saveMetadata()
+
+        if duplicates and unique:
+            raise Exception(f"Found {duplicates} records with duplicate '{self.key}' values in {self.storeDir}, store key must be unique") from AttributeError
+
+        if duplicates:
+            Logger.warning(f"Dropped {duplicates} records with duplicate '{self.key}' values")
+
+        Logger.info(f"Built store of {totalRows} records at {self.storeDir}")
+        return totalRows
+
+    def build(self, chunks: Iterator[pd.DataFrame]) -> int:
+        self.startBuild()
+        for df in chunks:
+            self.stage(df)
+
+        return self.finishBuild()
+
+    def compare(self, previous: 'KeyedStore') -> ChangeSet:
+        if previous.partitions != self.partitions:
+            raise Exception(f"Unable to compare stores with {self.partitions} and {previous.partitions} partitions") from AttributeError
+
+        changes = ChangeSet()
+        columns = cmn.extendUnique(self.columns, previous.columns)
+
+        for partition in range(self.partitions):
+            newDF = self._readPartition(partition).reindex(columns=columns)
+            oldDF = previous._readPartition(partition).reindex(columns=columns)
+
+            existing = newDF.index.intersection(oldDF.index)
+            changes.added.extend(newDF.index.difference(oldDF.index))
+            changes.removed.extend(oldDF.index.difference(newDF.index))
+
+            differs = (newDF.loc[existing].fillna("") != oldDF.loc[existing].fillna("")).any(axis=1)
+            changes.modified.extend(differs[differs].index)
+
+        return changes
+
+    def upsert(self, df: pd.DataFrame) -> ChangeSet:
+        changes = ChangeSet()
+        if df.empty:
+            return changes
+
+        self.storeDir.mkdir(parents=True, exist_ok=True)
+        df = self._prepare(df)
+
+        for partition, newDF in df.groupby(self._getPartitions(df[self.key])):
+            newDF = newDF.set_index(self.key).reindex(columns=self.columns)
+            oldDF = self._readPartition(partition).reindex(columns=self.columns)
+
+            existing = newDF.index.intersection(oldDF.index)
+            changes.added.extend(newDF.index.difference(oldDF.index))
+
+            differs = (newDF.loc[existing].fillna("") != oldDF.loc[existing].fillna("")).any(axis=1)
+            changes.modified.extend(differs[differs].index)
+
+            oldDF = oldDF.drop(existing)
+            self._writePartition(partition, pd.concat([oldDF, newDF]))
+
+        self._saveMetadata()
+        return changes
+
+    def delete(self, keys: list[str]) -> ChangeSet:
+        changes = ChangeSet()
+        if not keys or not self.exists():
+            return changes
+
+        keys = pd.Series(keys, dtype=str).drop_duplicates()
+        for partition, subKeys in keys.groupby(self._getPartitions(keys)):
+            df = self._readPartition(partition)
+            removed = df.index.intersection(subKeys)
+            if removed.empty:
+                continue
+
+            changes.removed.extend(removed)
+            self._writePartition(partition, df.drop(removed))
+
+        return changes
+
+    def get(self, keys: list[str], columns: list[str] = None) -> pd.DataFrame:
+        keys = pd.Series(keys, dtype=str).drop_duplicates()
+
+        dfs = []
+        for partition, subKeys in keys.groupby(self._getPartitions(keys)):
+            df = self._readPartition(partition, columns)
+            dfs.append(df.loc[df.index.intersection(subKeys)])
+
+        if not dfs:
+            return pd.DataFrame(columns=columns if columns is not None else self.columns)
+
+        return pd.concat(dfs).reset_index()
+
+    def loadDataFrameIterator(self, columns: list[str] = None) -> Iterator[pd.DataFrame]:
+        for partition in range(self.partitions):
+            if self._partitionPath(partition).exists():
+                yield self._readPartition(partition, columns).reset_index()
+
+    def loadDataFrame(self, columns: list[str] = None) -> pd.DataFrame:
+        return pd.concat(self.loadDataFrameIterator(columns), ignore_index=True)
+
+    def exportCSV(self, outputPath: Path) -> int:
+        outputPath.unlink(True)
+        pd.DataFrame(columns=[self.key] + self.columns).to_csv(outputPath, index=False)
+
+        totalRows = 0
+        for df in self.loadDataFrameIterator():
+            df.to_csv(outputPath, mode="a", header=False, index=False)
+            totalRows += len(df)
+
+        return totalRows
+
+    def exportChanges(self, changes: ChangeSet, outputPath: Path) -> None:
+        changeColumn = "change"
+        outputPath.unlink(True)
+        pd.DataFrame(columns=[changeColumn, self.key] + self.columns).to_csv(outputPath, index=False)
+
+        changeTypes = pd.Series(
+            ["added"] * len(changes.added) + ["modified"] * len(changes.modified),
+            index=pd.Index(changes.added + changes.modified, dtype=str),
+            dtype=object
+        )
+
+        for partition, subChanges in changeTypes.groupby(self._getPartitions(changeTypes.index.to_series())):
+            df = self._readPartition(partition)
+            df = df.loc[subChanges.index]
+            df.index.name = self.key
+            df.insert(0, changeColumn, subChanges)
+            df.reset_index().reindex(columns=[changeColumn, self.key] + self.columns).to_csv(outputPath, mode="a", header=False, index=False)
+
+        removed = pd.DataFrame({changeColumn: "removed", self.key: changes.removed}).reindex(columns=[changeColumn, self.key] + self.columns)
+        removed.to_csv(outputPath, mode="a", header=False, index=False)
+
+    def clear(self) -> None:
+        cmn.clearFolder(self.storeDir)
+        self.columns = []
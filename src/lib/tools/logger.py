@@ -12,6 +12,7 @@ class SystemLogger(logging.Logger):
         logFolder: Path = cfg.Folders.logs
         logFileName = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
         logFilePath = logFolder / f"{logFileName}.log"
+        logFolder.mkdir(parents=True, exist_ok=True) # Ignored by git, so may not exist on a fresh checkout
 
         # Configure logger
         self.setLevel(logging.DEBUG)
@@ -0,0 +1,175 @@
+import io
+import os
+import json
+import hashlib
+import tarfile
+import zipfile
+import concurrent.futures
+from enum import Enum
+from pathlib import Path
+from collections import deque
+from datetime import datetime
+from lib.tools.logger import Logger
+
+class PackageFormat(Enum):
+    ZIP     = "zip"
+    TAR_ZST = "tar.zst"
+
+class ParallelCompressor(io.RawIOBase):
+    # Compresses fixed size blocks on a thread pool as independent zstd frames
+    # Concatenated frames are a valid zstd stream, so the output decompresses as one file
+    def __init__(self, fp: io.BufferedIOBase, level: int = 3, maxWorkers: int = None, blockSize: int = 4 * 1024 * 1024):
+        import pyarrow as pa # Only needed once packaging, so listing formats stays quick
+
+        self.fp = fp
+        self.codec = pa.Codec("zstd", compression_level=level)
+        self.maxWorkers = maxWorkers or os.cpu_count()
+        self.blockSize = blockSize
+
+        self._buffer = bytearray()
+        self._pending: deque[concurrent.futures.Future] = deque()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.maxWorkers)
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes) -> int:
+        self._buffer.extend(data)
+        while len(self._buffer) >= self.blockSize:
+            self._submit(bytes(self._buffer[:self.blockSize]))
+            del self._buffer[:self.blockSize]
+
+        return len(data)
+
+    def _submit(self, block: bytes) -> None:
+        self._pending.append(self._executor.submit(self.codec.compress, block, asbytes=True))
+
+        # Write finished blocks in order, limiting how many are held in memory
+        while len(self._pending) > self.maxWorkers * 2 or (self._pending and self._pending[0].done()):
+            self.fp.write(self._pending.popleft().result())
+
+    def close(self) -> None:
+        if self.closed:
+            return
+
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+
+        while self._pending:
+            self.fp.write(self._pending.popleft().result())
+
+        self._executor.shutdown()
+        super().close()
+
+class _MemberReader(io.RawIOBase):
+    # Reads a file while hashing it and counting lines, so each member is only read once
+    def __init__(self, filePath: Path):
+        self._fp = open(filePath, "rb")
+        self.sha256 = hashlib.sha256()
+        self.lines = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: bytearray) -> int:
+        size = self._fp.readinto(buffer)
+        data = memoryview(buffer)[:size]
+        self.sha256.update(data)
+        self.lines += data.tobytes().count(b"\n")
+        return size
+
+    def close(self) -> None:
+        self._fp.close()
+        super().close()
+
+class Packager:
+    manifestFile = "manifest.json"
+
+    def __init__(self, format: PackageFormat = PackageFormat.ZIP, level: int = 3, maxWorkers: int = None):
+        self.format = format
+        self.level = level
+        self.maxWorkers = maxWorkers or os.cpu_count()
+
+    def _getMembers(self, folderPath: Path, extraFiles: list[Path]) -> list[tuple[Path, str]]:
+        members = [(path, path.relative_to(folderPath).as_posix()) for path in sorted(folderPath.rglob("*")) if path.is_file()]
+        return members + [(path, path.name) for path in extraFiles if path.exists()]
+
+    def _manifestEntry(self, filePath: Path, reader: _MemberReader) -> dict:
+        entry = {"size": filePath.stat().st_size, "sha256": reader.sha256.hexdigest()}
+
+        if filePath.suffix == ".parquet":
+            import pyarrow.parquet as pq
+
+            entry["rows"] = pq.ParquetFile(filePath).metadata.num_rows
+        elif filePath.suffix in (".csv", ".tsv"):
+            entry["rows"] = max(reader.lines - 1, 0) # Exclude header
+
+        return entry
+
+    def package(self, folderPath: Path, outputDir: Path, name: str = None, extraFiles: list[Path] = []) -> Path:
+        if name is None:
+            name = folderPath.name
+
+        outputFile = outputDir / f"{name}.{self.format.value}"
+        outputFile.unlink(True)
+
+        members = self._getMembers(folderPath, extraFiles)
+        Logger.info(f"Packaging {len(members)} files to {outputFile}")
+
+        if self.format == PackageFormat.TAR_ZST:
+            manifest = self._packageTar(members, outputFile, name)
+        else:
+            manifest = self._packageZip(members, outputFile, name)
+
+        Logger.info(f"Packaged {sum(entry['size'] for entry in manifest.values())} bytes to {outputFile} ({outputFile.stat().st_size} bytes)")
+        return outputFile
+
+    def _buildManifest(self, files: dict) -> bytes:
+        manifest = {
+            "created": datetime.now().isoformat(),
+            "format": self.format.value,
+            "files": files
+        }
+
+        return json.dumps(manifest, indent=4).encode()
+
+    def _packageTar(self, members: list[tuple[Path, str]], outputFile: Path, name: str) -> dict:
+        files = {}
+        with open(outputFile, "wb") as fp, ParallelCompressor(fp, self.level, self.maxWorkers) as compressor:
+            with tarfile.open(fileobj=compressor, mode="w|") as tar:
+                for filePath, memberName in members:
+                    info = tar.gettarinfo(filePath, f"{name}/{memberName}")
+                    with _MemberReader(filePath) as reader:
+                        tar.addfile(info, io.BufferedReader(reader))
+
+                    files[memberName] = self._manifestEntry(filePath, reader)
+
+                manifest = self._buildManifest(files)
+                info = tarfile.TarInfo(f"{name}/{self.manifestFile}")
+                info.size = len(manifest)
+                info.mtime = int(datetime.now().timestamp())
+                tar.addfile(info, io.BytesIO(manifest))
+
+        return files
+
+    def _packageZip(self, members: list[tuple[Path, str]], outputFile: Path, name: str) -> dict:
+        files = {}
+        with zipfile.ZipFile(outputFile, "w", zipfile.ZIP_DEFLATED, compresslevel=self.level) as zipfp:
+            for filePath, memberName in members:
+                info = zipfile.ZipInfo.from_file(filePath, f"{name}/{memberName}")
+                info.compress_type = zipfile.ZIP_STORED if filePath.suffix == ".parquet" else zipfile.ZIP_DEFLATED # Parquet is already compressed
+
+                with _MemberReader(filePath) as reader, zipfp.open(info, "w", force_zip64=True) as memberFP:
+                    while True:
+                        data = reader.read(1024 * 1024)
+                        if not data:
+                            break
+
+                        memberFP.write(data)
+
+                files[memberName] = self._manifestEntry(filePath, reader)
+
+            zipfp.writestr(f"{name}/{self.manifestFile}", self._buildManifest(files))
+
+        return files
@@ -0,0 +1,156 @@
+import queue
+import threading
+import time
+from typing import Callable, Iterable, Iterator
+
+_done = object() # Marks the end of a queue
+
+class QueueStats:
+    # Depth is sampled on every put, so a queue that is usually full means the consumer is the bottleneck and usually empty means the producer is
+    def __init__(self, name: str, maxSize: int):
+        self.name = name
+        self.maxSize = maxSize
+        self.items = 0
+        self.depthTotal = 0
+        self.maxDepth = 0
+        self.putWait = 0 # Time the producer was blocked by a full queue
+        self.getWait = 0 # Time the consumer was waiting on an empty queue
+
+    def recordPut(self, depth: int, wait: float) -> None:
+        self.items += 1
+        self.depthTotal += depth
+        self.maxDepth = max(self.maxDepth, depth)
+        self.putWait += wait
+
+    def recordGet(self, wait: float) -> None:
+        self.getWait += wait
+
+    def summary(self) -> dict:
+        return {
+            "size": self.maxSize,
+            "items": self.items,
+            "meanDepth": round(self.depthTotal / self.items, 2) if self.items else 0,
+            "maxDepth": self.maxDepth,
+            "putWait": round(self.putWait, 3),
+            "getWait": round(self.getWait, 3)
+        }
+
+class _BoundedQueue:
+    def __init__(self, name: str, maxSize: int):
+        self.queue = queue.Queue(maxSize)
+        self.stats = QueueStats(name, maxSize)
+        self.closed = threading.Event()
+
+    def put(self, item: any) -> bool:
+        # Returns False once the other side has stopped, so the producer doesn't block forever
+        startTime = time.perf_counter()
+        while not self.closed.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+            except queue.Full:
+                continue
+
+            if item is not _done:
+                self.stats.recordPut(self.queue.qsize(), time.perf_counter() - startTime)
+
+            return True
+
+        return False
+
+    def get(self) -> any:
+        # Ends the queue once the other side has stopped
+        startTime = time.perf_counter()
+        while not self.closed.is_set():
+            try:
+                item = self.queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            self.stats.recordGet(time.perf_counter() - startTime)
+            return item
+
+        return _done
+
+class Prefetcher:
+    # Reads items of an iterable on a background thread, keeping up to depth items ready
+    def __init__(self, iterable: Iterable, depth: int = 2, name: str = "read"):
+        self._iterable = iterable
+        self._queue = _BoundedQueue(name, depth)
+        self._error: BaseException = None
+        self._thread = threading.Thread(target=self._produce, name=f"{name}-prefetch", daemon=True)
+        self._thread.start()
+
+    def _produce(self) -> None:
+        try:
+            for item in self._iterable:
+                if not self._queue.put(item):
+                    return
+        except BaseException as e:
+            self._error = e
+
+        self._queue.put(_done)
+
+    def __iter__(self) -> Iterator:
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _done:
+                    break
+
+                yield item
+        finally:
+            self.close()
+
+        if self._error is not None:
+            raise self._error
+
+    def close(self) -> None:
+        self._queue.closed.set()
+
+    def stats(self) -> dict:
+        return self._queue.stats.summary()
+
+class AsyncWriter:
+    # Calls write with each submitted item on a background thread, in order, blocking submits once depth items are waiting
+    def __init__(self, write: Callable[[any], None], depth: int = 2, name: str = "write"):
+        self._write = write
+        self._queue = _BoundedQueue(name, depth)
+        self._error: BaseException = None
+        self._thread = threading.Thread(target=self._consume, name=f"{name}-writer", daemon=True)
+        self._thread.start()
+
+    def _consume(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _done:
+                return
+
+            if self._error is not None: # Drain remaining items after a failure
+                continue
+
+            try:
+                self._write(item)
+            except BaseException as e:
+                self._error = e
+
+    def submit(self, item: any) -> None:
+        if self._error is not None:
+            raise self._error
+
+        self._queue.put(item)
+
+    def close(self) -> None:
+        # Waits for all submitted items to be written, raising any error from writing
+        self._queue.put(_done)
+        self._thread.join()
+
+        if self._error is not None:
+            raise self._error
+
+    def cancel(self) -> None:
+        # Stops without writing waiting items, for when conversion ends early
+        self._queue.closed.set()
+        self._thread.join()
+
+    def stats(self) -> dict:
+        return self._queue.stats.summary()
@@ -0,0 +1,273 @@
+import os
+import sys
+import json
+import time
+import atexit
+import cProfile
+import threading
+import functools
+import lib.config as cfg
+from enum import Enum
+from pathlib import Path
+from datetime import datetime
+from typing import Callable, Iterable, Iterator
+from lib.tools.logger import Logger
+
+class Profiler(Enum):
+    NONE         = "none"
+    CPROFILE     = "cprofile"
+    PYINSTRUMENT = "pyinstrument"
+
+def memoryUsage() -> tuple[float, float]:
+    # Current and peak resident memory of this process in MB
+    status = Path("/proc/self/status")
+    if status.exists():
+        values = {}
+        for line in status.read_text().splitlines():
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "VmHWM"):
+                values[key] = int(value.split()[0]) / 1024
+
+        return values.get("VmRSS", 0), values.get("VmHWM", 0)
+
+    try:
+        import resource
+    except ImportError: # Not available on windows
+        return 0, 0
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024) # Reported in bytes on mac and kB elsewhere
+    return peak, peak
+
+def pathSize(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+
+    if path.is_dir():
+        return sum(subPath.stat().st_size for subPath in path.rglob("*") if subPath.is_file())
+
+    return 0
+
+def pathRows(path: Path) -> int:
+    # Rows of a csv, tsv or parquet file, anything else isn't counted
+    # Csv rows are counted by line, so values containing newlines are overcounted
+    if not path.is_file():
+        return 0
+
+    if path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).metadata.num_rows
+
+    if path.suffix not in (".csv", ".tsv"):
+        return 0
+
+    lines = 0
+    with open(path, "rb") as fp:
+        while block := fp.read(1024 * 1024):
+            lines += block.count(b"\n")
+
+    return max(lines - 1, 0) # Header
+
+class _MemorySampler:
+    # Samples resident memory on a background thread while any span is open, so each span gets the peak reached while it was open
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self._spans: set['Span'] = set()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread = None
+
+    def add(self, span: 'Span') -> None:
+        with self._lock:
+            self._spans.add(span)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample, name="memory-sampler", daemon=True)
+                self._thread.start()
+
+    def remove(self, span: 'Span') -> None:
+        with self._lock:
+            self._spans.discard(span)
+
+    def _sample(self) -> None:
+        while True:
+            memory = memoryUsage()[0]
+            with self._lock:
+                if not self._spans: # Stops until the next span is opened
+                    self._thread = None
+                    return
+
+                for span in self._spans:
+                    span.peakMemory = max(span.peakMemory, memory)
+
+            time.sleep(self.interval)
+
+_sampler = _MemorySampler()
+
+class Span:
+    def __init__(self, tracer: 'RunTracer', name: str, category: str, attributes: dict):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.attributes = attributes
+
+        # Set by the caller while the span is open
+        self.rowsIn = 0
+        self.rowsOut = 0
+        self.bytesIn = 0
+        self.bytesOut = 0
+
+        self.wallTime = 0
+        self.cpuTime = 0 # Of the thread the span was opened on
+        self.processCpuTime = 0 # Of every thread, including work for other spans
+        self.memory = 0
+        self.startMemory = 0
+        self.peakMemory = 0 # Highest sampled resident memory while open, not the peak of the whole process
+
+        self._discarded = False
+
+    def __enter__(self) -> 'Span':
+        self.startTime = time.perf_counter()
+        self._cpuStart = time.thread_time()
+        self._processCpuStart = time.process_time()
+        self.startMemory = self.peakMemory = memoryUsage()[0]
+        _sampler.add(self)
+        return self
+
+    def __exit__(self, *args) -> None:
+        _sampler.remove(self)
+        self.wallTime = time.perf_counter() - self.startTime
+        self.cpuTime = time.thread_time() - self._cpuStart
+        self.processCpuTime = time.process_time() - self._processCpuStart # May exceed wall time with other threads running
+        self.memory = memoryUsage()[0]
+        self.peakMemory = max(self.peakMemory, self.memory)
+
+        if not self._discarded:
+            self.tracer._record(self)
+
+    def discard(self) -> None:
+        self._discarded = True
+
+    def stats(self) -> dict:
+        stats = {
+            "duration": self.wallTime,
+            "cpuTime": self.cpuTime,
+            "processCpuTime": self.processCpuTime,
+            "peakMemory": round(self.peakMemory, 1),
+            "memoryChange": round(self.memory - self.startMemory, 1)
+        }
+
+        for key in ("rowsIn", "rowsOut", "bytesIn", "bytesOut"):
+            value = getattr(self, key)
+            if value:
+                stats[key] = value
+
+        return stats
+
+class RunTracer:
+    # Spans are always measured so their stats can be added to metadata, and only written out once a trace is started
+    def __init__(self):
+        self.tracePath: Path = None
+        self.profiler = Profiler.NONE
+
+        self._events: list[dict] = []
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._profile = None
+
+    def isActive(self) -> bool:
+        return self.tracePath is not None
+
+    def start(self, profiler: Profiler = Profiler.NONE, outputDir: Path = None) -> None:
+        if self.isActive():
+            return
+
+        if outputDir is None:
+            outputDir = cfg.Folders.logs
+
+        outputDir.mkdir(parents=True, exist_ok=True)
+        self.tracePath = outputDir / f"{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}_trace.json"
+        self.profiler = profiler
+
+        if profiler == Profiler.CPROFILE:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+        elif profiler == Profiler.PYINSTRUMENT:
+            try:
+                import pyinstrument
+            except ImportError:
+                Logger.error("Unable to profile with pyinstrument as it is not installed")
+                self.profiler = Profiler.NONE
+            else:
+                self._profile = pyinstrument.Profiler()
+                self._profile.start()
+
+        atexit.register(self.stop)
+        Logger.info(f"Tracing run to {self.tracePath}")
+
+    def stop(self) -> None:
+        if not self.isActive():
+            return
+
+        # Chrome trace event format, which can be loaded into chrome://tracing, perfetto or speedscope
+        with open(self.tracePath, "w") as fp:
+            json.dump({"traceEvents": self._events, "otherData": {"argv": sys.argv, "profiler": self.profiler.value}}, fp)
+
+        if self.profiler == Profiler.CPROFILE:
+            self._profile.disable()
+            self._profile.dump_stats(self.tracePath.with_suffix(".prof"))
+
+        elif self.profiler == Profiler.PYINSTRUMENT:
+            self._profile.stop()
+            self.tracePath.with_suffix(".html").write_text(self._profile.output_html())
+
+        Logger.info(f"Wrote trace of {len(self._events)} spans to {self.tracePath}")
+
+        self.tracePath = None
+        self._events.clear()
+        self._profile = None
+        atexit.unregister(self.stop)
+
+    def span(self, name: str, category: str = "", **attributes: dict) -> Span:
+        return Span(self, name, category, attributes)
+
+    def spans(self, iterable: Iterable, name: str, category: str = "", **attributes: dict) -> Iterator[tuple[Span, any]]:
+        # Each span covers producing an item and the caller's work on it, until the next item is requested
+        iterator = iter(iterable)
+        for idx in range(1, sys.maxsize):
+            with self.span(name, category, index=idx, **attributes) as span:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    span.discard()
+                    return
+
+                yield span, item
+
+    def traced(self, name: str = "", category: str = "") -> Callable:
+        def decorator(func: Callable) -> Callable:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name or func.__qualname__, category):
+                    return func(*args, **kwargs)
+
+            return wrapper
+        return decorator
+
+    def _record(self, span: Span) -> None:
+        if not self.isActive():
+            return
+
+        event = {
+            "name": span.name,
+            "cat": span.category,
+            "ph": "X",
+            "ts": round((span.startTime - self._origin) * 1e6),
+            "dur": round(span.wallTime * 1e6),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": {key: str(value) if isinstance(value, Path) else value for key, value in span.attributes.items()} | span.stats()
+        }
+
+        with self._lock:
+            self._events.append(event)
+
+Tracer = RunTracer()
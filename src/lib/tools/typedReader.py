@@ -0,0 +1,133 @@
+import csv
+import json
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+from enum import Enum
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+from lib.tools.logger import Logger
+
+class ColumnType(Enum):
+    INT      = "int"
+    FLOAT    = "float"
+    BOOL     = "bool"
+    CATEGORY = "category"
+    STRING   = "string"
+
+arrowTypes = {
+    ColumnType.INT: pa.int64(),
+    ColumnType.FLOAT: pa.float64(),
+    ColumnType.BOOL: pa.bool_(),
+    ColumnType.CATEGORY: pa.dictionary(pa.int32(), pa.string()),
+    ColumnType.STRING: pa.string()
+}
+
+# Arrow backed pandas dtypes, dictionary columns are converted to categoricals by pyarrow
+pandasTypes = {
+    pa.int64(): pd.Int64Dtype(),
+    pa.float64(): pd.Float64Dtype(),
+    pa.bool_(): pd.BooleanDtype(),
+    pa.string(): pd.StringDtype("pyarrow")
+}
+
+def _readOptions(header: int, encoding: str, blockSize: int = None) -> pacsv.ReadOptions:
+    kwargs = {"skip_rows": header, "encoding": encoding}
+    if blockSize is not None:
+        kwargs["block_size"] = blockSize
+
+    return pacsv.ReadOptions(**kwargs)
+
+def _parseOptions(sep: str, skipInvalid: bool = True) -> pacsv.ParseOptions:
+    # Rows with the wrong number of columns are skipped, or raise an error when rows need to stay aligned with another file
+    return pacsv.ParseOptions(delimiter=sep, newlines_in_values=True, invalid_row_handler=(lambda row: "skip") if skipInvalid else None)
+
+def _readHeader(filePath: Path, sep: str = ",", header: int = 0, encoding: str = "utf-8") -> list[str]:
+    with open(filePath, encoding=encoding) as fp:
+        for _ in range(header):
+            fp.readline()
+
+        return next(csv.reader(fp, delimiter=sep), [])
+
+def inferSchema(filePath: Path, sep: str = ",", header: int = 0, encoding: str = "utf-8", sampleBytes: int = 16 * 1024 * 1024, maxCategoryRatio: float = 0.05) -> dict[str, str]:
+    # Infers which columns can be categories from the start of a file, everything else stays a string
+    # Columns are never narrowed to numbers or bools here, as the sample can't tell a leading zero is meaningful or that a later value won't parse
+    columns = _readHeader(filePath, sep, header, encoding)
+    convertOptions = pacsv.ConvertOptions(column_types={column: pa.string() for column in columns}, strings_can_be_null=True)
+    reader = pacsv.open_csv(filePath, _readOptions(header, encoding, sampleBytes), _parseOptions(sep), convertOptions)
+    sample = reader.read_next_batch()
+    reader.close()
+
+    schema = {}
+    for column in sample.column_names:
+        values = sample.column(column)
+        nonNull = len(values) - values.null_count
+        unique = len(values.unique())
+        schema[column] = ColumnType.CATEGORY.value if nonNull and unique / nonNull <= maxCategoryRatio else ColumnType.STRING.value
+
+    return schema
+
+def getSchema(filePath: Path, cachePath: Path, sep: str = ",", header: int = 0, encoding: str = "utf-8") -> dict[str, str]:
+    # Schemas are cached by file name, and inferred again if the columns of the file change
+    cache = {}
+    if cachePath.exists():
+        with open(cachePath) as fp:
+            cache = json.load(fp)
+
+    columns = _readHeader(filePath, sep, header, encoding)
+    schema = cache.get(filePath.name, {})
+    inferredTypes = {ColumnType.CATEGORY.value, ColumnType.STRING.value} # Older caches may hold narrowed types
+    if list(schema) == columns and set(schema.values()) <= inferredTypes:
+        return schema
+
+    Logger.info(f"Inferring schema for {filePath.name}")
+    schema = inferSchema(filePath, sep, header, encoding)
+    cache[filePath.name] = schema
+
+    with open(cachePath, "w") as fp:
+        json.dump(cache, fp, indent=4)
+
+    return schema
+
+def regroupBatches(batches: Iterable[pa.RecordBatch], chunkSize: int | Callable[[], int], nrows: int = None) -> Iterator[pa.Table]:
+    # Batches are sized in bytes by pyarrow, so they are regrouped into chunks of rows
+    # Chunk size may be a callable, checked before each chunk so it can be changed while reading
+    getSize = chunkSize if callable(chunkSize) else lambda: chunkSize
+    pending: list[pa.RecordBatch] = []
+    pendingRows = 0
+    totalRows = 0
+    for batch in batches:
+        if nrows is not None and nrows >= 0:
+            batch = batch.slice(0, nrows - totalRows)
+
+        pending.append(batch)
+        pendingRows += len(batch)
+        totalRows += len(batch)
+
+        while pendingRows >= getSize():
+            size = getSize()
+            table = pa.Table.from_batches(pending)
+            yield table.slice(0, size)
+
+            pending = table.slice(size).to_batches()
+            pendingRows -= size
+
+        if nrows is not None and totalRows >= nrows >= 0:
+            break
+
+    if pendingRows:
+        yield pa.Table.from_batches(pending)
+
+def csvBatchReader(filePath: Path, schema: dict[str, str], sep: str = ",", header: int = 0, encoding: str = "utf-8", usecols: list = None, skipInvalid: bool = True) -> pacsv.CSVStreamingReader:
+    columnTypes = {column: arrowTypes[ColumnType(columnType)] for column, columnType in schema.items()}
+    convertOptions = pacsv.ConvertOptions(column_types=columnTypes, strings_can_be_null=True, include_columns=usecols)
+    return pacsv.open_csv(filePath, _readOptions(header, encoding), _parseOptions(sep, skipInvalid), convertOptions)
+
+def tableChunkGenerator(filePath: Path, chunkSize: int | Callable[[], int], schema: dict[str, str], sep: str = ",", header: int = 0, encoding: str = "utf-8", usecols: list = None, nrows: int = None, skipInvalid: bool = True) -> Iterator[pa.Table]:
+    return regroupBatches(csvBatchReader(filePath, schema, sep, header, encoding, usecols, skipInvalid), chunkSize, nrows)
+
+def toPandas(table: pa.Table) -> pd.DataFrame:
+    return table.to_pandas(types_mapper=pandasTypes.get)
+
+def typedChunkGenerator(filePath: Path, chunkSize: int | Callable[[], int], schema: dict[str, str], sep: str = ",", header: int = 0, encoding: str = "utf-8", usecols: list = None, nrows: int = None) -> Iterator[pd.DataFrame]:
+    return (toPandas(table) for table in tableChunkGenerator(filePath, chunkSize, schema, sep, header, encoding, usecols, nrows))
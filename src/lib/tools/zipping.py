@@ -1,6 +1,15 @@
-import zipfile
+import io
+import bz2
+import lzma
+import gzip
 import shutil
+import tarfile
+import zipfile
+import subprocess
+import pyarrow as pa
 from pathlib import Path
+from typing import IO, Iterator
+from contextlib import contextmanager
 from lib.tools.logger import Logger
         
 class RepeatExtractor:
@@ -63,3 +72,127 @@ def extractsTo(filePath: Path, outputDir: Path = None, addSuffix: str = "") -> P
         outputPath = outputPath.with_suffix(addSuffix)
     
     return outputPath
+
+class _StreamReader(io.RawIOBase):
+    # Forward only view of a member that does not support seeking, such as one read from a tar stream
+    def __init__(self, fp: IO):
+        self._fp = fp
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: bytearray) -> int:
+        data = self._fp.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+class ArchiveReader:
+    # Exposes archive members as streaming file objects so they can be consumed without extracting to disk
+    # Single file compression (.gz, .xz, .bz2, .zst) has one member named after the file without its suffix
+    def __init__(self, filePath: Path, threads: int = 1):
+        self.filePath = filePath
+        self.threads = threads
+
+        suffixes = [suffix.lower() for suffix in filePath.suffixes]
+        self.compression = suffixes[-1] if suffixes and suffixes[-1] in (".gz", ".tgz", ".xz", ".bz2", ".zst") else ""
+        self.isZip = suffixes[-1:] == [".zip"]
+        self.isTar = ".tar" in suffixes or self.compression == ".tgz"
+
+        self._processes: list[subprocess.Popen] = []
+        self._handles: list[IO] = []
+
+    def __enter__(self) -> 'ArchiveReader':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _openRaw(self) -> IO:
+        # Decompressed byte stream of the whole file
+        if self.compression in (".gz", ".tgz"):
+            pigz = shutil.which("pigz")
+            if self.threads > 1 and pigz is not None: # Decompress in a separate process with pigz
+                process = subprocess.Popen([pigz, "-dc", "-p", str(self.threads), str(self.filePath)], stdout=subprocess.PIPE)
+                self._processes.append(process)
+                return process.stdout
+
+            return gzip.open(self.filePath)
+
+        if self.compression == ".xz":
+            return lzma.open(self.filePath)
+
+        if self.compression == ".bz2":
+            return bz2.open(self.filePath)
+
+        if self.compression == ".zst":
+            return pa.CompressedInputStream(pa.OSFile(str(self.filePath)), "zstd")
+
+        return open(self.filePath, "rb")
+
+    def members(self) -> list[str]:
+        if self.isZip:
+            with zipfile.ZipFile(self.filePath) as zipfp:
+                return [info.filename for info in zipfp.infolist() if not info.is_dir()]
+
+        if self.isTar:
+            with self._openRaw() as fp, tarfile.open(fileobj=fp, mode="r|") as tar:
+                return [info.name for info in tar if info.isfile()]
+
+        return [extractsTo(self.filePath, self.filePath.parent).name]
+
+    def _findMember(self, names: list[str], member: str) -> str:
+        if member in names:
+            return member
+
+        matches = [name for name in names if Path(name).name == member] # Allow members to be requested without their folder
+        if not matches:
+            raise Exception(f"No member '{member}' in archive {self.filePath}") from AttributeError
+
+        return matches[0]
+
+    def open(self, member: str = None, encoding: str = None) -> IO:
+        # Opens a member for streaming reads, in text mode if an encoding is given
+        if self.isZip:
+            zipfp = zipfile.ZipFile(self.filePath)
+            self._handles.append(zipfp)
+            handle = zipfp.open(self._findMember(zipfp.namelist(), member) if member else zipfp.namelist()[0])
+
+        elif self.isTar:
+            # Tar members are read by scanning the stream, which also works for piped decompression
+            raw = self._openRaw()
+            tar = tarfile.open(fileobj=raw, mode="r|")
+            self._handles.extend((raw, tar))
+
+            handle = None
+            for info in tar:
+                if info.isfile() and (member is None or info.name == member or Path(info.name).name == member):
+                    handle = io.BufferedReader(_StreamReader(tar.extractfile(info)))
+                    break
+
+            if handle is None:
+                raise Exception(f"No member '{member}' in archive {self.filePath}") from AttributeError
+
+        else:
+            handle = self._openRaw()
+
+        self._handles.append(handle)
+        if encoding is not None:
+            handle = io.TextIOWrapper(handle, encoding=encoding)
+            self._handles.append(handle)
+
+        return handle
+
+    def close(self) -> None:
+        for handle in reversed(self._handles):
+            handle.close()
+
+        for process in self._processes:
+            process.wait()
+
+        self._handles.clear()
+        self._processes.clear()
+
+@contextmanager
+def openMember(filePath: Path, member: str = None, encoding: str = None, threads: int = 1) -> Iterator[IO]:
+    with ArchiveReader(filePath, threads) as archive:
+        yield archive.open(member, encoding)
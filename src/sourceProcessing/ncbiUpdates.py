@@ -1,11 +1,13 @@
 from pathlib import Path
-from lib.sourceObjs.timeManager import TimeManager
+import gzip
+import shutil
 import requests
+import importlib.util
 from bs4 import BeautifulSoup
 from datetime import datetime, timedelta
 import lib.config as cfg
-from lib.tools.extractor import Extractor
-import lib.commonFuncs as cmn
+import lib.tools.downloading as dl
+from lib.tools.keyedStore import KeyedStore, ChangeSet
 from lib.tools.logger import Logger
 
 class UpdateManager:
@@ -18,11 +20,11 @@ class UpdateManager:
         def __repr__(self) -> str:
             return f"{self.version}: {self.timestamp}"
 
-    def __init__(self):
-        self.ncbiFolder = cfg.Folders.dataSources / "ncbi"
-        self.saveFile = "nucData.json"
+    def __init__(self, workingDir: Path):
+        self.workingDir = workingDir
 
         self.baseURL = "https://ftp.ncbi.nlm.nih.gov/genbank/"
+        self.dailyURL = "daily-nc/"
         self.releaseNumURL = "GB_Release_Number"
         self.releaseNotesURL = "release.notes"
 
@@ -53,47 +55,103 @@ class UpdateManager:
             releases.append(self.Release(int(version), element["href"], dt))
 
         return sorted(releases, key=lambda x: x.version, reverse=True)
-    
+
+    def getDailyFiles(self, since: datetime) -> list[str]:
+        data = requests.get(self.baseURL + self.dailyURL)
+        soup = BeautifulSoup(data.text, "html.parser")
+
+        files = []
+        for element in soup.find_all("a"):
+            href = element.get("href", "")
+            if not (href.startswith("nc") and href.endswith(".flat.gz")):
+                continue
+
+            date, time = element.next_sibling.strip().split(" ")[:2]
+            timestamp = datetime.fromisoformat(f"{date} {time}") + timedelta(hours=16) # Offset time for timezones
+            if timestamp > since:
+                files.append(self.dailyURL + href)
+
+        return files
+
     def _parse(self, filePath: Path, prefix: str) -> dict[str, list[str]]:
         data: dict[str, list[str]] = {}
         with open(filePath) as fp:
             rawData = fp.read().rstrip("\n").split("\n")
 
         for line in rawData:
+            if "|" not in line:
+                continue
+
             file, loci = line.split("|")
-            if prefix and not file.startswith(prefix):
+            if prefix and not file.upper().startswith(prefix):
                 continue
 
             if file not in data:
                 data[file] = []
 
-            data[file].append(loci)
-    
+            data[file].append(loci.strip())
+
         return data
-    
+
+    def _download(self, fileName: str) -> Path | None:
+        localFile = self.workingDir / Path(fileName).name
+        localFile.unlink(True)
+
+        success = dl.download(self.baseURL + fileName, localFile)
+        if not success:
+            localFile.unlink(True)
+            return None
+
+        extractedFile = localFile.with_suffix("")
+        with gzip.open(localFile) as inFP, open(extractedFile, "wb") as outFP:
+            shutil.copyfileobj(inFP, outFP)
+
+        localFile.unlink()
+        return extractedFile
+
     def getUpdates(self, prefix: str = "") -> list[dict[str, list[str]]]:
         data = []
         for file in (self.new, self.changed, self.deleted):
-            url = self.baseURL + file
-            localFile = self.ncbiFolder / file
+            extractedFile = self._download(file)
+            if extractedFile is None:
+                raise Exception(f"Unable to retrieve update file: {file}")
 
-            if not localFile.exists():
-                cmn.downloadFile(url, localFile, verbose=False)
-
-            extractedFile = Extractor.extract(localFile)
             data.append(self._parse(extractedFile, prefix))
 
         return data
 
-def updateNucleotide(basePath: Path, ncbiPrefix: str) -> tuple[bool, Path]:
-    timeManager = TimeManager(basePath)
-    lastUpdate, _ = timeManager.getLastUpdate()
+    def getSeqFile(self, fileName: str) -> Path | None:
+        fileName = fileName.lower()
+        if not fileName.endswith(".seq"):
+            fileName = f"{fileName}.seq"
+
+        return self._download(f"{fileName}.gz")
+
+    def getDailyFile(self, fileName: str) -> Path | None:
+        return self._download(fileName)
+
+def loadFlatfileParser() -> any:
+    parserPath = cfg.Folders.dataSources / "ncbi" / "flatFileParser.py"
+    spec = importlib.util.spec_from_file_location(parserPath.name, parserPath)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def getStore(processedFilePath: Path) -> KeyedStore:
+    return KeyedStore(processedFilePath.parent / f"{processedFilePath.stem}_store", "locus")
+
+def updateNucleotide(outputFilePath: Path, ncbiPrefix: str, lastUpdate: datetime = None) -> None:
     if lastUpdate is None:
-        Logger.info("No last update")
-        return False, ""
+        raise Exception("No last update, unable to update incrementally")
+
+    store = getStore(outputFilePath)
+    if not store.exists():
+        raise Exception(f"No existing record store at {store.storeDir}, unable to update incrementally")
+
+    workingDir = outputFilePath.parent / "updates"
+    workingDir.mkdir(exist_ok=True)
+    updateManager = UpdateManager(workingDir)
 
-    updateManager = UpdateManager()
-    
     updates = []
     for release in updateManager.getReleases():
         if (lastUpdate - release.timestamp).total_seconds() >= 0: # If timestamp is older than last update
@@ -101,15 +159,56 @@ def updateNucleotide(basePath: Path, ncbiPrefix: str) -> tuple[bool, Path]:
 
         updates.append(release)
 
-    if not updates: # No updates are required, return success but no new update path
-        Logger.info("No updates required")
-        return True, ""
-    
     if len(updates) > 1: # If there are multiple updates required, don't use update script
-        Logger.info("Too many updates to dynamically update")
-        return False, ""
-    
-    prefix = ncbiPrefix.upper()
-    new, changed, deleted = updateManager.getUpdates(prefix)
+        raise Exception("Too many releases since last update to update incrementally")
+
+    prefix = ncbiPrefix.upper().removeprefix("GB")
+    ffp = loadFlatfileParser()
+    changes = ChangeSet()
+
+    def applyFile(seqFile: Path, loci: set[str] = None) -> None:
+        df = ffp.parseFlatfile(seqFile)
+        seqFile.unlink()
+
+        if len(df) == 0:
+            return
+
+        if loci is not None:
+            df = df[df["locus"].isin(loci)]
+        elif "seq_type" in df.columns: # Daily files cover every division
+            df = df[df["seq_type"] == prefix]
+
+        changes.extend(store.upsert(df))
+
+    if updates: # New release, apply the loci it lists as new, changed and deleted
+        new, changed, deleted = updateManager.getUpdates(f"GB{prefix}")
+
+        # Only download and parse the release files that contain new or changed loci
+        affectedFiles: dict[str, set[str]] = {}
+        for fileLoci in (new, changed):
+            for file, loci in fileLoci.items():
+                affectedFiles.setdefault(file, set()).update(loci)
+
+        for idx, (file, loci) in enumerate(affectedFiles.items(), start=1):
+            Logger.info(f"Applying release updates from file {idx} / {len(affectedFiles)}: {file}")
+            seqFile = updateManager.getSeqFile(file)
+            if seqFile is None:
+                raise Exception(f"Unable to retrieve sequence file: {file}")
+
+            applyFile(seqFile, loci)
+
+        changes.extend(store.delete([locus for loci in deleted.values() for locus in loci]))
+        lastUpdate = updates[0].timestamp
+
+    # Daily files since the last update or release
+    dailyFiles = updateManager.getDailyFiles(lastUpdate)
+    for idx, file in enumerate(dailyFiles, start=1):
+        Logger.info(f"Applying daily updates from file {idx} / {len(dailyFiles)}: {file}")
+        seqFile = updateManager.getDailyFile(file)
+        if seqFile is None:
+            raise Exception(f"Unable to retrieve daily file: {file}")
+
+        applyFile(seqFile)
 
-    print(new, changed, deleted)
+    Logger.info(f"Applied {len(updates)} release and {len(dailyFiles)} daily updates: {changes.summary()}")
+    store.exportCSV(outputFilePath)
@@ -0,0 +1,181 @@
+import argparse
+import importlib.util
+import json
+import multiprocessing
+import shutil
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+import generators as gen
+import lib.config as cfg
+from lib.tools.profiler import memoryUsage
+
+# Run from the src folder with `python tests/benchmark/benchmark.py`
+# Each case runs in a fresh process so that peak memory is measured per case
+# The committed baseline is from a run at the default scale of 1, save a new one with --baseline after intended changes in speed or memory
+
+baselinePath = Path(__file__).parent / "baseline.json"
+
+@dataclass
+class Case:
+    inputName: str
+    generate: Callable[[Path, int], int] # Creates the input and returns the number of rows/records it holds
+    run: Callable[[Path, Path], None] # Runs the step on the input, writing to the output directory
+
+def _loadModule(modulePath: Path) -> any:
+    spec = importlib.util.spec_from_file_location(modulePath.name, modulePath)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def _convert(engine: str, outputFormat: str) -> Callable[[Path, Path], None]:
+    def run(inputPath: Path, outputDir: Path) -> None:
+        from lib.processing.stages import File
+        from lib.systemManagers.conversion import ConversionManager
+
+        with open(outputDir / "map.json", "w") as fp:
+            json.dump(gen.conversionMap, fp)
+
+        manager = ConversionManager(outputDir, outputDir, "BENCHMARK", "benchmark", inputPath.stem, "")
+        manager.loadFile(File(inputPath), {"chunkSize": 16384, "engine": engine, "outputFormat": outputFormat}, outputDir)
+        success, _ = manager.convert(True, False)
+        if not success:
+            raise Exception(f"Conversion of {inputPath} failed")
+
+    return run
+
+def _parseFlatfile(inputPath: Path, outputDir: Path) -> None:
+    parser = _loadModule(cfg.Folders.dataSources / "ncbi" / "flatFileParser.py")
+    parser.parseFlatfile(inputPath).to_csv(outputDir / "flatfile.csv", index=False)
+
+def _parseTaxdump(inputPath: Path, outputDir: Path) -> None:
+    taxonomy = _loadModule(cfg.Folders.dataSources / "ncbi" / "taxonomy" / "processing.py")
+    taxonomy.parse(inputPath, outputDir / "taxonomy.csv")
+
+def _processXML(inputPath: Path, outputDir: Path) -> None:
+    from tools.processing.xmlProcess import process
+    process(inputPath, outputDir / "biosample.csv", subfileRows=10000, compressChild=["Id", "Attribute"], collectionExtract={"Attribute": {"attribute_name": {"collection date": "collection date", "lat_lon": "lat long"}}})
+
+def _oneFile(suffix: str) -> Callable[[Path, Path], None]:
+    def run(inputPath: Path, outputDir: Path) -> None:
+        from lib.tools.bigFileWriter import BigFileWriter
+
+        # Combine a copy of the subfiles, as they are removed once combined
+        shutil.copytree(inputPath.parent / "chunks", outputDir / "chunks")
+        writer = BigFileWriter(outputDir / f"combined{suffix}")
+        writer.populateFromFolder()
+        writer.oneFile()
+
+    return run
+
+cases = {
+    "convertBiosample": Case("biosample.csv", lambda path, scale: gen.biosampleCSV(path, 20000 * scale), _convert("pandas", "csv")),
+    "convertBiosampleArrow": Case("biosample.csv", lambda path, scale: gen.biosampleCSV(path, 20000 * scale), _convert("arrow", "csv")),
+    "convertBiosampleParquet": Case("biosample.csv", lambda path, scale: gen.biosampleCSV(path, 20000 * scale), _convert("pandas", "parquet")),
+    "convertChecklist": Case("checklist.csv", lambda path, scale: gen.checklistCSV(path, 50000 * scale), _convert("pandas", "csv")),
+    "parseFlatfile": Case("genbank.seq", lambda path, scale: gen.genbankFlatfile(path, 5000 * scale), _parseFlatfile),
+    "parseTaxdump": Case("taxdump.zip", lambda path, scale: gen.taxdump(path, 20000 * scale), _parseTaxdump),
+    "processXML": Case("biosample.xml", lambda path, scale: gen.nestedXML(path, 20000 * scale), _processXML),
+    "oneFileCSV": Case("subfiles.csv", lambda path, scale: gen.subfiles(path, 20, 5000 * scale), _oneFile(".csv")),
+    "oneFileParquet": Case("subfiles.csv", lambda path, scale: gen.subfiles(path, 20, 5000 * scale), _oneFile(".parquet"))
+}
+
+def _runCase(name: str, inputPath: Path, outputDir: Path, results: multiprocessing.Queue) -> None:
+    startTime = time.perf_counter()
+    cases[name].run(inputPath, outputDir)
+    duration = time.perf_counter() - startTime
+
+    results.put((duration, memoryUsage()[1]))
+
+def runCase(name: str, workDir: Path, scale: int) -> dict:
+    case = cases[name]
+    inputPath = workDir / "inputs" / case.inputName
+    rowsPath = inputPath.parent / f"{inputPath.name}.rows"
+
+    # Inputs are shared between cases and only generated once per scale
+    generated = json.loads(rowsPath.read_text()) if rowsPath.exists() else {}
+    if generated.get("scale") != scale:
+        inputPath.parent.mkdir(parents=True, exist_ok=True)
+        generated = {"scale": scale, "rows": case.generate(inputPath, scale)}
+        rowsPath.write_text(json.dumps(generated))
+
+    rows = generated["rows"]
+
+    outputDir = workDir / "outputs" / name
+    if outputDir.exists():
+        shutil.rmtree(outputDir)
+    outputDir.mkdir(parents=True)
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_runCase, args=(name, inputPath, outputDir, results))
+    process.start()
+    process.join()
+
+    if process.exitcode != 0:
+        return {"rows": rows, "error": f"exit code {process.exitcode}"}
+
+    duration, peakRSS = results.get()
+    return {"rows": rows, "seconds": round(duration, 3), "rowsPerSecond": round(rows / duration, 1), "peakRSSMB": round(peakRSS, 1)}
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None or "error" in result or "error" in previous:
+            continue
+
+        if result["rows"] != previous["rows"]:
+            print(f"Skipping {name}, baseline was run on {previous['rows']} rows instead of {result['rows']}") # Different scale, not comparable
+            continue
+
+        if result["rowsPerSecond"] < previous["rowsPerSecond"] * (1 - tolerance):
+            regressions.append(f"{name}: {result['rowsPerSecond']} rows/s vs baseline {previous['rowsPerSecond']} rows/s")
+
+        if result["peakRSSMB"] > previous["peakRSSMB"] * (1 + tolerance):
+            regressions.append(f"{name}: {result['peakRSSMB']} MB peak vs baseline {previous['peakRSSMB']} MB")
+
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark processing and conversion steps on synthetic inputs")
+    parser.add_argument("cases", nargs="*", help=f"Cases to run, defaults to all of: {', '.join(cases)}", metavar="CASE")
+    parser.add_argument("-s", "--scale", type=int, default=1, help="Multiplier for the size of generated inputs")
+    parser.add_argument("-w", "--workDir", type=Path, default=Path(__file__).parent / "work", help="Folder to generate inputs and write outputs to")
+    parser.add_argument("-t", "--tolerance", type=float, default=0.2, help="Allowed fraction of change from the baseline before reporting a regression")
+    parser.add_argument("-b", "--baseline", action="store_true", help="Save results as the new baseline")
+    parser.add_argument("-k", "--keep", action="store_true", help="Keep generated inputs and outputs")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.cases if name not in cases]
+    if unknown:
+        parser.error(f"Unknown cases: {', '.join(unknown)}")
+
+    results = {}
+    for name in args.cases or cases:
+        print(f"Running {name}...")
+        results[name] = runCase(name, args.workDir, args.scale)
+        print(f"  {results[name]}")
+
+    if not args.keep:
+        shutil.rmtree(args.workDir, ignore_errors=True)
+
+    baseline = json.loads(baselinePath.read_text()) if baselinePath.exists() else {}
+
+    if args.baseline:
+        baselinePath.write_text(json.dumps(baseline | results, indent=4))
+        print(f"Saved baseline to {baselinePath}")
+        sys.exit()
+
+    if not baseline:
+        print("No baseline to compare against, run with --baseline to save one")
+        sys.exit()
+
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,208 @@
+import random
+import zipfile
+import pandas as pd
+from pathlib import Path
+from lib.tools.bigFileWriter import BigFileWriter
+
+# Synthetic inputs shaped like real sources, seeded so that runs are comparable
+
+_ranks = ["kingdom", "phylum", "class", "order", "family", "genus", "species", "subspecies"]
+_divisions = [("0", "BCT", "Bacteria"), ("1", "INV", "Invertebrates"), ("2", "MAM", "Mammals"), ("4", "PLN", "Plants and Fungi"), ("5", "PRI", "Primates"), ("10", "VRT", "Vertebrates")]
+_states = ["NSW", "VIC", "QLD", "WA", "SA", "TAS", "NT", "ACT"]
+
+def _word(rng: random.Random, length: int = 8) -> str:
+    return "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(length))
+
+def _species(rng: random.Random, genera: int = 500) -> str:
+    return f"Genus{rng.randrange(genera)} {_word(rng, 7)}"
+
+def biosampleCSV(filePath: Path, rows: int, extraColumns: int = 100, seed: int = 0) -> int:
+    # Wide sample attribute table with mostly empty columns, like the flattened biosample set
+    rng = random.Random(seed)
+    records = []
+    for idx in range(rows):
+        record = {
+            "accession": f"SAMN{idx:08d}",
+            "organism": _species(rng),
+            "taxonomy_id": str(rng.randrange(1, 2000000)),
+            "collection_date": f"{rng.randrange(1950, 2024)}-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}",
+            "lat_lon": f"{rng.uniform(-44, -10):.4f} S {rng.uniform(113, 154):.4f} E",
+            "geo_loc_name": f"Australia: {rng.choice(_states)}",
+            "specimen_voucher": f"MUS:{rng.randrange(100000)}" if rng.random() < 0.3 else "",
+            "sex": rng.choice(["male", "female", "na", ""]),
+            "title": " ".join(_word(rng, rng.randrange(3, 10)) for _ in range(rng.randrange(3, 12)))
+        }
+
+        for column in range(extraColumns):
+            record[f"attribute_{column}"] = _word(rng) if rng.random() < 0.1 else ""
+
+        records.append(record)
+
+    pd.DataFrame.from_records(records).to_csv(filePath, index=False)
+    return rows
+
+def checklistCSV(filePath: Path, rows: int, seed: int = 0) -> int:
+    # Taxonomic checklist with a column per higher rank, like the AFD checklist export
+    rng = random.Random(seed)
+    records = []
+    for idx in range(rows):
+        genus = f"Genus{rng.randrange(2000)}"
+        species = _word(rng, 9)
+        records.append({
+            "TAXON_GUID": f"{idx:08x}-0000-0000-0000-{rng.getrandbits(48):012x}",
+            "NAME_TYPE": rng.choice(["Valid Name", "Synonym", "Common Name"]),
+            "RANK": rng.choice(_ranks[5:]),
+            "KINGDOM": "ANIMALIA",
+            "PHYLUM": rng.choice(["ARTHROPODA", "CHORDATA", "MOLLUSCA"]),
+            "CLASS": rng.choice(["INSECTA", "ARACHNIDA", "AVES", "GASTROPODA"]),
+            "ORDER": f"ORDER{rng.randrange(40)}",
+            "FAMILY": f"FAMILY{rng.randrange(600)}",
+            "GENUS": genus,
+            "SPECIES": species,
+            "SCIENTIFIC_NAME": f"{genus} {species}",
+            "AUTHOR": f"{_word(rng, 6).title()}",
+            "YEAR": str(rng.randrange(1758, 2024)),
+            "QUALIFICATION": "" if rng.random() < 0.8 else " ".join(_word(rng) for _ in range(20)),
+            "PUBLICATION": f"{_word(rng, 10).title()} {rng.randrange(1, 200)}: {rng.randrange(1, 900)}"
+        })
+
+    pd.DataFrame.from_records(records).to_csv(filePath, index=False)
+    return rows
+
+def genbankFlatfile(filePath: Path, records: int, seed: int = 0) -> int:
+    rng = random.Random(seed)
+    entries = ["GBINV1.SEQ          Genetic Sequence Data Bank\n\n"]
+
+    for idx in range(records):
+        locus = f"AB{idx:06d}"
+        length = rng.randrange(300, 1500)
+        organism = _species(rng)
+        gene = rng.choice(["COX1", "16S", "CYTB", "ND2"])
+        sequence = "".join(rng.choice("acgt") for _ in range(length))
+        origin = "\n".join(f"{pos + 1:>9} " + " ".join(sequence[pos + offset:pos + offset + 10] for offset in range(0, 60, 10)) for pos in range(0, length, 60))
+
+        entries.append(
+            f"LOCUS       {locus:<16}{length:>12} bp    DNA     linear   INV 01-JAN-2020\n"
+            f"DEFINITION  {organism} voucher MUS:{idx} {gene} gene, partial cds;\n"
+            f"            mitochondrial.\n"
+            f"ACCESSION   {locus}\n"
+            f"VERSION     {locus}.1\n"
+            f"KEYWORDS    BARCODE.\n"
+            f"SOURCE      mitochondrion {organism}\n"
+            f"  ORGANISM  {organism}\n"
+            f"            Eukaryota; Metazoa; Ecdysozoa; Arthropoda; Hexapoda; Insecta.\n"
+            f"REFERENCE   1  (bases 1 to {length})\n"
+            f"  AUTHORS   {_word(rng, 6).title()},A. and {_word(rng, 6).title()},B.\n"
+            f"  TITLE     Direct Submission\n"
+            f"  JOURNAL   Submitted (01-JAN-2020) Museum, Australia\n"
+            f"FEATURES             Location/Qualifiers\n"
+            f"     source          1..{length}\n"
+            f"                     /organism=\"{organism}\"\n"
+            f"                     /organelle=\"mitochondrion\"\n"
+            f"                     /mol_type=\"genomic DNA\"\n"
+            f"                     /specimen_voucher=\"MUS:{idx}\"\n"
+            f"                     /country=\"Australia: {rng.choice(_states)}\"\n"
+            f"     gene            <1..>{length}\n"
+            f"                     /gene=\"{gene}\"\n"
+            f"     CDS             <1..>{length}\n"
+            f"                     /gene=\"{gene}\"\n"
+            f"                     /codon_start=1\n"
+            f"                     /product=\"{gene} protein\"\n"
+            f"ORIGIN      \n"
+            f"{origin}\n"
+            f"//\n"
+        )
+
+    with open(filePath, "w") as fp:
+        fp.write("".join(entries))
+
+    return records
+
+def taxdump(filePath: Path, nodes: int, seed: int = 0) -> int:
+    # Zipped nodes, names and division dumps, each node has a random earlier node as its parent
+    rng = random.Random(seed)
+
+    def line(*values) -> str:
+        return "\t|\t".join(str(value) for value in values) + "\t|\n"
+
+    # Trailing fields are given values as empty ones are stripped with the line ending when parsed
+    nodeLines = [line(1, 1, "no rank", "", 1, 0, 1, 0, 2, 0, 0, 0, "root")]
+    nameLines = [line(1, "root", "", "scientific name")]
+    for taxID in range(2, nodes + 1):
+        parent = rng.randrange(max(1, taxID - 50), taxID)
+        inherit = int(rng.random() < 0.5)
+        nodeLines.append(line(taxID, parent, rng.choice(_ranks), "", rng.choice(_divisions)[0], inherit, 1, inherit, 2, inherit, 0, 0, "synthetic"))
+        nameLines.append(line(taxID, _species(rng), "", "scientific name"))
+
+        if rng.random() < 0.2:
+            nameLines.append(line(taxID, _species(rng), "", rng.choice(["synonym", "in-part", "common name"])))
+
+    nameLines.append(line(1, "all", "", "in-part"))
+    divisionLines = [line(divisionID, code, name, "synthetic") for divisionID, code, name in _divisions]
+
+    with zipfile.ZipFile(filePath, "w", zipfile.ZIP_DEFLATED) as zipfp:
+        zipfp.writestr("nodes.dmp", "".join(nodeLines))
+        zipfp.writestr("names.dmp", "".join(nameLines))
+        zipfp.writestr("division.dmp", "".join(divisionLines))
+
+    return nodes
+
+def nestedXML(filePath: Path, records: int, seed: int = 0) -> int:
+    # Biosample set style xml with repeated id and attribute children
+    rng = random.Random(seed)
+    with open(filePath, "w") as fp:
+        fp.write('<?xml version="1.0" encoding="UTF-8"?>\n<BioSampleSet>\n')
+        for idx in range(records):
+            attributes = "".join(
+                f'<Attribute attribute_name="{name}">{value}</Attribute>'
+                for name, value in (
+                    ("collection date", f"{rng.randrange(1950, 2024)}"),
+                    ("geo_loc_name", f"Australia: {rng.choice(_states)}"),
+                    ("lat_lon", f"{rng.uniform(-44, -10):.4f} S {rng.uniform(113, 154):.4f} E"),
+                    ("tissue", rng.choice(["muscle", "leg", "whole body"])),
+                    (f"extra_{rng.randrange(50)}", _word(rng))
+                )
+            )
+
+            fp.write(
+                f'<BioSample id="{idx}" accession="SAMN{idx:08d}" submission_date="2020-01-01">'
+                f'<Ids><Id db="BioSample" is_primary="1">SAMN{idx:08d}</Id><Id db_label="Sample name">{_word(rng)}</Id></Ids>'
+                f'<Description><Title>{_word(rng)} {_word(rng)}</Title><Organism taxonomy_id="{rng.randrange(2000000)}" taxonomy_name="{_species(rng)}"/></Description>'
+                f'<Owner><Name>{_word(rng).title()} Museum</Name></Owner>'
+                f'<Attributes>{attributes}</Attributes>'
+                f'</BioSample>\n'
+            )
+
+        fp.write("</BioSampleSet>\n")
+
+    return records
+
+def subfiles(outputFile: Path, files: int, rowsPerFile: int, seed: int = 0) -> int:
+    # Chunks with overlapping but not identical columns, as written by processing steps
+    rng = random.Random(seed)
+    writer = BigFileWriter(outputFile)
+    for _ in range(files):
+        columns = [f"column_{column}" for column in range(30) if rng.random() < 0.8]
+        writer.writeDF(pd.DataFrame({column: [_word(rng, 6) for _ in range(rowsPerFile)] for column in columns}))
+
+    return files * rowsPerFile
+
+# Map of source columns to events for conversion of the synthetic csvs
+conversionMap = {
+    "collections": {
+        "scientific_name": ["organism", "SCIENTIFIC_NAME"],
+        "event_date": ["collection_date"],
+        "locality": ["geo_loc_name"],
+        "verbatim_lat_long": ["lat_lon"],
+        "catalog_number": ["specimen_voucher"],
+        "taxon_rank": ["RANK"],
+        "scientific_name_authorship": ["AUTHOR"]
+    },
+    "accessions": {
+        "material_sample_id": ["accession", "TAXON_GUID"],
+        "sex": ["sex"]
+    },
+    "sequences": {
+        "taxon_id": ["taxonomy_id"]
+    }
+}
@@ -0,0 +1,133 @@
+import shutil
+import tempfile
+import threading
+import concurrent.futures
+from pathlib import Path
+from typing import Callable
+from datetime import datetime, timedelta
+from lib.scheduling.scheduler import Scheduler, FakeClock
+
+# Run from the src folder with `python tests/scheduling/scheduler.py`
+# Checks the update scheduler with a fake clock and stub sources, so no updates are run and no time is waited
+
+start = datetime(2024, 1, 1)
+interval = timedelta(days=1)
+
+class _UpdateManager:
+    def __init__(self, firstRun: datetime):
+        self.firstRun = firstRun
+        self.updated = False
+
+    def getNextUpdate(self, lastCheck: datetime | None, now: datetime) -> datetime:
+        # Stub sources have no metadata, so once updated they're next due an interval after the update finished
+        return now + interval if self.updated else self.firstRun
+
+class _Source:
+    def __init__(self, name: str, workDir: Path, firstRun: datetime):
+        self.name = name
+        self.subsectionDir = workDir
+        self.updateManager = _UpdateManager(firstRun)
+
+    def __str__(self) -> str:
+        return self.name
+
+def _scheduler(workDir: Path, firstRuns: dict[str, int], runner: Callable[[str], bool], **kwargs: dict) -> Scheduler:
+    sources = {name: _Source(name, workDir, start + timedelta(seconds=seconds)) for name, seconds in firstRuns.items()}
+
+    def update(name: str) -> bool:
+        success = runner(name)
+        sources[name].updateManager.updated = success
+        return success
+
+    return Scheduler(list(sources.values()), statePath=workDir / "schedulerState.json", clock=FakeClock(start), runner=update, **kwargs)
+
+def _waitRunning(scheduler: Scheduler) -> None:
+    concurrent.futures.wait(list(scheduler.running.values()))
+
+def dueOrder(workDir: Path) -> None:
+    order = []
+
+    def runner(name: str) -> bool:
+        order.append(name)
+        return True
+
+    scheduler = _scheduler(workDir, {"a": 30, "b": 10, "c": 20}, runner, workers=1)
+    assert scheduler.step() == 10 # Seconds until the first source is due
+
+    scheduler.clock.current = start + timedelta(seconds=60) # All sources are due
+    while len(order) < 3:
+        scheduler.step()
+        _waitRunning(scheduler)
+
+    assert order == ["b", "c", "a"]
+
+def workerLimit(workDir: Path) -> None:
+    lock = threading.Lock()
+    release = threading.Event()
+    active = [0]
+    maxActive = [0]
+
+    def runner(name: str) -> bool:
+        with lock:
+            active[0] += 1
+            maxActive[0] = max(maxActive[0], active[0])
+
+        release.wait(10)
+        with lock:
+            active[0] -= 1
+
+        return True
+
+    scheduler = _scheduler(workDir, {name: 0 for name in "abcde"}, runner, workers=2)
+    scheduler.step()
+    assert len(scheduler.running) == 2
+    assert len(scheduler.queue) == 3 # Due sources wait for a free worker
+
+    release.set()
+    while scheduler.queue and scheduler.queue[0][0] <= scheduler.clock.now() or scheduler.running:
+        _waitRunning(scheduler)
+        scheduler.step()
+        assert len(scheduler.running) <= 2
+
+    assert maxActive[0] == 2
+    assert all(scheduler.state[name]["lastSuccess"] for name in "abcde")
+
+def failureBackoff(workDir: Path) -> None:
+    scheduler = _scheduler(workDir, {"a": 0}, lambda name: False, retryDelay=10, maxRetryDelay=40)
+
+    delays = []
+    for _ in range(5):
+        scheduler.step()
+        _waitRunning(scheduler)
+        sleepTime = scheduler.step() # Collects the failure and reschedules it
+        delays.append(sleepTime)
+        scheduler.clock.sleep(sleepTime, scheduler._wake)
+
+    assert delays == [10, 20, 40, 40, 40] # Doubles each failure up to the limit
+    assert scheduler.state["a"]["failures"] == 5
+    assert not scheduler.state["a"]["lastSuccess"]
+
+def stateReload(workDir: Path) -> None:
+    scheduler = _scheduler(workDir, {"a": 0, "b": 600}, lambda name: True)
+    scheduler.step()
+    _waitRunning(scheduler)
+    scheduler.step()
+    schedule = scheduler.getSchedule()
+    assert schedule == [(start + timedelta(seconds=600), "b"), (start + interval, "a")]
+
+    # Sources report different times when loaded again, but saved next runs take priority
+    reloaded = _scheduler(workDir, {"a": 60, "b": 60}, lambda name: True)
+    assert reloaded.getSchedule() == schedule
+    assert reloaded.state["a"]["lastSuccess"]
+
+cases = [dueOrder, workerLimit, failureBackoff, stateReload]
+
+if __name__ == "__main__":
+    for case in cases:
+        workDir = Path(tempfile.mkdtemp())
+        try:
+            case(workDir)
+        finally:
+            shutil.rmtree(workDir)
+
+        print(f"{case.__name__} passed")
@@ -0,0 +1,24 @@
+import pandas as pd
+from typing import Iterator
+
+# Streaming step functions used by streaming.py
+
+def double(stream: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+    for df in stream:
+        df["doubled"] = df["value"].astype(int) * 2
+        yield df
+
+def reorder(stream: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+    # Every other chunk has its columns reversed
+    for idx, df in enumerate(stream):
+        yield df[df.columns[::-1]] if idx % 2 else df
+
+def dropColumn(stream: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+    # Later chunks are missing a column
+    for idx, df in enumerate(stream):
+        yield df.drop(columns=["doubled"]) if idx else df
+
+def addColumn(stream: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+    # Later chunks have a column the first chunk didn't
+    for idx, df in enumerate(stream):
+        yield df.assign(extra=1) if idx else df
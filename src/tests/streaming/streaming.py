@@ -0,0 +1,73 @@
+import shutil
+import tempfile
+import pandas as pd
+from pathlib import Path
+from lib.processing.stages import File
+from lib.systemManagers.processing import ProcessingManager
+
+# Run from the src folder with `python tests/streaming/streaming.py`
+# Checks the behaviour of streaming processing steps, which are chained in memory and written in chunks
+
+stepsPath = str(Path(__file__).parent / "steps.py")
+chunkSize = 100
+inputRows = 450
+
+def _step(function: str, output: str, **properties: dict) -> dict:
+    return {"path": stepsPath, "function": function, "output": output, "stream": True, "chunkSize": chunkSize} | properties
+
+def _process(workDir: Path, steps: list[dict]) -> tuple[bool, dict]:
+    inputPath = workDir / "input.csv"
+    pd.DataFrame({"id": range(inputRows), "value": range(inputRows)}).to_csv(inputPath, index=False)
+
+    manager = ProcessingManager(workDir, workDir / "processing")
+    manager.registerFile(File(inputPath), steps)
+    return manager.process(True)
+
+def chainedSteps(workDir: Path) -> None:
+    # Steps without a checkpoint are passed along in memory and only the last is written
+    success, metadata = _process(workDir, [_step("double", "doubled.csv"), _step("reorder", "reordered.csv")])
+    assert success
+    assert not (workDir / "processing" / "doubled.csv").exists()
+    assert metadata["steps"][-1]["streamed"] == ["double", "reorder"]
+
+    df = pd.read_csv(workDir / "processing" / "reordered.csv")
+    assert list(df.columns) == ["id", "value", "doubled"]
+    assert len(df) == inputRows
+    assert (df["doubled"] == df["value"] * 2).all() # Reversed chunks are realigned to the first chunk
+
+def checkpointStep(workDir: Path) -> None:
+    success, _ = _process(workDir, [_step("double", "doubled.csv", checkpoint=True), _step("reorder", "reordered.parquet")])
+    assert success
+    assert len(pd.read_csv(workDir / "processing" / "doubled.csv")) == inputRows
+
+    df = pd.read_parquet(workDir / "processing" / "reordered.parquet").astype(int) # Checkpoints are read back as strings
+    assert list(df.columns) == ["id", "value", "doubled"]
+    assert (df["doubled"] == df["value"] * 2).all()
+
+def missingColumns(workDir: Path) -> None:
+    for output in ("dropped.csv", "dropped.parquet"):
+        success, _ = _process(workDir, [_step("double", "doubled.csv"), _step("dropColumn", output)])
+        assert success
+
+        df = pd.read_csv(workDir / "processing" / output) if output.endswith(".csv") else pd.read_parquet(workDir / "processing" / output)
+        assert len(df) == inputRows
+        assert df["doubled"].isna().sum() == inputRows - chunkSize # Only the first chunk has the column
+
+def newColumns(workDir: Path) -> None:
+    for output in ("added.csv", "added.parquet"):
+        success, _ = _process(workDir, [_step("addColumn", output)])
+        assert not success
+        assert not (workDir / "processing" / output).exists() # No partial output is left
+        assert not list((workDir / "processing").glob("*.tmp"))
+
+cases = [chainedSteps, checkpointStep, missingColumns, newColumns]
+
+if __name__ == "__main__":
+    for case in cases:
+        workDir = Path(tempfile.mkdtemp())
+        try:
+            case(workDir)
+        finally:
+            shutil.rmtree(workDir)
+
+        print(f"{case.__name__} passed")
@@ -1,8 +1,74 @@
 import requests
-import math
+import threading
+import time
 import pandas as pd
 import concurrent.futures
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+from lib.tools.bigFileWriter import BigFileWriter, Format
+
+# Fields requested alongside each photo listing so that per-photo getInfo/getSizes calls can be skipped
+extras = [
+    "description",
+    "license",
+    "date_taken",
+    "owner_name",
+    "path_alias",
+    "original_format",
+    "tags",
+    "url_o",
+    "url_k",
+    "url_h",
+    "url_l",
+    "url_c",
+    "url_z",
+    "url_m"
+]
+
+sizeSuffixes = [extra.split("_")[-1] for extra in extras if extra.startswith("url_")] # Largest to smallest
+
+class RateLimiter:
+    def __init__(self, callsPerHour: int = 3600):
+        self.interval = 3600 / callsPerHour
+        self._nextCall = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            waitTime = self._nextCall - now
+            self._nextCall = max(self._nextCall, now) + self.interval
+
+        if waitTime > 0:
+            time.sleep(waitTime)
+
+class FlickrAPI:
+    def __init__(self, apiKey: str, maxWorkers: int = 16, callsPerHour: int = 3600, retries: int = 3):
+        self.apiKey = apiKey
+        self.retries = retries
+        self.limiter = RateLimiter(callsPerHour)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=maxWorkers)
+        self.session.mount("https://", adapter)
+
+    def call(self, method: str, **kwargs) -> dict:
+        for _ in range(self.retries):
+            self.limiter.wait()
+            try:
+                response = self.session.get(buildURL(self.apiKey, method, **kwargs))
+            except requests.exceptions.ConnectionError:
+                continue
+
+            if response.status_code != 200:
+                continue
+
+            data = response.json()
+            if data.get("stat", "ok") == "ok":
+                return data
+
+        print(f"Failed call to {method} with args: {kwargs}")
+        return {}
 
 def buildURL(apiKey, method, **kwargs):
     baseURL = "https://api.flickr.com/services/rest/?method="
@@ -20,50 +86,62 @@ def cleanDimension(value) -> int:
         return 1
     return int(value)
 
-def processPhoto(apiKey: str, licenses: dict, photo: dict) -> dict:
+def getLargestSize(photo: dict) -> dict:
+    for suffix in sizeSuffixes:
+        source = photo.get(f"url_{suffix}", None)
+        if source:
+            return {"source": source, "width": photo.get(f"width_{suffix}", ""), "height": photo.get(f"height_{suffix}", "")}
+
+    return {}
+
+def processPhoto(api: FlickrAPI, licenses: dict, photo: dict) -> dict:
     photoID = photo["id"]
+    image = getLargestSize(photo)
 
-    response = requests.get(buildURL(apiKey, "flickr.photos.getInfo", photo_id=photoID))
-    if response.status_code != 200:
-        print(f"Info error with id: {photoID}")
-        return {}
-    
-    photoInfo = response.json()["photo"]
+    if not image: # Extras did not include any sizes, fall back to requesting them
+        data = api.call("flickr.photos.getSizes", photo_id=photoID)
+        if not data:
+            print(f"Size error with id: {photoID}")
+            return {}
 
-    response = requests.get(buildURL(apiKey, "flickr.photos.getSizes", photo_id=photoID))
-    if response.status_code != 200:
-        print(f"Size error with id: {photoID}")
-        return {}
-    
-    photoSizes = response.json()["sizes"]
-    image = sorted(photoSizes["size"], key=lambda x: cleanDimension(x["width"]) * cleanDimension(x["height"]), reverse=True)[0]
-    
-    tags = [tag["raw"] for tag in photoInfo["tags"]["tag"]]
+        image = sorted(data["sizes"]["size"], key=lambda x: cleanDimension(x["width"]) * cleanDimension(x["height"]), reverse=True)[0]
+
+    owner = photo.get("pathalias") or photo["owner"]
 
     return {
         "type": "image",
-        "format": image["source"].rsplit(".", 1)[-1],
+        "format": photo.get("originalformat") or image["source"].rsplit(".", 1)[-1],
         "identifier": image["source"],
-        "references": image["url"].rsplit("/", 3)[0],
-        "title": photoInfo["title"]["_content"],
-        "description": photoInfo["description"]["_content"],
-        "created": photoInfo["dates"]["taken"],
-        "creator": photoInfo["owner"]["username"],
+        "references": f"https://www.flickr.com/photos/{owner}/{photoID}",
+        "title": photo.get("title", ""),
+        "description": photo.get("description", {}).get("_content", ""),
+        "created": photo.get("datetaken", ""),
+        "creator": photo.get("ownername", ""),
         "contributor": "",
-        "publisher": photoInfo["owner"]["username"],
+        "publisher": photo.get("ownername", ""),
         "audience": "",
         "source": "flickr.com",
-        "license": licenses[int(photoInfo["license"])],
+        "license": licenses.get(int(photo.get("license", -1)), ""),
         "rightsHolder": "",
         "datasetID": photoID,
         "taxonName": "",
         "width": image["width"],
         "height": image["height"],
-        "tags": tags
+        "tags": photo.get("tags", "").split()
     }
 
-def run():
+def getPage(api: FlickrAPI, licenses: dict, user: str, page: int, photosPerCall: int) -> tuple[str, int, int, list[dict]]:
+    data = api.call("flickr.people.getPhotos", user_id=user, per_page=photosPerCall, page=page, extras=",".join(extras))
+    if not data:
+        return user, page, -1, []
+
+    photoData = data["photos"]
+    photos = [processPhoto(api, licenses, photo) for photo in photoData.get("photo", [])]
+    return user, page, int(photoData.get("pages", 0)), [photo for photo in photos if photo]
+
+def run(maxWorkers: int = 16, callsPerHour: int = 3600):
     baseDir = Path(__file__).parent
+    outputDir = baseDir / "userImages"
 
     with open(baseDir / "flickrkey.txt") as fp:
         apiKeyData = fp.read()
@@ -72,53 +150,83 @@ def run():
         users = fp.read()
 
     apiKey, secret = apiKeyData.rstrip("\n").split("\n")
-    userList = users.rstrip("\n").split("\n")
+    userList = [user for user in users.rstrip("\n").split("\n") if not user.startswith("_")]
 
     photosPerCall = 500
+    api = FlickrAPI(apiKey, maxWorkers, callsPerHour)
 
     # Get licenses
     print("Getting license information")
-    response = requests.get(buildURL(apiKey, "flickr.photos.licenses.getInfo"))
-    licenseData = response.json()
-    licenses = {licenseInfo["id"]: licenseInfo["name"] for licenseInfo in licenseData["licenses"]["license"]}
+    licenseData = api.call("flickr.photos.licenses.getInfo")
+    licenses = {int(licenseInfo["id"]): licenseInfo["name"] for licenseInfo in licenseData["licenses"]["license"]}
 
+    # Set up a writer per user, resuming from any pages already written
+    writers: dict[str, BigFileWriter] = {}
+    pendingPages: dict[str, int] = {}
     for user in userList:
-        if user.startswith("_"):
+        outputFile = outputDir / f"{user}.csv"
+        if outputFile.exists():
+            print(f"Photos for {user} already collected, skipping")
             continue
 
-        print(f"Getting photos for {user}")
-        response = requests.get(buildURL(apiKey, "flickr.people.getPhotos", user_id=user, per_page=1))
-        data = response.json()
-
-        totalPhotos = data["photos"]["total"]
-        totalCalls = math.ceil(totalPhotos / photosPerCall)
-
-        photos = []
-        for call in range(1, totalCalls + 1):
-            print(f"Processing page {call} / {totalCalls}")
-            response = requests.get(buildURL(apiKey, "flickr.people.getPhotos", user_id=user, per_page=photosPerCall, page=call))
-            photoData = response.json()["photos"]
-            photoList = photoData.get("photo", [])
-
-            with concurrent.futures.ThreadPoolExecutor(max_workers=50) as executor:
-                futures = (executor.submit(processPhoto, apiKey, licenses, photo) for photo in photoList)
-            
-                try:
-                    for idx, future in enumerate(concurrent.futures.as_completed(futures), start=1):
-                        result = future.result()
-                        print(f"At photo {idx} / {len(photoList)}", end="\r")
-                        if result:
-                            photos.append(result)
-
-                except (KeyboardInterrupt, ValueError):
-                    print("\nExiting...")
-                    executor.shutdown(cancel_futures=True)
-                    exit()
+        writer = BigFileWriter(outputFile, f"{user}_pages", "page", Format.CSV)
+        writer.populateFromFolder(writer.subfileDir)
+        writers[user] = writer
+
+    def writePage(user: str, page: int, photos: list[dict]) -> None:
+        writers[user].writeDF(pd.DataFrame.from_records(photos), f"page_{page}")
+
+        pendingPages[user] -= 1
+        if pendingPages[user] == 0:
+            print(f"Finished collecting photos for {user}")
+            writers[user].oneFile()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+        try:
+            # First page of each user also reports how many pages there are
+            firstPages = [executor.submit(getPage, api, licenses, user, 1, photosPerCall) for user in writers]
+            pageFutures = []
+
+            for future in concurrent.futures.as_completed(firstPages):
+                user, _, totalPages, photos = future.result()
+                if totalPages < 0:
+                    print(f"Unable to get photos for {user}")
+                    continue
+
+                if totalPages == 0:
+                    print(f"No photos found for {user}")
+                    continue
+
+                completed = set(writers[user].getSubfileNames())
+                remaining = [page for page in range(1, totalPages + 1) if f"page_{page}" not in completed]
+                pendingPages[user] = len(remaining)
+                print(f"Collecting {len(remaining)} / {totalPages} pages for {user}")
+
+                if not remaining: # All pages written on a previous run
+                    writers[user].oneFile()
+                    continue
+
+                if remaining[0] == 1:
+                    writePage(user, 1, photos)
+                    remaining.pop(0)
+
+                pageFutures.extend(executor.submit(getPage, api, licenses, user, page, photosPerCall) for page in remaining)
+
+            for idx, future in enumerate(concurrent.futures.as_completed(pageFutures), start=1):
+                user, page, totalPages, photos = future.result()
+                print(f"At page {idx} / {len(pageFutures)}", end="\r")
+                if totalPages < 0:
+                    print(f"Failed to get page {page} for {user}, rerun to resume")
+                    continue
+
+                writePage(user, page, photos)
 
             print()
 
-        df = pd.DataFrame.from_records(photos)
-        df.to_csv(baseDir / "userImages" / f"{user}.csv", index=False)
+        except (KeyboardInterrupt, ValueError):
+            print("\nExiting...")
+            executor.shutdown(cancel_futures=True)
+            exit()
 
 if __name__ == "__main__":
     run()
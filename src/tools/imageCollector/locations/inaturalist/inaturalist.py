@@ -25,7 +25,7 @@ def run():
     observers["creator"] = observers["name"].fillna(observers["login"])
     observers.drop(["name", "login"], axis=1, inplace=True)
 
-    writer = BigFileWriter(Path("./inaturalist.csv"), "subfiles")
+    writer = BigFileWriter(Path("./inaturalist.csv"), "subfiles", backgroundFlush=True) # Subfiles are written while the next chunk is merged
 
     photosGen = cmn.chunkGenerator(photos, 1024*1024*2, "\t")
     for idx, df in enumerate(photosGen, start=1):
@@ -81,7 +81,7 @@ def run():
         df["source"] = "iNaturalist"
         df["publisher"] = "iNaturalist"
         
-        writer.writeDF(df)
+        writer.appendBatch(df)
     
     print()
     writer.oneFile(False)
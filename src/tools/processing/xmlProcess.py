@@ -1,11 +1,9 @@
 import argparse
 import json
 from pathlib import Path
-from xml.etree import cElementTree as ET
-from lib.tools.subfileWriter import Writer
-import lib.commonFuncs as cmn
-import gc
-import pandas as pd
+from xml.etree import ElementTree as ET
+from lib.tools.bigFileWriter import BigFileWriter, Format
+import lib.tools.zipping as zp
 
 class ElementContainer:
     def __init__(self, element: ET.Element):
@@ -71,9 +69,7 @@ class ElementContainer:
 
         return flat
 
-def process(filePath: Path, outputFilePath: Path, encoding="utf-8", entryCount: int = 0, firstEntry: int = 0, subfileRows: int = 0, onlyIncludeTags: list = [], compressChild: list = [], collectionExtract: dict = {}):
-    writer = Writer(outputFilePath.parent, "xmlProcessing", "xmlSection")
-
+def process(filePath: Path, outputFilePath: Path, encoding="utf-8", entryCount: int = 0, firstEntry: int = 0, subfileRows: int = 0, onlyIncludeTags: list = [], compressChild: list = [], collectionExtract: dict = {}, threads: int = 1):
     if entryCount < 0:
         raise Exception(f"Invalid entry count {entryCount}, must be >= 0") from AttributeError
 
@@ -84,17 +80,21 @@ def process(filePath: Path, outputFilePath: Path, encoding="utf-8", entryCount:
         raise Exception(f"Invalid subfile rows {subfileRows}, must be >= 0") from AttributeError
 
     lastEntry = (firstEntry + entryCount - 1) if entryCount > 0 else -1 # Ignore last entry if all entries requested
+    writer = BigFileWriter(outputFilePath, "xmlProcessing", "xmlSection", Format.CSV, flushRows=subfileRows)
+
+    # Compressed inputs are parsed as they are decompressed rather than being extracted first
+    archive = zp.ArchiveReader(filePath, threads)
+    source = archive.open() if zp.canBeExtracted(filePath) else filePath
 
     parser = ET.XMLParser(encoding=encoding)
-    iterator = ET.iterparse(filePath, events=('start', 'end'), parser=parser)
+    iterator = ET.iterparse(source, events=('start', 'end'), parser=parser)
     _, root = next(iterator)
 
     event, element = next(iterator)
     topLevelTag = element.tag
 
     path = [ElementContainer(element)]
-    data = []
-    columns = []
+    entriesRead = 0
     currentEntry = 0
 
     print(f'At entry: {currentEntry+1:,}', end='\r')
@@ -123,31 +123,18 @@ def process(filePath: Path, outputFilePath: Path, encoding="utf-8", entryCount:
                 element.clear()
                 continue
 
-            if len(data) >= firstEntry: # Only add data if it is within data entry range
-                flatContainer = elementContainer.flatten(compressChild, collectionExtract)
-                data.append(flatContainer)
-                columns = cmn.extendUnique(columns, flatContainer.keys())
-                if len(data) == lastEntry: # Exit if last entry reached
+            if entriesRead >= firstEntry: # Only add data if it is within data entry range
+                writer.append(elementContainer.flatten(compressChild, collectionExtract)) # Flushed to a subfile every subfileRows entries or once the buffer gets large
+                if entriesRead == lastEntry: # Exit if last entry reached
                     break
 
-            if len(data) == subfileRows:
-                df = pd.DataFrame.from_records(data, columns=columns)
-                writer.writeDF(df)
-                data.clear()
-                columns.clear()
-                del df
-                gc.collect()
-
+            entriesRead += 1
             element.clear()
             root.clear()
 
-    # Write remaining data to file
-    if data:
-        df = pd.DataFrame.from_records(data, columns=columns)
-        writer.writeDF(df)
-
     print()
-    writer.oneFile(outputFilePath) # Compress to one file
+    archive.close()
+    writer.oneFile() # Compress to one file
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Convert xml to csv")
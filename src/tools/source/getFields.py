@@ -1,50 +1,21 @@
 import pandas as pd
 import json
 from lib.data.argParser import ArgParser
-from lib.processing.stages import File, Step
-from lib.processing.mapping import Remapper
+from lib.processing.steps import Step
+from lib.tools.fieldProfiler import profileFile
 import random
 from lib.tools.logger import Logger
 
-def _collectFields(stageFile: File, entryLimit: int, chunkSize: int, seed: int, offset: int = 0, rows: int = None) -> dict[str, pd.Series]:
-    for idx, chunk in enumerate(stageFile.loadDataFrameIterator(chunkSize, offset, rows), start=1):
-        print(f"Scanning chunk: {idx}", end='\r')
-        sample = chunk.apply(lambda x: x.dropna().drop_duplicates())
-
-        if idx == 1:
-            df = sample
-            continue
-
-        df = pd.concat([df, sample], ignore_index=True)
-        df = df.apply(lambda x: x.drop_duplicates().sample(n=entryLimit, replace=True, random_state=seed).drop_duplicates())
-
-    return {column: df[column].dropna().tolist() for column in df.columns}
-
-def _collectRecords(stageFile: File, entryLimit: int, chunkSize: int, seed: int, offset: int = 0, rows: int = None) -> dict[str, pd.Series]:
-    for idx, chunk in enumerate(stageFile.loadDataFrameIterator(chunkSize, offset, rows), start=1):
-        print(f"Scanning chunk: {idx}", end='\r')
-        sample = chunk.sample(n=min(len(chunk), entryLimit), random_state=seed)
-
-        if idx == 1:
-            df = sample
-            continue
-
-        df = pd.concat([df, sample])
-        emptyDF = df.isna().sum(axis=1)
-        indexes = [idx for idx, _ in sorted(emptyDF.items(), key=lambda x: x[1])]
-        df = df.loc[indexes[:entryLimit]]
-
-    return {column: df[column].tolist() for column in df.columns}
-
 if __name__ == '__main__':
     parser = ArgParser(description="Get column names of preDwc files")
     parser.add_argument('-e', '--entries', type=int, default=50, help="Number of unique entries to get")
     parser.add_argument('-t', '--tsv', action="store_true", help="Output as tsv instead")
     parser.add_argument('-u', '--uniques', action="store_true", help="Find unique values only, ignoring record")
-    parser.add_argument('-c', '--chunksize', type=int, default=128, help="File chunk size to read at a time")
+    parser.add_argument('-c', '--chunksize', type=int, default=10000, help="File chunk size to read at a time")
     parser.add_argument('-s', '--seed', type=int, default=-1, help="Specify seed to run")
     parser.add_argument('-f', '--firstrow', type=int, default=0, help="First row offset for reading data")
     parser.add_argument('-r', '--rows', type=int, help="Maximum amount of rows to read from file")
+    parser.add_argument('-j', '--jobs', type=int, default=1, help="Number of processes to scan sections of the file with")
 
     sources, overwrite, verbose, args = parser.parse_args()
     entryLimit = args.entries
@@ -65,7 +36,6 @@ if __name__ == '__main__':
         seed = args.seed if args.seed >= 0 else random.randrange(2**32 - 1) # Max value for pandas seed
         random.seed(seed)
 
-
         columns = stageFile.getColumns()
         mappingSuccess = source.conversionManager.remapper.buildTable(columns)
         if not mappingSuccess:
@@ -74,17 +44,25 @@ if __name__ == '__main__':
         valueType = "fields" if args.uniques else "records"
         Logger.info(f"Collecting {valueType}...")
 
+        # Single pass over the file, sampling values and records and estimating distinct counts as it goes
+        profiler = profileFile(stageFile.filePath, stageFile.separator, stageFile.firstRow + args.firstrow, stageFile.encoding, entryLimit, args.chunksize, seed, args.jobs, args.rows)
+        summary = profiler.summary()
+
         if args.uniques:
-            values = _collectFields(stageFile, args.entries, args.chunksize, seed, args.firstrow, args.rows)
+            values = {column: summary[column]["values"] for column in columns}
         else:
-            values = _collectRecords(stageFile, args.entries, args.chunksize, seed, args.firstrow, args.rows)
+            records = profiler.getRecords()
+            values = {column: records[column].tolist() for column in columns}
 
         output = outputDir / f"{valueType}_{args.chunksize}_{seed}.{extension}"
 
         if mappingSuccess:
-            data = {column: {"Maps to": [{"Event": mappedColumn.event.value, "Column": mappedColumn.colName} for mappedColumn in source.conversionManager.remapper.table.getTranslation(column)], "Values": values[column]} for column in columns}
+            data = {column: {"Maps to": [{"Event": mappedColumn.event.value, "Column": mappedColumn.colName} for mappedColumn in source.conversionManager.remapper.table.getTranslation(column)]} for column in columns}
         else:
-            data = {column: {"Maps to": "N/A", "Values": values[column]} for column in columns}
+            data = {column: {"Maps to": "N/A"} for column in columns}
+
+        for column in columns:
+            data[column] |= {"Null rate": summary[column]["nullRate"], "Distinct (approx)": summary[column]["distinct"], "Values": values[column]}
 
         Logger.info(f"Writing to file {output}")
         if args.tsv:
@@ -1,10 +1,12 @@
 from lib.data.argParser import ArgParser
-from lib.processing.stages import Step
+from lib.processing.steps import Step
+from lib.tools.packaging import PackageFormat
 
 if __name__ == '__main__':
     parser = ArgParser(description="Package converted data")
+    parser.add_argument("-f", "--format", choices=[format.value for format in PackageFormat], help="Archive format, overrides source config")
 
     sources, overwrite, verbose, args = parser.parse_args()
     kwargs = parser.namespaceKwargs(args)
     for source in sources:
-        source.package()
+        source.package(PackageFormat(args.format) if args.format else None)
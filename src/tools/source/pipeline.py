@@ -0,0 +1,14 @@
+from lib.data.argParser import ArgParser
+from lib.data.orchestrator import Orchestrator, Action
+
+if __name__ == '__main__':
+    parser = ArgParser(description="Run steps for many sources in parallel")
+    parser.add_argument("-a", "--actions", nargs="+", choices=[action.value for action in Action], default=[Action.DOWNLOAD.value, Action.PROCESSING.value, Action.CONVERSION.value], help="Actions to run in order for each source")
+    parser.add_argument("-d", "--downloads", type=int, default=4, help="Maximum downloads running at once")
+    parser.add_argument("-w", "--workers", type=int, help="Maximum processing and conversion steps running at once, defaults to half the cpu count")
+    parser.add_argument("-c", "--connections", type=int, default=2, help="Maximum downloads from the same host at once")
+    parser.add_argument("-m", "--minFreeDisk", type=float, default=10, help="Free disk space in GB required to start new tasks")
+
+    sources, overwrite, verbose, args = parser.parse_args()
+    orchestrator = Orchestrator(args.downloads, args.workers, args.connections, int(args.minFreeDisk * 1024**3))
+    orchestrator.run(sources, [Action(action) for action in args.actions], overwrite, verbose)
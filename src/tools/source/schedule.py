@@ -0,0 +1,16 @@
+from lib.data.argParser import ArgParser
+from lib.scheduling.scheduler import Scheduler
+
+if __name__ == '__main__':
+    parser = ArgParser(description="Run updates of sources as they become due")
+    parser.add_argument("-w", "--workers", type=int, default=2, help="Maximum updates running at once")
+    parser.add_argument("-l", "--list", action="store_true", help="Show when each source is next due and exit")
+
+    sources, overwrite, verbose, args = parser.parse_args()
+    scheduler = Scheduler(sources, args.workers)
+
+    if args.list:
+        for nextRun, sourceName in scheduler.getSchedule():
+            print(f"{nextRun:%Y-%m-%d %H:%M}  {sourceName}")
+    else:
+        scheduler.run()
@@ -1,6 +1,5 @@
 from lib.data.argParser import ArgParser
 from lib.tools.logger import Logger
-from lib.processing.stages import Step
 
 if __name__ == '__main__':
     parser = ArgParser(description="Run update on data source")
@@ -13,7 +12,8 @@ if __name__ == '__main__':
             Logger.info(f"Data source '{source}' is not ready for update.")
             continue
 
-        for step in (Step.DOWNLOAD, Step.PROCESSING, Step.CONVERSION):
-            source.create(step, (True, True), True)
+        if not source.update(True):
+            Logger.error(f"Update failed for {source}")
+            continue
 
-        outputFile = source.package()
+        source.package()
@@ -1,5 +1,5 @@
 from lib.data.argParser import ArgParser
-from lib.processing.stages import Step
+from lib.processing.steps import Step
 from lib.processing.mapping import Event
 from lib.tools.logger import Logger
 
@@ -11,19 +11,22 @@ if __name__ == '__main__':
     columnGroup.add_argument("-m", "--mapped", action="store_true", help="Get only mapped fields")
     columnGroup.add_argument("-u", "--unmapped", action="store_true", help="Get only unmapped fields")
     
-    sources, selectedFiles, overwrite, args = parser.parse_args()
+    sources, overwrite, verbose, args = parser.parse_args()
     suffix = ".tsv" if args.tsv else ".csv"
     delim = "\t" if args.tsv else ","
 
     for source in sources:
-        source._prepare(Step.CONVERSION)
+        source._prepare(Step.CONVERSION, False, verbose)
         dwcFile = source.conversionManager.output
 
         if not dwcFile.filePath.exists():
             print(f"DwC file {dwcFile.filePath} does not exist, have you run convert.py?")
             continue
 
-        df = next(dwcFile.loadDataFrameIterator(args.entries))
+        # Only the selected event files are read, and only up to the requested entries
+        events = [event for event in dwcFile.getColumns() if not ((args.mapped and event == Event.UNMAPPED.value) or (args.unmapped and event != Event.UNMAPPED.value))]
+        chunk = dwcFile.head(args.entries, events)
+
         folderName = dwcFile.filePath.name
         if args.mapped:
             folderName += "_mapped"
@@ -31,14 +34,11 @@ if __name__ == '__main__':
             folderName += "_unmapped"
         folderName += "_example"
 
-        folderPath = source.getBaseDir() / "examples" / folderName
-        folderPath.mkdir(exist_ok=True)
-
-        for event in df.columns.levels[0]:
-            if (args.mapped and event == Event.UNMAPPED.value) or (args.unmapped and event != Event.UNMAPPED.value):
-                continue
+        folderPath = source.subsectionDir / "examples" / folderName
+        folderPath.mkdir(parents=True, exist_ok=True)
 
+        for event in chunk.getEvents():
             fileName = f"{event}{suffix}"
-            df[event].to_csv(folderPath / fileName, sep=delim, index=False)
+            chunk[event].to_pandas().to_csv(folderPath / fileName, sep=delim, index=False)
 
         Logger.info(f"Created folder: {folderPath}")